@@ -0,0 +1,136 @@
+"""
+Сопоставление адресов пунктов выдачи.
+
+Адрес приводится к ключу: нижний регистр, «ё» → «е», без знаков препинания и
+сокращений вроде «г.» и «ул.». Точное совпадение ищется по ключу в словаре,
+номер (в файле заказов пункт часто указан позицией в файле пунктов, с 1) — по
+списку позиций, а остальное — приблизительно, среди пунктов с общими словами,
+с оценкой уверенности от 0 до 1.
+"""
+
+import re
+from collections import defaultdict, namedtuple
+from difflib import SequenceMatcher
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Слова, которые пишут по-разному или опускают; на сопоставление не влияют.
+STOP_WORDS = {"г", "гор", "город", "ул", "улица", "д", "дом"}
+
+# Минимальная уверенность приблизительного совпадения.
+FUZZY_CUTOFF = 0.85
+
+EXACT = "exact"
+POSITION = "position"
+FUZZY = "fuzzy"
+
+Match = namedtuple("Match", ["point_id", "confidence", "method"])
+
+
+def normalize(address):
+    tokens = TOKEN_RE.findall(str(address or "").lower().replace("ё", "е"))
+    return " ".join(token for token in tokens if token not in STOP_WORDS)
+
+
+def _position(value):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    return None
+
+
+class DeliveryPointIndex:
+    """
+    Индекс пунктов выдачи в памяти; строится один раз на импорт или форму.
+    Результаты сопоставления кешируются по исходному значению.
+    """
+
+    def __init__(self, points, positions=None):
+        """
+        ``points`` — пары ``(id, адрес)`` или ``(id, адрес, ключ)`` в порядке
+        id. ``positions`` — ключи адресов в порядке файла пунктов выдачи;
+        без них позицией считается порядок id.
+        """
+        self.by_key = {}
+        self.addresses = {}
+        self.by_token = defaultdict(set)
+        order = []
+        for pk, address, *key in points:
+            key = key[0] if key else normalize(address)
+            # При дублях побеждает первый пункт — результат не зависит от
+            # порядка строк в запросе.
+            self.by_key.setdefault(key, pk)
+            self.addresses[pk] = address
+            for token in key.split():
+                self.by_token[token].add(pk)
+            order.append(key)
+        self.keys = {pk: key for key, pk in self.by_key.items()}
+        self.positions = list(positions) if positions is not None else order
+        self._cache = {}
+
+    @classmethod
+    def load(cls, positions=None):
+        from .models import DeliveryPoint
+
+        return cls(
+            DeliveryPoint.objects.order_by("pk").values_list(
+                "pk", "address", "normalized"
+            ),
+            positions,
+        )
+
+    def match(self, value):
+        """
+        :class:`Match` для адреса или номера пункта; ``None``, если ничего
+        не найдено или уверенность ниже :data:`FUZZY_CUTOFF`.
+        """
+        cache_key = (type(value), value)
+        if cache_key not in self._cache:
+            self._cache[cache_key] = self._match(value)
+        return self._cache[cache_key]
+
+    def _match(self, value):
+        position = _position(value)
+        if position is not None:
+            if 1 <= position <= len(self.positions):
+                pk = self.by_key.get(self.positions[position - 1])
+                if pk is not None:
+                    return Match(pk, 1.0, POSITION)
+            return None
+
+        key = normalize(value)
+        if not key:
+            return None
+        if key in self.by_key:
+            return Match(self.by_key[key], 1.0, EXACT)
+
+        best = self.best_candidate(key)
+        if best and best.confidence >= FUZZY_CUTOFF:
+            return best
+        return None
+
+    def best_candidate(self, key):
+        """Самый похожий пункт среди имеющих с ``key`` общие слова."""
+        candidates = set()
+        for token in key.split():
+            candidates |= self.by_token.get(token, set())
+        if not candidates:
+            return None
+        ordered = " ".join(sorted(key.split()))
+        scored = (
+            (
+                SequenceMatcher(
+                    None, ordered, " ".join(sorted(self.keys[pk].split()))
+                ).ratio(),
+                -pk,
+            )
+            for pk in candidates
+            if pk in self.keys
+        )
+        confidence, pk = max(scored, default=(0.0, 0))
+        if not confidence:
+            return None
+        return Match(-pk, round(confidence, 3), FUZZY)
@@ -5,6 +5,7 @@ from .models import (
     DeliveryPoint,
     Manufacturer,
     Order,
+    OrderItem,
     Product,
     Role,
     Supplier,
@@ -56,6 +57,8 @@ class ProductAdmin(admin.ModelAdmin):
     ]
     list_filter = ["category", "supplier", "manufacturer"]
     search_fields = ["article", "name"]
+    # Резерв меняется только складскими операциями body.stock.
+    readonly_fields = ["reserved"]
 
 
 @admin.register(DeliveryPoint)
@@ -63,8 +66,21 @@ class DeliveryPointAdmin(admin.ModelAdmin):
     list_display = ["address"]
 
 
+class OrderItemInline(admin.TabularInline):
+    """Позиции строятся из поля «Артикул заказа», здесь они только для просмотра."""
+
+    model = OrderItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ["product", "article", "quantity", "price"]
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
+    inlines = [OrderItemInline]
     list_display = [
         "number",
         "client_name",
@@ -75,3 +91,6 @@ class OrderAdmin(admin.ModelAdmin):
     ]
     list_filter = ["status"]
     search_fields = ["number", "client_name", "article"]
+    # Состав и статус заказа меняют резерв на складе, поэтому их правят только
+    # через форму заказа на сайте (OrderForm.save), а не в админке.
+    readonly_fields = ["article", "status", "stock_reserved"]
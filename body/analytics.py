@@ -0,0 +1,258 @@
+"""
+Сводные таблицы аналитики: заказы по дням и статусам, продажи по артикулам,
+складские остатки по поставщикам. Отменённые заказы видны в счётчиках по
+статусам, но не входят ни в выручку, ни в продажи артикулов.
+
+Агрегаты считает БД (GROUP BY по набору ключей), Python только переносит
+готовые строки. При инкрементальном обновлении пересчитываются лишь дни и
+артикулы, которых коснулись заказы, изменённые или удалённые с прошлого
+запуска; остатки по поставщикам — одна группировка по каталогу, она
+пересчитывается целиком.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    AnalyticsOrder,
+    AnalyticsState,
+    ArticleSales,
+    DailyOrderStats,
+    Order,
+    OrderItem,
+    Product,
+    SupplierStock,
+)
+from .orders import parse_articles
+
+BATCH_SIZE = 2000
+
+TOP_ARTICLES = 10
+
+MONEY = DecimalField(max_digits=16, decimal_places=2)
+
+
+def _money(expression):
+    return Coalesce(Sum(expression, output_field=MONEY), 0, output_field=MONEY)
+
+
+def _chunks(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+def _articles(article_text):
+    return {article for article, _ in parse_articles(article_text)}
+
+
+def refresh(full=False):
+    """
+    Обновляет сводные таблицы. Возвращает словарь с числом обработанных
+    заказов, дней и артикулов.
+    """
+    state, _ = AnalyticsState.objects.get_or_create(pk=1)
+    started = timezone.now()
+    full = full or state.watermark is None
+
+    with transaction.atomic():
+        if full:
+            result = _rebuild_orders()
+        else:
+            result = _refresh_orders(state.watermark)
+        _rebuild_stock()
+        state.watermark = started
+        state.refreshed_at = timezone.now()
+        state.save()
+    return {"full": full, **result}
+
+
+def _rebuild_orders():
+    DailyOrderStats.objects.all().delete()
+    ArticleSales.objects.all().delete()
+    AnalyticsOrder.objects.all().delete()
+    days = _write_daily(Order.objects.all())
+    articles = _write_articles(OrderItem.objects.all())
+    _write_snapshots(Order.objects.all())
+    return {
+        "orders": AnalyticsOrder.objects.count(),
+        "days": days,
+        "articles": articles,
+    }
+
+
+def _refresh_orders(watermark):
+    changed = Order.objects.filter(updated_at__gte=watermark)
+    changed_ids = set(changed.values_list("pk", flat=True))
+    deleted = AnalyticsOrder.objects.exclude(
+        order_id__in=Order.objects.values("pk")
+    )
+    previous = list(
+        AnalyticsOrder.objects.filter(
+            Q(order_id__in=changed_ids) | Q(pk__in=deleted.values("pk"))
+        ).values_list("order_id", "order_date", "article")
+    )
+
+    days, articles = set(), set()
+    for _, order_date, article in previous:
+        days.add(order_date)
+        articles |= _articles(article)
+    for order_date, article in changed.values_list("order_date", "article"):
+        days.add(order_date)
+        articles |= _articles(article)
+
+    for chunk in _chunks(days):
+        DailyOrderStats.objects.filter(day__in=chunk).delete()
+        _write_daily(Order.objects.filter(order_date__in=chunk))
+    for chunk in _chunks(articles):
+        ArticleSales.objects.filter(article__in=chunk).delete()
+        _write_articles(OrderItem.objects.filter(article__in=chunk))
+
+    stale_ids = changed_ids | {order_id for order_id, _, _ in previous}
+    for chunk in _chunks(stale_ids):
+        AnalyticsOrder.objects.filter(order_id__in=chunk).delete()
+    for chunk in _chunks(changed_ids):
+        _write_snapshots(Order.objects.filter(pk__in=chunk))
+    return {"orders": len(stale_ids), "days": len(days), "articles": len(articles)}
+
+
+def _write_daily(orders):
+    # Позиции считаются отдельным запросом: соединение с ними в одном
+    # GROUP BY размножило бы строки заказов в Count.
+    items = {
+        (row["order__order_date"], row["order__status"]): row
+        for row in OrderItem.objects.filter(order__in=orders)
+        .values("order__order_date", "order__status")
+        .annotate(items=Sum("quantity"), revenue=_money(F("quantity") * F("price")))
+    }
+    rows = []
+    for row in orders.values("order_date", "status").annotate(orders=Count("pk")):
+        key = (row["order_date"], row["status"])
+        totals = items.get(key, {})
+        rows.append(
+            DailyOrderStats(
+                day=row["order_date"],
+                status=row["status"],
+                orders=row["orders"],
+                items=totals.get("items") or 0,
+                revenue=totals.get("revenue") or 0,
+            )
+        )
+    DailyOrderStats.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len({row.day for row in rows})
+
+
+def _write_articles(items):
+    items = items.exclude(order__status=Order.STATUS_CANCELLED)
+    rows = [
+        ArticleSales(
+            article=row["article"],
+            product_id=row["first_product"],
+            orders=row["orders"],
+            quantity=row["sold"],
+            revenue=row["revenue"],
+        )
+        for row in items.values("article").annotate(
+            first_product=Min("product_id"),
+            orders=Count("order_id", distinct=True),
+            sold=Sum("quantity"),
+            revenue=_money(F("quantity") * F("price")),
+        )
+    ]
+    ArticleSales.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def _write_snapshots(orders):
+    AnalyticsOrder.objects.bulk_create(
+        (
+            AnalyticsOrder(order_id=pk, order_date=order_date, article=article)
+            for pk, order_date, article in orders.values_list(
+                "pk", "order_date", "article"
+            ).iterator(chunk_size=BATCH_SIZE)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def _rebuild_stock():
+    SupplierStock.objects.all().delete()
+    SupplierStock.objects.bulk_create(
+        SupplierStock(**row)
+        for row in Product.objects.filter(supplier__isnull=False)
+        .values("supplier_id")
+        .annotate(
+            products=Count("pk"),
+            units=Coalesce(Sum("stock"), 0),
+            stock_value=_money(F("stock") * F("final_price")),
+            promo_products=Count("pk", filter=Q(is_promo=True)),
+        )
+    )
+
+
+def dashboard(days):
+    """
+    Данные дашборда из сводных таблиц: заказы по дням за ``days`` дней до
+    последнего дня с заказами, топ артикулов и остатки по поставщикам.
+    """
+    state = AnalyticsState.objects.filter(pk=1).first()
+    latest = DailyOrderStats.objects.aggregate(latest=Max("day"))["latest"]
+
+    rows, totals = {}, defaultdict(int)
+    revenue = 0
+    if latest:
+        daily = DailyOrderStats.objects.filter(
+            day__gt=latest - timedelta(days=days)
+        ).order_by("-day")
+        for stats in daily:
+            row = rows.setdefault(
+                stats.day,
+                {
+                    "day": stats.day,
+                    "statuses": defaultdict(int),
+                    "orders": 0,
+                    "revenue": 0,
+                },
+            )
+            row["statuses"][stats.status] += stats.orders
+            row["orders"] += stats.orders
+            totals[stats.status] += stats.orders
+            if stats.status != Order.STATUS_CANCELLED:
+                row["revenue"] += stats.revenue
+                revenue += stats.revenue
+
+    stock = list(
+        SupplierStock.objects.select_related("supplier").order_by("-stock_value")
+    )
+    products = sum(row.products for row in stock)
+    promo = sum(row.promo_products for row in stock)
+    return {
+        "refreshed_at": state.refreshed_at if state else None,
+        "days": [
+            {
+                **row,
+                "statuses": [
+                    row["statuses"][status] for status, _ in Order.STATUS_CHOICES
+                ],
+            }
+            for row in rows.values()
+        ],
+        "status_totals": [
+            (label, totals[status]) for status, label in Order.STATUS_CHOICES
+        ],
+        "orders_total": sum(totals.values()),
+        "revenue_total": revenue,
+        "top_articles": list(
+            ArticleSales.objects.select_related("product").order_by(
+                "-quantity", "article"
+            )[:TOP_ARTICLES]
+        ),
+        "stock": stock,
+        "stock_value": sum(row.stock_value for row in stock),
+        "promo_share": round(100 * promo / products, 1) if products else 0,
+    }
@@ -0,0 +1,264 @@
+"""
+Асинхронные версии списков каталога и заказов для запуска под ASGI.
+
+Запросы к БД выполняются через async ORM, поэтому представление не занимает
+поток на время ожидания. Шаблоны рендерятся синхронно: к этому моменту все
+данные (включая пользователя и его роль) уже загружены.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
+from django.views.decorators.gzip import gzip_page
+
+from . import caching, export, reference
+from .filters import ais_exact_article, filter_orders, filter_products
+from .metrics import query_budget
+from .models import Order, Product
+from .pagination import KeysetPaginator, acapped_count
+from .views import (
+    ORDER_API_DEFAULT_FIELDS,
+    ORDER_API_FIELDS,
+    PRODUCT_API_DEFAULT_FIELDS,
+    PRODUCT_API_FIELDS,
+    _api_paginator,
+    _api_response,
+    _conditional,
+    _listing_params,
+    _order_context,
+    _order_params,
+    _status_aggregates,
+    _status_counts_key,
+)
+
+
+async def _load_user(request):
+    """
+    Загружает пользователя (роль приходит вместе с ним, см. RoleBackend) и
+    подставляет его в ``request.user``, чтобы проверки прав и
+    контекст-процессоры не обращались к БД синхронно.
+    """
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+async def _product_listing(request, query, supplier_id, show, sort, cursor):
+    async def build():
+        products, ordering = filter_products(
+            Product.objects.select_related("category", "manufacturer", "supplier"),
+            query,
+            supplier_id,
+            show,
+            sort,
+        )
+        paginator = KeysetPaginator(
+            products, ordering, settings.PRODUCT_LIST_PAGE_SIZE
+        )
+        page = await paginator.apage(cursor)
+        total_count, total_exact = await acapped_count(
+            products, settings.PRODUCT_LIST_COUNT_LIMIT
+        )
+        rows = render_to_string(
+            "store/product_rows.html", {"products": page.object_list}, request
+        )
+        return {
+            "page": page,
+            "rows": rows,
+            "total_count": total_count,
+            "total_exact": total_exact,
+        }
+
+    # Ключ совпадает с синхронной версией — кеш у них общий.
+    role = request.user.role.name if request.user.role_id else ""
+    return await caching.aget_or_set(
+        caching.CATALOG, [role, query, supplier_id, show, sort, cursor], build
+    )
+
+
+@query_budget(5)
+@login_required
+async def product_list(request):
+    await _load_user(request)
+    suppliers = await reference.aget(reference.SUPPLIERS)
+
+    query, supplier_id, show, sort, cursor = _listing_params(request)
+    listing = await _product_listing(request, query, supplier_id, show, sort, cursor)
+
+    context = {
+        **listing,
+        "suppliers": suppliers,
+        "query": query,
+        "selected_supplier": supplier_id,
+        "show": show,
+        "sort": sort,
+    }
+    return render(request, "store/product_list.html", context)
+
+
+@query_budget(4)
+@login_required
+@gzip_page
+async def product_rows(request):
+    await _load_user(request)
+    listing = await _product_listing(request, *_listing_params(request))
+    return render(request, "store/product_fragment.html", listing)
+
+
+@query_budget(6)
+@login_required
+async def order_list(request):
+    user = await _load_user(request)
+    if not user.can_view_orders():
+        messages.error(request, "Доступ запрещён.")
+        return redirect("product_list")
+
+    query, filters, cursor = _order_params(request)
+    exact_article = await ais_exact_article(query)
+    orders, ordering = filter_orders(
+        Order.objects.select_related("delivery_point", "client"),
+        query,
+        exact_article,
+        **filters,
+    )
+    page = await KeysetPaginator(
+        orders, ordering, settings.ORDER_LIST_PAGE_SIZE
+    ).apage(cursor)
+
+    counted, _ = filter_orders(
+        Order.objects.all(), query, exact_article, **{**filters, "status": ""}
+    )
+
+    async def count():
+        return await counted.aaggregate(**_status_aggregates())
+
+    counts = await caching.aget_or_set(
+        caching.ORDERS, _status_counts_key(query, filters), count
+    )
+    points = await reference.aget(reference.DELIVERY_POINTS)
+
+    return render(
+        request,
+        "store/order_list.html",
+        _order_context(query, filters, page, counts, points),
+    )
+
+
+async def _export_response(request, exporter, basename):
+    """
+    Async-вариант выгрузки: под ASGI синхронный итератор ответа Django
+    собрал бы целиком в память, поэтому и CSV, и файл XLSX отдаются
+    асинхронными генераторами.
+    """
+    file_format = request.GET.get("format", "csv")
+    if file_format not in export.FORMATS:
+        return JsonResponse({"error": "Формат: csv или xlsx"}, status=400)
+    content_type, extension = export.FORMATS[file_format]
+    if file_format == "csv":
+        content = export.acsv_chunks(exporter)
+    elif export.openpyxl is None:
+        return JsonResponse(
+            {"error": "XLSX недоступен: не установлен openpyxl"}, status=400
+        )
+    else:
+        fileobj = await sync_to_async(export.xlsx_file)(exporter, basename)
+        content = export.afile_chunks(fileobj)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{basename}{extension}"'
+    return response
+
+
+@login_required
+async def product_export(request):
+    user = await _load_user(request)
+    if not user.can_filter():
+        messages.error(request, "Доступ запрещён.")
+        return redirect("product_list")
+
+    query, supplier_id, show, sort, _ = _listing_params(request)
+    products, ordering = filter_products(
+        Product.objects.all(), query, supplier_id, show, sort
+    )
+    return await _export_response(
+        request, export.products(products.order_by(*ordering)), "products"
+    )
+
+
+@login_required
+async def order_export(request):
+    user = await _load_user(request)
+    if not user.can_view_orders():
+        messages.error(request, "Доступ запрещён.")
+        return redirect("product_list")
+
+    query, filters, _ = _order_params(request)
+    orders, ordering = filter_orders(
+        Order.objects.all(), query, await ais_exact_article(query), **filters
+    )
+    return await _export_response(
+        request, export.orders(orders.order_by(*ordering)), "orders"
+    )
+
+
+async def _api_page(request, queryset, ordering, fields, default_fields, page_size):
+    try:
+        paginator, names = _api_paginator(
+            request, queryset, ordering, fields, default_fields, page_size
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    page = await paginator.apage(request.GET.get("cursor"))
+    return _api_response(page, names, fields)
+
+
+@query_budget(3)
+@login_required
+@_conditional(caching.CATALOG)
+async def api_products(request):
+    try:
+        products, ordering = filter_products(
+            Product.objects.all(),
+            request.GET.get("q", "").strip(),
+            request.GET.get("supplier", ""),
+            request.GET.get("show", ""),
+            request.GET.get("sort", ""),
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return await _api_page(
+        request,
+        products,
+        ordering,
+        PRODUCT_API_FIELDS,
+        PRODUCT_API_DEFAULT_FIELDS,
+        settings.PRODUCT_LIST_PAGE_SIZE,
+    )
+
+
+@query_budget(4)
+@login_required
+async def api_orders(request):
+    user = await _load_user(request)
+    if not user.can_view_orders():
+        return JsonResponse({"error": "Доступ запрещён."}, status=403)
+    return await _api_orders(request)
+
+
+@_conditional(caching.ORDERS)
+async def _api_orders(request):
+    query, filters, _ = _order_params(request)
+    orders, ordering = filter_orders(
+        Order.objects.all(), query, await ais_exact_article(query), **filters
+    )
+    return await _api_page(
+        request,
+        orders,
+        ordering,
+        ORDER_API_FIELDS,
+        ORDER_API_DEFAULT_FIELDS,
+        settings.ORDER_LIST_PAGE_SIZE,
+    )
@@ -0,0 +1,97 @@
+import copy
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import BaseBackend, ModelBackend
+
+UserModel = get_user_model()
+
+GUEST_USERNAME = "guest"
+
+# (время загрузки, пользователь). Сигнал сбрасывает запись только в своём
+# процессе, поэтому остальные перечитывают её по истечении срока.
+_guest = None
+_guest_lock = threading.Lock()
+
+
+def _cached_guest():
+    loaded = _guest
+    if loaded is None:
+        return None
+    if time.monotonic() - loaded[0] >= settings.GUEST_USER_CACHE_TIMEOUT:
+        return None
+    # Каждый запрос получает свою копию: атрибуты, которые на пользователе
+    # кеширует Django и User.capabilities, не должны делиться между потоками.
+    return copy.copy(loaded[1])
+
+
+def get_guest_user():
+    """
+    Общая учётная запись гостя. Загружается (и при необходимости создаётся)
+    не чаще раза в GUEST_USER_CACHE_TIMEOUT секунд на процесс; сбрасывается
+    сигналом при изменении записи.
+    """
+    global _guest
+    guest = _cached_guest()
+    if guest is None:
+        with _guest_lock:
+            guest = _cached_guest()
+            if guest is None:
+                user, created = UserModel._default_manager.select_related(
+                    "role"
+                ).get_or_create(
+                    username=GUEST_USERNAME,
+                    defaults={"full_name": "Гость", "is_active": True},
+                )
+                if created:
+                    user.set_unusable_password()
+                    user.save(update_fields=["password"])
+                _guest = (time.monotonic(), user)
+                guest = copy.copy(user)
+    return guest
+
+
+def clear_guest_user():
+    global _guest
+    _guest = None
+
+
+class RoleBackend(ModelBackend):
+    """
+    ModelBackend, который загружает роль вместе с пользователем одним
+    запросом: проверки прав на странице не обращаются к БД.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.select_related("role").get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        try:
+            user = await UserModel._default_manager.select_related("role").aget(
+                pk=user_id
+            )
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class GuestBackend(BaseBackend):
+    """
+    Бэкенд гостевого входа: пользователь из сессии берётся из кеша процесса,
+    без запроса к БД. Паролем войти через него нельзя.
+    """
+
+    def get_user(self, user_id):
+        guest = get_guest_user()
+        return guest if str(guest.pk) == str(user_id) else None
+
+    async def aget_user(self, user_id):
+        guest = _cached_guest() or await sync_to_async(get_guest_user)()
+        return guest if str(guest.pk) == str(user_id) else None
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+# Пространства ключей. Каждое инвалидируется целиком сменой своей версии,
+# поэтому удалять отдельные ключи (и знать их список) не нужно.
+CATALOG = "catalog"
+# Справочники: категории, производители, поставщики, пункты выдачи.
+REFERENCE = "reference"
+ORDERS = "orders"
+
+NAMESPACES = (CATALOG, REFERENCE, ORDERS)
+OUTCOMES = ("hits", "misses")
+
+
+def _version_key(namespace):
+    return f"{namespace}:version"
+
+
+def _version_path(namespace):
+    return os.path.join(settings.CACHE_VERSION_DIR, namespace)
+
+
+def _touch(path, version):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a"):
+        pass
+    os.utime(path, ns=(version, version))
+
+
+def _file_version(namespace):
+    # Версия — mtime файла: одно чтение метаданных, общее для всех процессов.
+    path = _version_path(namespace)
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        _touch(path, time.time_ns())
+        return os.stat(path).st_mtime_ns
+
+
+def get_version(namespace):
+    if settings.CACHE_VERSION_DIR:
+        return _file_version(namespace)
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        cache.add(_version_key(namespace), time.time_ns(), timeout=None)
+        version = cache.get(_version_key(namespace))
+    return version
+
+
+async def aget_version(namespace):
+    if settings.CACHE_VERSION_DIR:
+        return _file_version(namespace)
+    version = await cache.aget(_version_key(namespace))
+    if version is None:
+        await cache.aadd(_version_key(namespace), time.time_ns(), timeout=None)
+        version = await cache.aget(_version_key(namespace))
+    return version
+
+
+def invalidate(namespace):
+    # Версия — отметка времени, а не счётчик: если ключ версии вытеснен из
+    # кеша, новая версия всё равно не совпадёт ни с одной старой.
+    if settings.CACHE_VERSION_DIR:
+        _touch(_version_path(namespace), time.time_ns())
+    else:
+        cache.set(_version_key(namespace), time.time_ns(), timeout=None)
+
+
+def changed_at(namespace):
+    """Время последней инвалидации пространства — отметка изменения данных."""
+    return datetime.fromtimestamp(get_version(namespace) / 1e9, tz=timezone.utc)
+
+
+def digest(parts):
+    """Короткий отпечаток JSON-сериализуемых ``parts`` для ключей и ETag."""
+    return hashlib.sha1(
+        json.dumps(parts, ensure_ascii=False, default=str).encode()
+    ).hexdigest()
+
+
+def make_key(namespace, parts):
+    return f"{namespace}:{get_version(namespace)}:{digest(parts)}"
+
+
+def _counter_path(namespace, outcome):
+    return os.path.join(settings.CACHE_VERSION_DIR, f"{namespace}.{outcome}")
+
+
+def _file_record(namespace, outcome):
+    # Счётчик — размер файла рядом с версией. Дозапись байта в режиме
+    # O_APPEND атомарна, поэтому процессы не теряют приращений без блокировок.
+    path = _counter_path(namespace, outcome)
+    flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+    try:
+        fd = os.open(path, flags, 0o644)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, flags, 0o644)
+    try:
+        os.write(fd, b".")
+    finally:
+        os.close(fd)
+
+
+def _file_count(namespace, outcome):
+    try:
+        return os.stat(_counter_path(namespace, outcome)).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def record(namespace, outcome):
+    if settings.CACHE_VERSION_DIR:
+        _file_record(namespace, outcome)
+        return
+    key = f"{namespace}:stats:{outcome}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+async def arecord(namespace, outcome):
+    if settings.CACHE_VERSION_DIR:
+        _file_record(namespace, outcome)
+        return
+    key = f"{namespace}:stats:{outcome}"
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, timeout=None):
+            await cache.aincr(key)
+
+
+def get_or_set(namespace, parts, build, timeout=None):
+    """
+    Возвращает значение из кеша по ``parts`` или вычисляет его через
+    ``build()`` и сохраняет. Попадания и промахи считаются по пространствам.
+    """
+    key = make_key(namespace, parts)
+    value = cache.get(key)
+    if value is not None:
+        record(namespace, "hits")
+        return value
+
+    record(namespace, "misses")
+    value = build()
+    if timeout is None:
+        timeout = settings.CATALOG_CACHE_TIMEOUT
+    cache.set(key, value, timeout)
+    return value
+
+
+async def aget_or_set(namespace, parts, build, timeout=None):
+    """Асинхронный :func:`get_or_set`: ``build`` — корутинная функция."""
+    key = f"{namespace}:{await aget_version(namespace)}:{digest(parts)}"
+    value = await cache.aget(key)
+    if value is not None:
+        await arecord(namespace, "hits")
+        return value
+
+    await arecord(namespace, "misses")
+    value = await build()
+    if timeout is None:
+        timeout = settings.CATALOG_CACHE_TIMEOUT
+    await cache.aset(key, value, timeout)
+    return value
+
+
+def stats():
+    """Попадания и промахи по пространствам, общие для всех процессов."""
+
+    def count(namespace, outcome):
+        if settings.CACHE_VERSION_DIR:
+            return _file_count(namespace, outcome)
+        return cache.get(f"{namespace}:stats:{outcome}", 0)
+
+    return {
+        namespace: {outcome: count(namespace, outcome) for outcome in OUTCOMES}
+        for namespace in NAMESPACES
+    }
+
+
+def is_shared():
+    """Видны ли счётчики и версии всем процессам сервера."""
+    return bool(settings.CACHE_VERSION_DIR) or not isinstance(
+        caches[DEFAULT_CACHE_ALIAS], LocMemCache
+    )
@@ -0,0 +1,181 @@
+"""
+Потоковая выгрузка товаров и заказов в CSV и XLSX.
+
+Колонки совпадают с файлами импорта, поэтому выгрузку можно загрузить
+обратно через import_data. Строки читаются из БД порциями
+(``iterator(chunk_size=...)``) и сразу записываются, так что память не
+зависит от размера таблицы.
+"""
+
+import csv
+import tempfile
+
+from asgiref.sync import sync_to_async
+
+from .models import Order
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+CHUNK_SIZE = 2000
+# Сколько строк CSV отдавать одним куском ответа.
+CSV_ROWS_PER_CHUNK = 500
+FILE_BLOCK_SIZE = 64 * 1024
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", ".csv"),
+    "xlsx": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        ".xlsx",
+    ),
+}
+
+STATUS_LABELS = {
+    Order.STATUS_NEW: "Новый",
+    Order.STATUS_COMPLETED: "Завершен",
+    Order.STATUS_CANCELLED: "Отменен",
+}
+
+
+# Начало строки, с которого Excel и LibreOffice читают ячейку как формулу.
+FORMULA_PREFIXES = ("=", "+", "-", "@")
+
+
+def escape_formula(value):
+    """
+    Текст из БД, похожий на формулу, выгружается с апострофом в начале:
+    иначе табличный редактор выполнит его при открытии файла.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _date(value):
+    return value.strftime("%d.%m.%Y") if value else None
+
+
+# (заголовок, поле для values_list, форматирование значения)
+PRODUCT_COLUMNS = [
+    ("Артикул", "article", None),
+    ("Наименование товара", "name", None),
+    ("Единица измерения", "unit", None),
+    ("Цена", "price", None),
+    ("Поставщик", "supplier__name", None),
+    ("Производитель", "manufacturer__name", None),
+    ("Категория товара", "category__name", None),
+    ("Действующая скидка", "discount", None),
+    ("Кол-во на складе", "stock", None),
+    ("Описание товара", "description", None),
+    ("Цена со скидкой", "final_price", None),
+]
+ORDER_COLUMNS = [
+    ("Номер заказа", "number", None),
+    ("Артикул заказа", "article", None),
+    ("Дата заказа", "order_date", _date),
+    ("Дата доставки", "delivery_date", _date),
+    ("Адрес пункта выдачи", "delivery_point__address", None),
+    ("ФИО авторизированного клиента", "client_name", None),
+    ("Код для получения", "pickup_code", None),
+    ("Статус заказа", "status", STATUS_LABELS.get),
+]
+
+
+class Export:
+    def __init__(self, queryset, columns):
+        self.columns = columns
+        self.header = [header for header, _, _ in columns]
+        # values(), а не values_list(): итератор values_list выполняет запрос
+        # сразу при создании, и aiterator() падает в async-контексте.
+        self.queryset = queryset.values(*[field for _, field, _ in columns])
+
+    def _format(self, row):
+        return [
+            escape_formula(formatter(row[field]) if formatter else row[field])
+            for _, field, formatter in self.columns
+        ]
+
+    def rows(self):
+        for row in self.queryset.iterator(chunk_size=CHUNK_SIZE):
+            yield self._format(row)
+
+    async def arows(self):
+        async for row in self.queryset.aiterator(chunk_size=CHUNK_SIZE):
+            yield self._format(row)
+
+
+def products(queryset):
+    return Export(queryset, PRODUCT_COLUMNS)
+
+
+def orders(queryset):
+    return Export(queryset, ORDER_COLUMNS)
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(export):
+    writer = csv.writer(_Echo())
+    # BOM — чтобы Excel открыл UTF-8 с кириллицей без мастера импорта.
+    yield "\ufeff" + writer.writerow(export.header)
+    chunk = []
+    for row in export.rows():
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= CSV_ROWS_PER_CHUNK:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+async def acsv_chunks(export):
+    writer = csv.writer(_Echo())
+    yield "\ufeff" + writer.writerow(export.header)
+    chunk = []
+    async for row in export.arows():
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= CSV_ROWS_PER_CHUNK:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def write_xlsx(export, fileobj, title):
+    """
+    Книга в режиме write_only: строки сразу уходят во временный XML-файл
+    листа, в памяти не накапливаются.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(export.header)
+    for row in export.rows():
+        sheet.append(row)
+    workbook.save(fileobj)
+
+
+def xlsx_file(export, title):
+    """
+    XLSX во временном файле. Архив собирается только после записи всех
+    строк, поэтому в отличие от CSV отдача начинается после сборки файла.
+    """
+    fileobj = tempfile.TemporaryFile()
+    write_xlsx(export, fileobj, title)
+    fileobj.seek(0)
+    return fileobj
+
+
+async def afile_chunks(fileobj):
+    read = sync_to_async(fileobj.read, thread_sensitive=False)
+    try:
+        while block := await read(FILE_BLOCK_SIZE):
+            yield block
+    finally:
+        fileobj.close()
@@ -0,0 +1,112 @@
+"""
+Фильтры, поиск и сортировки списков товаров и заказов. Общие для
+представлений, async-представлений и команды export_data.
+"""
+
+from . import search
+from .models import Order, OrderItem, Product
+
+PRODUCT_ORDERINGS = {
+    "stock_asc": ("stock", "id"),
+    "stock_desc": ("-stock", "-id"),
+    "price_asc": ("final_price", "id"),
+    "price_desc": ("-final_price", "-id"),
+}
+PRODUCT_FILTERS = {
+    "promo": {"is_promo": True},
+    "out_of_stock": {"stock": 0},
+}
+DEFAULT_PRODUCT_ORDERING = ("name", "id")
+SEARCH_PRODUCT_ORDERING = ("search_rank", "id")
+DEFAULT_ORDER_ORDERING = ("-order_date", "-id")
+SEARCH_ORDER_ORDERING = ("search_rank", "-order_date", "-id")
+ORDER_STATUSES = [status for status, _ in Order.STATUS_CHOICES]
+
+# Верхняя граница первичных ключей: больше не поместится в bigint.
+MAX_ID = 2**63 - 1
+
+
+def parse_id(value):
+    """Первичный ключ из параметра запроса или ``None``, если он некорректен."""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if 0 < value <= MAX_ID else None
+
+
+def _id_filter(value, name):
+    pk = parse_id(value)
+    if pk is None:
+        raise ValueError(f"Некорректный {name}")
+    return pk
+
+
+def filter_products(products, query, supplier_id, show, sort):
+    """
+    Фильтры каталога; возвращает ``(queryset, ordering)``, при некорректном
+    поставщике — ``ValueError``.
+    """
+    if query:
+        products = search.search_products(products, query)
+    if supplier_id:
+        products = products.filter(supplier_id=_id_filter(supplier_id, "supplier"))
+    if show in PRODUCT_FILTERS:
+        products = products.filter(**PRODUCT_FILTERS[show])
+
+    if sort in PRODUCT_ORDERINGS:
+        ordering = PRODUCT_ORDERINGS[sort]
+    elif query:
+        ordering = SEARCH_PRODUCT_ORDERING
+    else:
+        ordering = DEFAULT_PRODUCT_ORDERING
+    return products, ordering
+
+
+def filter_orders(
+    orders, query, exact_article, status="", date_from=None, date_to=None, point=""
+):
+    """
+    Фильтры и поиск по заказам; возвращает ``(queryset, ordering)``, при
+    некорректном пункте выдачи — ``ValueError``. ``exact_article`` — запрос
+    совпадает с артикулом товара (см. :func:`is_exact_article`; проверяет
+    вызывающий код, чтобы фильтр годился и для async-представлений).
+    """
+    if status:
+        orders = orders.filter(status=status)
+    if date_from:
+        orders = orders.filter(order_date__gte=date_from)
+    if date_to:
+        orders = orders.filter(order_date__lte=date_to)
+    if point:
+        orders = orders.filter(delivery_point_id=_id_filter(point, "point"))
+
+    if query.isdigit():
+        # Число — номер заказа: точное совпадение по уникальному индексу.
+        return orders.filter(number=int(query)), DEFAULT_ORDER_ORDERING
+    if exact_article:
+        # Точный артикул товара — ищем по позициям заказов через индекс.
+        orders = orders.filter(
+            pk__in=OrderItem.objects.filter(product__article=query).values("order_id")
+        )
+    elif query:
+        return search.search_orders(orders, query), SEARCH_ORDER_ORDERING
+    return orders, DEFAULT_ORDER_ORDERING
+
+
+def _may_be_article(query):
+    return bool(query) and not query.isdigit()
+
+
+def is_exact_article(query):
+    return (
+        _may_be_article(query) and Product.objects.filter(article=query).exists()
+    )
+
+
+async def ais_exact_article(query):
+    """Асинхронный :func:`is_exact_article`."""
+    return (
+        _may_be_article(query)
+        and await Product.objects.filter(article=query).aexists()
+    )
@@ -1,6 +1,41 @@
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm
-from .models import Order, Product
+from django.db import transaction
+
+from . import addresses, images, orders, reference, stock
+from .models import DeliveryPoint, Order, Product
+
+
+class ReferenceChoiceIterator(forms.models.ModelChoiceIterator):
+    """Варианты выбора из справочника в памяти процесса вместо запроса к БД."""
+
+    def __init__(self, field):
+        super().__init__(field)
+        self.name = reference.BY_MODEL[field.queryset.model]
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        label = reference.label_field(self.name)
+        for row in reference.get(self.name):
+            yield (row["id"], row[label])
+
+    def __len__(self):
+        return len(reference.get(self.name)) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(reference.get(self.name))
+
+
+class ReferenceChoiceField(forms.ModelChoiceField):
+    """
+    Выбор из справочника (:mod:`body.reference`). Список для ``<select>``
+    берётся из памяти; отправленное значение по-прежнему проверяется по БД.
+    """
+
+    iterator = ReferenceChoiceIterator
+
+
 class LoginForm(AuthenticationForm):
     username = forms.CharField(
         label="Логин (email)",
@@ -54,6 +89,11 @@ class ProductForm(forms.ModelForm):
             "manufacturer": forms.Select(attrs={"class": "form-select"}),
             "supplier": forms.Select(attrs={"class": "form-select"}),
         }
+        field_classes = {
+            "category": ReferenceChoiceField,
+            "manufacturer": ReferenceChoiceField,
+            "supplier": ReferenceChoiceField,
+        }
         labels = {
             "article": "Артикул",
             "name": "Наименование",
@@ -68,6 +108,36 @@ class ProductForm(forms.ModelForm):
             "supplier": "Поставщик",
         }
 
+    def clean_stock(self):
+        stock_value = self.cleaned_data["stock"]
+        if stock_value is not None and stock_value < self.instance.reserved:
+            raise forms.ValidationError(
+                f"В резерве {self.instance.reserved} шт. — остаток не может быть меньше."
+            )
+        return stock_value
+
+    def save(self, commit=True):
+        image = self.cleaned_data.get("image")
+        if "image" in self.changed_data and image:
+            self.instance.image = images.store(image, image.name)
+        product = super().save(commit=False)
+        if commit:
+            # Резерв меняют только складские операции, форма его не перезаписывает.
+            product.save(
+                update_fields=None if product._state.adding else self._meta.fields
+            )
+            self._save_m2m()
+            if product.image:
+                images.make_thumbnail_async(product.image.name)
+        return product
+
+
+def client_label(user):
+    """Подпись клиента в поиске: ФИО и логин."""
+    if user.full_name:
+        return f"{user.full_name} ({user.username})"
+    return user.username
+
 
 class OrderForm(forms.ModelForm):
     order_date = forms.DateField(
@@ -87,6 +157,27 @@ class OrderForm(forms.ModelForm):
         ),
         input_formats=["%Y-%m-%d"],
     )
+    delivery_address = forms.CharField(
+        label="или адрес пункта выдачи",
+        required=False,
+        widget=forms.TextInput(
+            attrs={"class": "form-control", "placeholder": "г. Лесной, ул. Вишневая, 32"}
+        ),
+    )
+    # Клиент выбирается поиском (api/clients/): id лежит в скрытом поле
+    # client, а список всех пользователей в форму не загружается.
+    client_search = forms.CharField(
+        label="Клиент",
+        required=False,
+        widget=forms.TextInput(
+            attrs={
+                "class": "form-control js-client-search",
+                "list": "client-options",
+                "autocomplete": "off",
+                "placeholder": "Начните вводить ФИО или email",
+            }
+        ),
+    )
 
     class Meta:
         model = Order
@@ -110,8 +201,9 @@ class OrderForm(forms.ModelForm):
             "pickup_code": forms.TextInput(attrs={"class": "form-control"}),
             "status": forms.Select(attrs={"class": "form-select"}),
             "delivery_point": forms.Select(attrs={"class": "form-select"}),
-            "client": forms.Select(attrs={"class": "form-select"}),
+            "client": forms.HiddenInput(attrs={"class": "js-client-id"}),
         }
+        field_classes = {"delivery_point": ReferenceChoiceField}
         labels = {
             "number": "Номер заказа",
             "article": "Артикул товара",
@@ -121,3 +213,58 @@ class OrderForm(forms.ModelForm):
             "delivery_point": "Пункт выдачи",
             "client": "Клиент",
         }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.client_id:
+            self.fields["client_search"].initial = client_label(self.instance.client)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        client_search = cleaned_data.get("client_search")
+        client = cleaned_data.get("client")
+        if not client_search:
+            cleaned_data["client"] = None
+        elif client is None or client_search != client_label(client):
+            # Текст правили, но клиента из подсказок не выбрали: скрытое
+            # поле хранит прежний id, молча сохранять его нельзя.
+            self.add_error("client_search", "Выберите клиента из подсказок.")
+        address = cleaned_data.get("delivery_address")
+        if not address:
+            return cleaned_data
+
+        key = addresses.normalize(address)
+        # Точное совпадение — по индексу в БД; индекс в памяти нужен только
+        # для номера пункта и приблизительного поиска.
+        point = DeliveryPoint.objects.filter(normalized=key).order_by("pk").first()
+        if point is None:
+            index = addresses.DeliveryPointIndex.load()
+            match = index.match(address)
+            if match is None:
+                candidate = index.best_candidate(key)
+                message = "Пункт выдачи с таким адресом не найден."
+                if candidate:
+                    message += f" Возможно: {index.addresses[candidate.point_id]}"
+                self.add_error("delivery_address", message)
+                return cleaned_data
+            point = DeliveryPoint.objects.get(pk=match.point_id)
+        cleaned_data["delivery_point"] = point
+        return cleaned_data
+
+    def save(self, commit=True):
+        if not commit:
+            return super().save(commit)
+
+        with transaction.atomic():
+            previous = Order.objects.select_for_update().get(pk=self.instance.pk)
+            items_changed = "article" in self.changed_data
+            if items_changed:
+                stock.release(previous)
+            self.instance.stock_reserved = previous.stock_reserved
+            order = super().save()
+            if items_changed:
+                orders.sync_items(order)
+                if order.status == previous.status == Order.STATUS_NEW:
+                    stock.reserve(order)
+            stock.apply_transition(order, previous.status)
+        return order
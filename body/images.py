@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DIR = "products"
+THUMBNAIL_DIR = "products/thumbs"
+# Миниатюра в каталоге выводится 40×40, храним с запасом для HiDPI-экранов.
+THUMBNAIL_SIZE = (80, 80)
+THUMBNAIL_QUALITY = 80
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="product-images")
+
+
+def content_name(fileobj, original_name):
+    """Имя файла по SHA-256 содержимого: одинаковые фото хранятся один раз."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(64 * 1024), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    extension = os.path.splitext(original_name)[1].lower() or ".jpg"
+    return f"{IMAGE_DIR}/{digest.hexdigest()}{extension}"
+
+
+def store(fileobj, original_name):
+    name = content_name(fileobj, original_name)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, File(fileobj))
+    return name
+
+
+def thumbnail_name(name):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f"{THUMBNAIL_DIR}/{stem}.webp"
+
+
+def make_thumbnail(name):
+    thumb = thumbnail_name(name)
+    if default_storage.exists(thumb):
+        return thumb
+
+    with default_storage.open(name, "rb") as f, Image.open(f) as image:
+        image = ImageOps.exif_transpose(image)
+        mode = "RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB"
+        image = ImageOps.fit(image.convert(mode), THUMBNAIL_SIZE)
+        buffer = BytesIO()
+        image.save(buffer, "WEBP", quality=THUMBNAIL_QUALITY)
+
+    default_storage.save(thumb, ContentFile(buffer.getvalue()))
+    return thumb
+
+
+def _make_thumbnail_logged(name):
+    try:
+        return make_thumbnail(name)
+    except Exception:
+        logger.exception("Не удалось создать миниатюру для %s", name)
+        raise
+
+
+def make_thumbnail_async(name):
+    """Миниатюра создаётся в фоновом потоке, чтобы не задерживать ответ."""
+    return _executor.submit(_make_thumbnail_logged, name)
+
+
+class ImageIngestor:
+    """
+    Загрузка фото товаров при импорте: имя вычисляется сразу (по хешу
+    содержимого), а копирование и миниатюры выполняются в пуле потоков.
+    Повторяющиеся фото обрабатываются один раз.
+    """
+
+    def __init__(self, workers=4):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="image-import"
+        )
+        self.futures = {}
+
+    def submit(self, path):
+        with open(path, "rb") as f:
+            name = content_name(f, path)
+        if name not in self.futures:
+            self.futures[name] = self.executor.submit(self._ingest, path, name)
+        return name
+
+    @staticmethod
+    def _ingest(path, name):
+        if not default_storage.exists(name):
+            with open(path, "rb") as f:
+                default_storage.save(name, File(f))
+        return make_thumbnail(name)
+
+    def wait(self):
+        """Ждёт окончания обработки и возвращает список ``(имя, ошибка)``."""
+        self.executor.shutdown(wait=True)
+        return [
+            (name, future.exception())
+            for name, future in self.futures.items()
+            if future.exception() is not None
+        ]
@@ -0,0 +1,153 @@
+import asyncio
+import math
+import time
+import types
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import include, path
+
+VIEWS = ("product_list", "order_list", "api_products", "api_orders")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочное сравнение синхронных представлений под ASGI и "
+        "async-версий: запросы в секунду и задержки p50/p99"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", required=True, help="Логин пользователя, от имени которого идут запросы"
+        )
+        parser.add_argument(
+            "--view",
+            action="append",
+            choices=VIEWS,
+            help="Представление для замера (можно несколько; по умолчанию все)",
+        )
+        parser.add_argument(
+            "--query", default="", help="Строка запроса, например 'q=ботинки&sort=price_asc'"
+        )
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Отключить кеш каталога, чтобы мерить запросы к БД",
+        )
+
+    def handle(self, *args, **options):
+        from body import async_views, views
+
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден")
+
+        client = Client()
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+        overrides = {}
+        if options["no_cache"]:
+            overrides["CACHES"] = {
+                "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+            }
+
+        application = ASGIHandler()
+        for name in options["view"] or VIEWS:
+            for mode, module in (("sync", views), ("async", async_views)):
+                # Замеряемое представление на /bench/, остальные маршруты
+                # подключены, чтобы в шаблонах работал {% url %}.
+                urlconf = types.ModuleType("bench_urls")
+                urlconf.urlpatterns = [
+                    path("bench/", getattr(module, name)),
+                    path("", include("body.urls")),
+                ]
+                with override_settings(ROOT_URLCONF=urlconf, **overrides):
+                    result = asyncio.run(
+                        self._load(
+                            application,
+                            options["query"],
+                            cookie,
+                            options["requests"],
+                            options["concurrency"],
+                        )
+                    )
+                self.stdout.write(
+                    f"{name:<13} {mode:<5} {result['rps']:8.1f} запр/с  "
+                    f"p50 {result['p50'] * 1000:7.1f} мс  "
+                    f"p99 {result['p99'] * 1000:7.1f} мс  "
+                    f"ошибок {result['errors']}"
+                )
+
+    async def _load(self, application, query, cookie, requests, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                return await self._request(application, query, cookie)
+
+        # Прогрев: первые запросы заполняют кеши и пул соединений.
+        await asyncio.gather(*(one() for _ in range(min(concurrency, requests))))
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+        latencies = [latency for _, latency in results]
+        return {
+            "rps": requests / elapsed,
+            "p50": percentile(latencies, 0.5),
+            "p99": percentile(latencies, 0.99),
+            "errors": sum(1 for status, _ in results if status != 200),
+        }
+
+    @staticmethod
+    async def _request(application, query, cookie):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/bench/",
+            "raw_path": b"/bench/",
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"localhost"), (b"cookie", cookie.encode())],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        body_sent = False
+        disconnected = asyncio.Event()
+        status = None
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # Клиент «висит» до конца ответа, как обычное соединение.
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        started = time.perf_counter()
+        await application(scope, receive, send)
+        latency = time.perf_counter() - started
+        disconnected.set()
+        return status, latency
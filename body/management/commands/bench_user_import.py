@@ -0,0 +1,93 @@
+import csv
+import os
+import tempfile
+import time
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from body.synthetic import SyntheticData
+
+
+class Command(BaseCommand):
+    help = (
+        "Скорость импорта пользователей (пользователей/с): последовательное "
+        "хеширование паролей, пул процессов и файл с готовыми хешами. "
+        "Запускается в отдельной тестовой БД."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=300)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 2,
+            help="Процессов для параллельного хеширования",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["users"] < 1:
+            raise CommandError("--users должен быть больше нуля")
+        from body.management.commands.import_data import SOURCES
+
+        data = SyntheticData(
+            products=0,
+            orders=0,
+            delivery_points=0,
+            users_per_role=-(-options["users"] // 3),
+            seed=options["seed"],
+        )
+        rows = list(data.users())
+        # Один хеш на все строки: стоимость подготовки файла не важна,
+        # замеряется только импорт.
+        prehashed = make_password("benchmark")
+        scenarios = [
+            ("последовательно", rows, 1),
+            (f"пул процессов ({options['workers']})", rows, options["workers"]),
+            ("готовые хеши", [{**row, "Пароль": prehashed} for row in rows], 1),
+        ]
+
+        old_name = connection.settings_dict["NAME"]
+        setup_test_environment(debug=False)
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            baseline = None
+            for label, feed, workers in scenarios:
+                elapsed = self._run(feed, workers, SOURCES["users"][0])
+                rate = len(feed) / elapsed
+                baseline = baseline or rate
+                self.stdout.write(
+                    f"  {label:<20} {rate:10.1f} польз./с  "
+                    f"({elapsed:.2f} с, x{rate / baseline:.1f})"
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _run(self, rows, workers, basename):
+        from body.models import ImportFingerprint, User
+
+        with tempfile.TemporaryDirectory() as path:
+            with open(
+                os.path.join(path, f"{basename}.csv"), "w", newline="", encoding="utf-8"
+            ) as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+            started = time.perf_counter()
+            call_command(
+                "import_data",
+                path=path,
+                format="csv",
+                workers=workers,
+                stdout=StringIO(),
+            )
+            elapsed = time.perf_counter() - started
+        User.objects.all().delete()
+        ImportFingerprint.objects.all().delete()
+        return elapsed
@@ -0,0 +1,299 @@
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from body.synthetic import SyntheticData
+
+# Рост времени, ниже которого разница считается шумом.
+NOISE_MS = 1.0
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк на синтетических данных: импорт, каталог, заказы, поиск, "
+        "редактирование и удаление товара. Каждый масштаб — в отдельной "
+        "тестовой БД; результаты в JSON для сравнения между релизами."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=int,
+            action="append",
+            help="Число товаров и заказов (можно несколько, например "
+            "--scale 10000 --scale 100000 --scale 1000000; по умолчанию 10000)",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output", metavar="FILE", help="Записать результаты в JSON ('-' — stdout)"
+        )
+        parser.add_argument(
+            "--baseline", metavar="FILE", help="JSON прошлого запуска для сравнения"
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.25,
+            help="Допустимый рост лучшего времени сценария относительно "
+            "--baseline (0.25 = 25%%)",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat должен быть больше нуля")
+        self.repeat = options["repeat"]
+        scales = options["scale"] or [10000]
+        quiet = options["output"] == "-"
+
+        results = []
+        setup_test_environment(debug=False)
+        try:
+            for scale in scales:
+                results.extend(self._run_scale(scale, options["seed"], quiet))
+        finally:
+            teardown_test_environment()
+
+        report = {"meta": self._meta(options), "results": results}
+        if options["output"] == "-":
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        elif options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+        if options["baseline"]:
+            self._compare(results, options["baseline"], options["threshold"])
+
+    def _meta(self, options):
+        try:
+            revision = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except OSError:
+            revision = ""
+        return {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": revision or None,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "seed": options["seed"],
+            "repeat": self.repeat,
+        }
+
+    def _run_scale(self, scale, seed, quiet):
+        if not quiet:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Масштаб: {scale} строк"))
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        cache.clear()
+        results = []
+        try:
+            data = SyntheticData(
+                products=scale, orders=scale, users_per_role=2, seed=seed
+            )
+            with tempfile.TemporaryDirectory() as path:
+                data.write_feed(path)
+                results.append(
+                    self._measure_once(
+                        scale, "import_data", lambda: self._import(path, False)
+                    )
+                )
+                results.append(
+                    self._measure_once(
+                        scale,
+                        "import_data_incremental",
+                        lambda: self._import(path, True),
+                    )
+                )
+            for name, action, *setup in self._scenarios():
+                results.append(self._measure(scale, name, action, *setup))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if not quiet:
+            for result in results:
+                self.stdout.write(
+                    f"  {result['scenario']:<24} медиана {result['median_ms']:9.1f} мс  "
+                    f"p95 {result['p95_ms']:9.1f} мс  запросов {result['queries']}"
+                )
+        return results
+
+    @staticmethod
+    def _import(path, incremental):
+        call_command(
+            "import_data",
+            path=path,
+            format="csv",
+            incremental=incremental,
+            stdout=StringIO(),
+        )
+
+    def _scenarios(self):
+        from body.models import Order, Product, Supplier, User
+
+        client = Client()
+        client.force_login(
+            User.objects.filter(role__name="admin").order_by("pk").first()
+        )
+        supplier = Supplier.objects.order_by("pk").first()
+        product = Product.objects.order_by("pk").first()
+        client_name = Order.objects.order_by("pk").values_list(
+            "client_name", flat=True
+        ).first()
+
+        products_url = reverse("product_list")
+        first_page = client.get(products_url, {"sort": "price_desc"})
+        next_cursor = first_page.context["page"].next_cursor or ""
+
+        def get(url, params=None):
+            return lambda: client.get(url, params or {})
+
+        def edit_product():
+            return client.post(
+                reverse("product_edit", args=[product.pk]),
+                {
+                    "article": product.article,
+                    "name": product.name,
+                    "unit": product.unit,
+                    "price": product.price,
+                    "discount": product.discount,
+                    "stock": product.stock + 1,
+                    "description": product.description,
+                    "category": product.category_id,
+                    "manufacturer": product.manufacturer_id,
+                    "supplier": product.supplier_id,
+                },
+            )
+
+        def create_victim():
+            # Товар для удаления создаётся вне замера.
+            victim = Product.objects.create(
+                article=f"BENCH{time.perf_counter_ns()}",
+                name="Удаляемый товар",
+                price=product.price,
+                category_id=product.category_id,
+                manufacturer_id=product.manufacturer_id,
+                supplier_id=product.supplier_id,
+            )
+            return (victim.pk,)
+
+        def delete_product(pk):
+            return client.post(reverse("product_delete", args=[pk]))
+
+        return [
+            ("product_list", get(products_url)),
+            ("product_list_sorted", get(products_url, {"sort": "price_desc"})),
+            (
+                "product_list_supplier",
+                get(products_url, {"supplier": supplier.pk, "sort": "stock_asc"}),
+            ),
+            (
+                "product_list_next_page",
+                get(products_url, {"sort": "price_desc", "cursor": next_cursor}),
+            ),
+            ("product_search", get(products_url, {"q": "ботинки демисезонные"})),
+            ("product_search_article", get(products_url, {"q": product.article})),
+            ("order_list", get(reverse("order_list"))),
+            (
+                "order_search",
+                get(reverse("order_list"), {"q": client_name.split()[0]}),
+            ),
+            ("api_products", get(reverse("api_products"))),
+            (
+                "product_edit_form",
+                get(reverse("product_edit", args=[product.pk])),
+            ),
+            ("product_edit_save", edit_product),
+            ("product_delete", delete_product, create_victim),
+        ]
+
+    def _measure(self, scale, name, action, setup=None):
+        timings, response = [], None
+        for _ in range(self.repeat):
+            args = setup() if setup else ()
+            # Замеряется путь через БД, а не попадание в кеш каталога.
+            cache.clear()
+            started = time.perf_counter()
+            response = action(*args)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code not in (200, 302):
+                raise CommandError(f"{name}: ответ {response.status_code}")
+        return self._result(scale, name, timings, response)
+
+    def _measure_once(self, scale, name, action):
+        started = time.perf_counter()
+        action()
+        return self._result(scale, name, [(time.perf_counter() - started) * 1000])
+
+    @staticmethod
+    def _result(scale, name, timings, response=None):
+        metrics = getattr(response, "metrics", None)
+        return {
+            "scale": scale,
+            "scenario": name,
+            "runs": len(timings),
+            "min_ms": round(min(timings), 2),
+            "median_ms": round(statistics.median(timings), 2),
+            "p95_ms": round(percentile(timings, 0.95), 2),
+            "max_ms": round(max(timings), 2),
+            "queries": metrics.queries if metrics else None,
+            "bytes": metrics.size if metrics else None,
+        }
+
+    def _compare(self, results, baseline_path, threshold):
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = {
+                (r["scale"], r["scenario"]): r for r in json.load(f)["results"]
+            }
+        regressions = []
+        for result in results:
+            before = baseline.get((result["scale"], result["scenario"]))
+            if before is None:
+                continue
+            label = f"{result['scenario']} @ {result['scale']}"
+            # Сравнивается лучший прогон: он меньше всего зависит от фоновой
+            # нагрузки на машине. Число запросов сравнивается точно.
+            slower = result["min_ms"] - before["min_ms"]
+            if slower > NOISE_MS and result["min_ms"] > before["min_ms"] * (
+                1 + threshold
+            ):
+                regressions.append(
+                    f"{label}: {before['min_ms']} → {result['min_ms']} мс"
+                )
+            if (
+                result["queries"] is not None
+                and before["queries"] is not None
+                and result["queries"] > before["queries"]
+            ):
+                regressions.append(
+                    f"{label}: запросов {before['queries']} → {result['queries']}"
+                )
+        if regressions:
+            raise CommandError(
+                "Регрессия производительности:\n  " + "\n  ".join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS("Регрессий относительно базы нет."))
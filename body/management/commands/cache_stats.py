@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from body import caching
+
+
+class Command(BaseCommand):
+    help = "Статистика попаданий в кеш каталога"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--clear", action="store_true", help="Сбросить закешированные данные"
+        )
+
+    def handle(self, *args, **options):
+        if not caching.is_shared():
+            # Команда — отдельный процесс: она увидела бы только свои нули.
+            raise CommandError(
+                "Счётчики LocMemCache у каждого процесса свои: задайте "
+                "CACHE_VERSION_DIR или общий кеш (Redis, Memcached)."
+            )
+        for namespace, counters in caching.stats().items():
+            total = counters["hits"] + counters["misses"]
+            ratio = counters["hits"] / total * 100 if total else 0
+            self.stdout.write(
+                f"{namespace}: попаданий {counters['hits']}, "
+                f"промахов {counters['misses']} ({ratio:.1f}%)"
+            )
+        if options["clear"]:
+            for namespace in caching.NAMESPACES:
+                caching.invalidate(namespace)
+            self.stdout.write(self.style.SUCCESS("Кеш сброшен."))
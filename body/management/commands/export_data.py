@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from body import export, filters
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгрузка товаров или заказов в CSV/XLSX с теми же фильтрами, что и "
+        "в списках. Строки читаются из БД порциями, память не растёт."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=["products", "orders"])
+        parser.add_argument("--format", choices=list(export.FORMATS), default="csv")
+        parser.add_argument(
+            "--output",
+            metavar="FILE",
+            help="Файл выгрузки (для csv по умолчанию — stdout)",
+        )
+        parser.add_argument("--q", default="", help="Поисковый запрос")
+        parser.add_argument("--supplier", default="", help="ID поставщика (товары)")
+        parser.add_argument(
+            "--show", default="", choices=["", "promo", "out_of_stock"]
+        )
+        parser.add_argument("--sort", default="")
+        parser.add_argument("--status", default="", help="Статус заказа (заказы)")
+        parser.add_argument(
+            "--date-from", type=parse_date, help="Заказы с даты (ГГГГ-ММ-ДД)"
+        )
+        parser.add_argument(
+            "--date-to", type=parse_date, help="Заказы по дату (ГГГГ-ММ-ДД)"
+        )
+        parser.add_argument("--point", default="", help="ID пункта выдачи (заказы)")
+
+    def handle(self, *args, **options):
+        file_format = options["format"]
+        if file_format == "xlsx":
+            if export.openpyxl is None:
+                raise CommandError("Для XLSX установите openpyxl")
+            if not options["output"]:
+                raise CommandError("Для XLSX укажите --output")
+
+        try:
+            exporter = self._exporter(options)
+        except ValueError as e:
+            raise CommandError(str(e)) from None
+        if file_format == "xlsx":
+            with open(options["output"], "wb") as f:
+                export.write_xlsx(exporter, f, options["kind"])
+        elif options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as f:
+                f.writelines(export.csv_chunks(exporter))
+        else:
+            for chunk in export.csv_chunks(exporter):
+                self.stdout.write(chunk, ending="")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Выгрузка записана в {options['output']}"))
+
+    def _exporter(self, options):
+        from body.models import Order, Product
+
+        query = options["q"].strip()
+        if options["kind"] == "products":
+            products, ordering = filters.filter_products(
+                Product.objects.all(),
+                query,
+                options["supplier"],
+                options["show"],
+                options["sort"],
+            )
+            return export.products(products.order_by(*ordering))
+
+        orders, ordering = filters.filter_orders(
+            Order.objects.all(),
+            query,
+            filters.is_exact_article(query),
+            status=options["status"],
+            date_from=options["date_from"],
+            date_to=options["date_to"],
+            point=options["point"],
+        )
+        return export.orders(orders.order_by(*ordering))
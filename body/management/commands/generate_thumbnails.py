@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from body.images import make_thumbnail
+from body.models import Product
+
+
+class Command(BaseCommand):
+    help = "Создание недостающих миниатюр для фото товаров"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=4, help="Число потоков обработки"
+        )
+
+    def handle(self, *args, **options):
+        names = list(
+            Product.objects.exclude(image="")
+            .exclude(image__isnull=True)
+            .values_list("image", flat=True)
+            .distinct()
+        )
+
+        def process(name):
+            try:
+                make_thumbnail(name)
+            except (OSError, ValueError) as e:
+                return name, e
+            return name, None
+
+        count = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            for name, error in pool.map(process, names):
+                if error:
+                    self.stdout.write(self.style.WARNING(f"  ⚠ {name}: {error}"))
+                else:
+                    count += 1
+        self.stdout.write(self.style.SUCCESS(f"Миниатюр: {count}"))
@@ -1,15 +1,131 @@
+import csv
+import hashlib
+import json
 import os
-import shutil
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
 
-from django.contrib.auth.hashers import make_password
+from django.contrib.auth.hashers import identify_hasher, make_password
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 try:
     import openpyxl
 except ImportError:
     openpyxl = None
 
+# Файлы импорта: имя шага → (имя файла без расширения, есть ли строка
+# заголовков, шаги, которые должны быть записаны в БД раньше).
+SOURCES = {
+    "delivery_points": ("Пункты выдачи_import", False, ()),
+    "products": ("Tovar", True, ()),
+    "users": ("user_import", True, ()),
+    "orders": ("Заказ_import", True, ("delivery_points", "products")),
+}
+
+FORMATS = {
+    "xlsx": ".xlsx",
+    "csv": ".csv",
+    "tsv": ".tsv",
+}
+
+PRODUCT_FIELDS = [
+    "name",
+    "unit",
+    "price",
+    "supplier",
+    "manufacturer",
+    "category",
+    "discount",
+    "stock",
+    "description",
+    "image",
+]
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def fingerprint(row_data):
+    """Хеш содержимого строки файла — по нему находятся неизменённые строки."""
+    payload = json.dumps(row_data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def to_decimal(raw, default="0"):
+    try:
+        return Decimal(str(raw).replace("%", "").replace(",", ".").strip())
+    except (InvalidOperation, ValueError, TypeError):
+        return Decimal(default)
+
+
+def unescape_formula(value):
+    """Снимает апостроф, которым body.export экранирует текст вида формулы."""
+    if isinstance(value, str) and value.startswith(("'=", "'+", "'-", "'@")):
+        return value[1:]
+    return value
+
+
+def iter_sheet(filepath):
+    """
+    Построчно читает файл, не загружая его целиком: xlsx открывается в
+    режиме read_only, csv/tsv читаются модулем csv.
+    """
+    if filepath.endswith((".csv", ".tsv")):
+        delimiter = "\t" if filepath.endswith(".tsv") else ","
+        with open(filepath, newline="", encoding="utf-8-sig") as f:
+            for row in csv.reader(f, delimiter=delimiter):
+                yield tuple(
+                    unescape_formula(value) if value != "" else None
+                    for value in row
+                )
+        return
+
+    wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            yield tuple(unescape_formula(value) for value in row)
+    finally:
+        wb.close()
+
+
+def read_rows(filepath):
+    """Строки листа в виде словарей «заголовок → значение»."""
+    rows = iter_sheet(filepath)
+    header_row = next(rows, None) or ()
+    headers = [str(value).strip() if value else "" for value in header_row]
+    for row in rows:
+        if not row or not row[0]:
+            continue
+        yield dict(zip(headers, row))
+
+
+def is_password_hash(value):
+    """
+    Строка уже является хешем Django (``алгоритм$...`` известного хешера) —
+    такие пароли из файла записываются без повторного хеширования.
+    """
+    try:
+        identify_hasher(value).decode(value)
+    except (ValueError, TypeError, IndexError):
+        return False
+    return True
+
+
+def parse_file(filepath, with_headers):
+    """Разбор файла целиком — выполняется в процессе-воркере при --workers."""
+    if with_headers:
+        return list(read_rows(filepath))
+    return list(iter_sheet(filepath))
+
 
 class Command(BaseCommand):
     help = "Импорт данных из Excel-файлов (Tovar, user_import, Заказ_import, Пункты выдачи)"
@@ -24,46 +140,173 @@ class Command(BaseCommand):
             default=".",
             help="Путь к папке с изображениями товаров",
         )
+        parser.add_argument(
+            "--format",
+            choices=sorted(FORMATS),
+            default="xlsx",
+            help="Формат входных файлов: xlsx (потоковое чтение), csv или tsv "
+            "с теми же заголовками колонок",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Записывать только новые и изменившиеся с прошлого импорта строки",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Число процессов для параллельного разбора файлов и "
+            "хеширования паролей (запись в БД идёт в порядке зависимостей "
+            "между файлами). Разобранный файл передаётся из воркера целиком, "
+            "поэтому в памяти держатся все строки файлов, ожидающих записи; "
+            "для очень больших файлов используйте --workers 1 (потоковое "
+            "чтение)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="Количество строк, записываемых в БД одной транзакцией",
+        )
 
     def handle(self, *args, **options):
-        if openpyxl is None:
+        if openpyxl is None and options["format"] == "xlsx":
             raise CommandError("Установите openpyxl: pip install openpyxl")
 
-        from body.models import (
-            Category,
-            DeliveryPoint,
-            Manufacturer,
-            Order,
-            Product,
-            Role,
-            Supplier,
-            User,
-        )
-
         import_path = options["path"]
         images_path = options.get("images_path", import_path)
+        self.batch_size = options["batch_size"]
+        self.incremental = options["incremental"]
+        self.workers = options["workers"]
+        if self.batch_size < 1:
+            raise CommandError("--batch-size должен быть больше нуля")
+
+        extension = FORMATS[options["format"]]
+        sources = {}
+        for step, (basename, _, _) in SOURCES.items():
+            filepath = os.path.join(import_path, f"{basename}{extension}")
+            if os.path.exists(filepath):
+                sources[step] = filepath
 
         self.stdout.write("=== Импорт данных из Excel ===")
 
         self._create_roles()
 
-        dp_file = os.path.join(import_path, "Пункты выдачи_import.xlsx")
-        if os.path.exists(dp_file):
-            self._import_delivery_points(dp_file)
+        writers = {
+            "delivery_points": self._import_delivery_points,
+            "products": lambda rows: self._import_products(rows, images_path),
+            "users": self._import_users,
+            "orders": self._import_orders,
+        }
 
-        products_file = os.path.join(import_path, "Tovar.xlsx")
-        if os.path.exists(products_file):
-            self._import_products(products_file, images_path)
+        if self.workers > 1:
+            self._run_parallel(sources, writers, self.workers)
+        else:
+            for step, filepath in sources.items():
+                with_headers = SOURCES[step][1]
+                rows = read_rows(filepath) if with_headers else iter_sheet(filepath)
+                writers[step](rows)
 
-        users_file = os.path.join(import_path, "user_import.xlsx")
-        if os.path.exists(users_file):
-            self._import_users(users_file)
+        self.stdout.write(self.style.SUCCESS("Импорт завершён успешно!"))
 
-        orders_file = os.path.join(import_path, "Заказ_import.xlsx")
-        if os.path.exists(orders_file):
-            self._import_orders(orders_file)
+    def _run_parallel(self, sources, writers, workers):
+        """
+        Файлы разбираются параллельно в пуле процессов; запись шага в БД
+        начинается, как только готов его файл и записаны все шаги, от которых
+        он зависит. Запись идёт в основном процессе, пока воркеры разбирают
+        остальные файлы.
+
+        Цена параллельности — память: файл возвращается из воркера списком
+        строк и лежит в памяти, пока не дойдёт очередь его записи (заказы
+        ждут товаров и пунктов выдачи). Без --workers строки читаются
+        потоково, пачками по --batch-size.
+        """
+        parsed = {}
+        written = set()
+
+        def write_ready():
+            progress = True
+            while progress:
+                progress = False
+                for step in list(parsed):
+                    depends_on = [d for d in SOURCES[step][2] if d in sources]
+                    if all(d in written for d in depends_on):
+                        writers[step](parsed.pop(step))
+                        written.add(step)
+                        progress = True
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(parse_file, filepath, SOURCES[step][1]): step
+                for step, filepath in sources.items()
+            }
+            for future in as_completed(futures):
+                parsed[futures[future]] = future.result()
+                write_ready()
+
+    def _report(self, label, count, started, stats=None):
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed > 0 else count
+        line = f"  {label}: {count} записей за {elapsed:.2f} с ({rate:.0f} строк/с)"
+        if stats is not None:
+            line += (
+                f"; новых: {stats['inserted']}, обновлено: {stats['updated']}, "
+                f"без изменений: {stats['unchanged']}, пропущено: {stats['skipped']}"
+            )
+        self.stdout.write(line)
+
+    def _split_unchanged(self, source, digests, existing_keys, stats):
+        """
+        Убирает из ``digests`` строки, которые не изменились с прошлого импорта
+        и чьи записи всё ещё есть в БД. Работает только в режиме --incremental.
+        """
+        from body.models import ImportFingerprint
+
+        if not self.incremental:
+            return digests
+        known = dict(
+            ImportFingerprint.objects.filter(
+                source=source, key__in=[str(key) for key in digests]
+            ).values_list("key", "digest")
+        )
+        changed = {}
+        for key, digest in digests.items():
+            if key in existing_keys and known.get(str(key)) == digest:
+                stats["unchanged"] += 1
+            else:
+                changed[key] = digest
+        return changed
+
+    def _store_fingerprints(self, source, digests):
+        """Запоминает хеши строк, которые этот импорт записал в БД."""
+        from body.models import ImportFingerprint
+
+        ImportFingerprint.objects.bulk_create(
+            [
+                ImportFingerprint(source=source, key=str(key), digest=digest)
+                for key, digest in digests.items()
+            ],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=["source", "key"],
+            update_fields=["digest"],
+        )
 
-        self.stdout.write(self.style.SUCCESS("Импорт завершён успешно!"))
+    def _resolve_names(self, model, names, cache):
+        """
+        Возвращает id справочных записей по именам, создавая недостающие
+        одним bulk_create. ``cache`` — предзагруженный словарь «имя → id».
+        """
+        missing = {name for name in names if name not in cache}
+        if missing:
+            model.objects.bulk_create(
+                [model(name=name) for name in missing], ignore_conflicts=True
+            )
+            cache.update(
+                model.objects.filter(name__in=missing).values_list("name", "pk")
+            )
+        return cache
 
     def _create_roles(self):
         from body.models import Role
@@ -78,227 +321,415 @@ class Command(BaseCommand):
             if created:
                 self.stdout.write(f"  + Роль: {role.get_name_display()}")
 
-    def _import_delivery_points(self, filepath):
+    def _import_delivery_points(self, rows):
+        from body import caching
+        from body.addresses import normalize
         from body.models import DeliveryPoint
 
-        wb = openpyxl.load_workbook(filepath)
-        ws = wb.active
+        started = time.monotonic()
+        existing = set(DeliveryPoint.objects.values_list("normalized", flat=True))
+        # Ключи адресов в порядке файла: в файле заказов пункт выдачи может
+        # быть указан номером строки этого файла.
+        self.point_positions = []
         count = 0
-        for row in ws.iter_rows(min_row=1, values_only=True):
-            if row[0]:
-                address = str(row[0]).strip()
-                if address:
-                    DeliveryPoint.objects.get_or_create(address=address)
-                    count += 1
-        self.stdout.write(f"  Пункты выдачи: {count} записей")
-
-    def _import_products(self, filepath, images_path):
-        import shutil
-
-        from django.conf import settings
-
-        from body.models import Category, Manufacturer, Product, Supplier
-
-        wb = openpyxl.load_workbook(filepath)
-        ws = wb.active
-
-        headers = [str(cell.value).strip() if cell.value else "" for cell in ws[1]]
+        for chunk in chunked(rows, self.batch_size):
+            new_points = []
+            for row in chunk:
+                if row and row[0]:
+                    address = str(row[0]).strip()
+                    if address:
+                        key = normalize(address)
+                        self.point_positions.append(key)
+                        if key not in existing:
+                            existing.add(key)
+                            new_points.append(
+                                DeliveryPoint(address=address, normalized=key)
+                            )
+                        count += 1
+
+            with transaction.atomic():
+                DeliveryPoint.objects.bulk_create(new_points)
+        caching.invalidate(caching.ORDERS)
+        caching.invalidate(caching.REFERENCE)
+        self._report("Пункты выдачи", count, started)
+
+    def _import_products(self, rows, images_path):
+        from body import caching
+        from body.images import ImageIngestor
+        from body.models import Category, Manufacturer, Supplier
+
+        started = time.monotonic()
+        self.images = ImageIngestor()
+        categories = dict(Category.objects.values_list("name", "pk"))
+        manufacturers = dict(Manufacturer.objects.values_list("name", "pk"))
+        suppliers = dict(Supplier.objects.values_list("name", "pk"))
 
         count = 0
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if not row[0]:
-                continue
-
-            row_data = dict(zip(headers, row))
-
-            category, _ = Category.objects.get_or_create(
-                name=str(row_data.get("Категория товара", "Без категории")).strip()
-            )
-            manufacturer, _ = Manufacturer.objects.get_or_create(
-                name=str(row_data.get("Производитель", "Неизвестен")).strip()
-            )
-            supplier, _ = Supplier.objects.get_or_create(
-                name=str(row_data.get("Поставщик", "Неизвестен")).strip()
-            )
-
-            discount_raw = row_data.get("Действующая скидка", 0) or 0
-            try:
-                discount = float(str(discount_raw).replace("%", "").strip())
-            except (ValueError, TypeError):
-                discount = 0.0
-
-            try:
-                price = float(str(row_data.get("Цена", 0)).replace(",", "."))
-            except (ValueError, TypeError):
-                price = 0.0
+        stats = Counter()
+        for chunk in chunked(rows, self.batch_size):
+            with transaction.atomic():
+                self._resolve_names(
+                    Category,
+                    {
+                        str(r.get("Категория товара", "Без категории")).strip()
+                        for r in chunk
+                    },
+                    categories,
+                )
+                self._resolve_names(
+                    Manufacturer,
+                    {str(r.get("Производитель", "Неизвестен")).strip() for r in chunk},
+                    manufacturers,
+                )
+                self._resolve_names(
+                    Supplier,
+                    {str(r.get("Поставщик", "Неизвестен")).strip() for r in chunk},
+                    suppliers,
+                )
+                count += self._write_products(
+                    chunk, images_path, categories, manufacturers, suppliers, stats
+                )
+
+        # bulk_create/bulk_update не отправляют сигналы — сбрасываем кеш сами.
+        caching.invalidate(caching.CATALOG)
+        caching.invalidate(caching.REFERENCE)
+        for name, error in self.images.wait():
+            self.stdout.write(self.style.WARNING(f"  ⚠ Фото {name}: {error}"))
+        self._report("Товары", count, started, stats)
+        self.stdout.write(f"  Фото товаров: {len(self.images.futures)} файлов")
+
+    def _parse_product(self, row_data, categories, manufacturers, suppliers):
+        try:
+            stock = int(row_data.get("Кол-во на складе", 0) or 0)
+        except (ValueError, TypeError):
+            stock = 0
+
+        return {
+            "article": str(row_data.get("Артикул", "")).strip(),
+            "name": str(row_data.get("Наименование товара", "")).strip(),
+            "unit": str(row_data.get("Единица измерения", "пара")).strip(),
+            "price": to_decimal(row_data.get("Цена", 0)),
+            "supplier_id": suppliers[
+                str(row_data.get("Поставщик", "Неизвестен")).strip()
+            ],
+            "manufacturer_id": manufacturers[
+                str(row_data.get("Производитель", "Неизвестен")).strip()
+            ],
+            "category_id": categories[
+                str(row_data.get("Категория товара", "Без категории")).strip()
+            ],
+            "discount": to_decimal(row_data.get("Действующая скидка", 0) or 0),
+            "stock": stock,
+            "description": str(row_data.get("Описание товара", "") or "").strip(),
+            "photo": str(row_data.get("Фото", "") or "").strip(),
+        }
 
-            try:
-                stock = int(row_data.get("Кол-во на складе", 0) or 0)
-            except (ValueError, TypeError):
-                stock = 0
-
-            article = str(row_data.get("Артикул", "")).strip()
-
-            product, created = Product.objects.update_or_create(
-                article=article,
-                defaults={
-                    "name": str(row_data.get("Наименование товара", "")).strip(),
-                    "unit": str(row_data.get("Единица измерения", "пара")).strip(),
-                    "price": price,
-                    "supplier": supplier,
-                    "manufacturer": manufacturer,
-                    "category": category,
-                    "discount": discount,
-                    "stock": stock,
-                    "description": str(
-                        row_data.get("Описание товара", "") or ""
-                    ).strip(),
-                },
+    def _write_products(
+        self, rows, images_path, categories, manufacturers, suppliers, stats
+    ):
+        from body import search
+        from body.models import ImportFingerprint, Product
+
+        parsed, digests = {}, {}
+        for row_data in rows:
+            data = self._parse_product(row_data, categories, manufacturers, suppliers)
+            parsed[data["article"]] = data
+            digests[data["article"]] = fingerprint(row_data)
+
+        existing_articles = set(
+            Product.objects.filter(article__in=list(parsed)).values_list(
+                "article", flat=True
             )
+        )
+        digests = self._split_unchanged(
+            ImportFingerprint.PRODUCT, digests, existing_articles, stats
+        )
+        parsed = {article: parsed[article] for article in digests}
+        if not parsed:
+            return len(rows)
+
+        existing = Product.objects.in_bulk(list(parsed), field_name="article")
+        to_create, to_update = [], []
+        for article, data in parsed.items():
+            photo_name = data.pop("photo")
+            product = existing.get(article)
+            if product is None:
+                product = Product(**data)
+                to_create.append(product)
+            else:
+                if data["stock"] < product.reserved:
+                    self.stdout.write(
+                        self.style.WARNING(
+                            f"  ⚠ Товар {article}: остаток {data['stock']} меньше "
+                            f"резерва {product.reserved} — оставлен равным резерву."
+                        )
+                    )
+                    data["stock"] = product.reserved
+                for field, value in data.items():
+                    setattr(product, field, value)
+                to_update.append(product)
 
-            photo_name = str(row_data.get("Фото", "") or "").strip()
             if photo_name and not product.image:
-                src_path = os.path.join(images_path, photo_name)
-                if os.path.exists(src_path):
-                    from django.conf import settings
-
-                    dest_dir = os.path.join(settings.MEDIA_ROOT, "products")
-                    os.makedirs(dest_dir, exist_ok=True)
-                    dest_path = os.path.join(dest_dir, photo_name)
-                    shutil.copy2(src_path, dest_path)
-                    product.image = f"products/{photo_name}"
-                    product.save()
-
-            count += 1
-
-        self.stdout.write(f"  Товары: {count} записей")
-
-    def _import_users(self, filepath):
-        from body.models import Role, User
-
-        wb = openpyxl.load_workbook(filepath)
-        ws = wb.active
-        headers = [str(cell.value).strip() if cell.value else "" for cell in ws[1]]
-
+                product.image = self._ingest_image(images_path, photo_name)
+
+        Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+        Product.objects.bulk_update(to_update, PRODUCT_FIELDS, batch_size=self.batch_size)
+        self._store_fingerprints(ImportFingerprint.PRODUCT, digests)
+        search.index_products(Product.objects.filter(article__in=list(parsed)))
+        stats["inserted"] += len(to_create)
+        stats["updated"] += len(to_update)
+        return len(rows)
+
+    def _ingest_image(self, images_path, photo_name):
+        src_path = os.path.join(images_path, photo_name)
+        if not os.path.exists(src_path):
+            return None
+        return self.images.submit(src_path)
+
+    def _import_users(self, rows):
+        from body.models import ImportFingerprint, Role, User
+
+        started = time.monotonic()
         role_map = {
             "Администратор": Role.ADMIN,
             "Менеджер": Role.MANAGER,
             "Авторизованный клиент": Role.CLIENT,
         }
+        roles = {role.name: role for role in Role.objects.all()}
 
         count = 0
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if not row[0]:
-                continue
-
-            row_data = dict(zip(headers, row))
-            role_name_excel = str(row_data.get("Роль сотрудника", "")).strip()
-            role_key = role_map.get(role_name_excel, Role.CLIENT)
-
-            try:
-                role = Role.objects.get(name=role_key)
-            except Role.DoesNotExist:
-                continue
-
-            username = str(row_data.get("Логин", "")).strip()
-            password = str(row_data.get("Пароль", "")).strip()
-            full_name = str(row_data.get("ФИО", "")).strip()
-
-            if not username:
-                continue
-
-            user, created = User.objects.get_or_create(
-                username=username,
-                defaults={
-                    "full_name": full_name,
-                    "role": role,
-                    "password": make_password(password),
-                },
-            )
-            count += 1
-
-        self.stdout.write(f"  Пользователи: {count} записей")
+        stats = Counter()
+        pool = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        with pool or nullcontext():
+            for chunk in chunked(rows, self.batch_size):
+                new_users, digests = {}, {}
+                for row_data in chunk:
+                    role_name_excel = str(row_data.get("Роль сотрудника", "")).strip()
+                    role = roles.get(role_map.get(role_name_excel, Role.CLIENT))
+                    if role is None:
+                        stats["skipped"] += 1
+                        continue
+
+                    username = str(row_data.get("Логин", "")).strip()
+                    password = str(row_data.get("Пароль", "")).strip()
+                    full_name = str(row_data.get("ФИО", "")).strip()
+
+                    if not username:
+                        stats["skipped"] += 1
+                        continue
+
+                    new_users.setdefault(
+                        username,
+                        (full_name, role, password),
+                    )
+                    digests.setdefault(username, fingerprint(row_data))
+                    count += 1
 
-    def _import_orders(self, filepath):
-        from body.models import DeliveryPoint, Order
+                existing = set(
+                    User.objects.filter(username__in=list(new_users)).values_list(
+                        "username", flat=True
+                    )
+                )
+                digests = self._split_unchanged(
+                    ImportFingerprint.USER, digests, existing, stats
+                )
+                # Существующие учётные записи импорт не перезаписывает.
+                stats["skipped"] += len(existing.intersection(digests))
+                to_create = [
+                    (username, full_name, role, password)
+                    for username, (full_name, role, password) in new_users.items()
+                    if username in digests and username not in existing
+                ]
+                passwords = self._hash_passwords(
+                    [password for *_, password in to_create], stats, pool
+                )
+                users = [
+                    User(
+                        username=username,
+                        full_name=full_name,
+                        role=role,
+                        password=password,
+                    )
+                    for (username, full_name, role, _), password in zip(
+                        to_create, passwords
+                    )
+                ]
+                with transaction.atomic():
+                    User.objects.bulk_create(users, batch_size=self.batch_size)
+                    # Хеши — только записанных строк: пропущенная строка должна
+                    # снова сравниваться со своей учётной записью.
+                    self._store_fingerprints(
+                        ImportFingerprint.USER,
+                        {user.username: digests[user.username] for user in users},
+                    )
+                stats["inserted"] += len(users)
 
-        wb = openpyxl.load_workbook(filepath)
-        ws = wb.active
-        headers = [str(cell.value).strip() if cell.value else "" for cell in ws[1]]
+        self._report("Пользователи", count, started, stats)
+        self.stdout.write(
+            f"  Пароли: хешировано {stats['hashed']}"
+            + (f" в {self.workers} процессах" if pool else "")
+            + f", готовых хешей {stats['prehashed']}"
+        )
 
+    def _hash_passwords(self, passwords, stats, pool):
+        """
+        Хеши паролей в том же порядке. PBKDF2 занимает сотни миллисекунд на
+        пароль, поэтому при --workers > 1 хеширование идёт в пуле процессов.
+        """
+        result = list(passwords)
+        todo = [
+            i for i, password in enumerate(passwords) if not is_password_hash(password)
+        ]
+        stats["prehashed"] += len(passwords) - len(todo)
+        stats["hashed"] += len(todo)
+        plain = [passwords[i] for i in todo]
+        if pool is not None and len(plain) > 1:
+            chunksize = max(1, len(plain) // (self.workers * 4))
+            hashed = pool.map(make_password, plain, chunksize=chunksize)
+        else:
+            hashed = map(make_password, plain)
+        for i, password in zip(todo, hashed):
+            result[i] = password
+        return result
+
+    def _parse_date(self, value, number, label, fallback_message):
+        if isinstance(value, str):
+            try:
+                return datetime.strptime(value, "%d.%m.%Y").date()
+            except ValueError:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'  ⚠ Заказ №{number}: невалидная {label} "{value}" — '
+                        f"{fallback_message}"
+                    )
+                )
+                return None
+        if hasattr(value, "date"):
+            return value.date()
+        return value
+
+    def _import_orders(self, rows):
+        from body import caching, search
+        from body import orders as order_items
+        from body.addresses import FUZZY, DeliveryPointIndex
+        from body.models import ImportFingerprint, Order, OrderItem
+
+        started = time.monotonic()
         status_map = {
             "Завершен": Order.STATUS_COMPLETED,
             "Новый": Order.STATUS_NEW,
             "Отменен": Order.STATUS_CANCELLED,
         }
+        points = DeliveryPointIndex.load(getattr(self, "point_positions", None))
+        matches = Counter()
+        fuzzy_confidence = []
 
         count = 0
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if not row[0]:
-                continue
-
-            row_data = dict(zip(headers, row))
-
-            try:
-                number = int(row_data.get("Номер заказа", 0))
-            except (ValueError, TypeError):
-                continue
-
-            dp_address = str(row_data.get("Адрес пункта выдачи", "") or "").strip()
-            delivery_point = None
-            if dp_address:
-                delivery_point = DeliveryPoint.objects.filter(
-                    address__icontains=dp_address[:30]
-                ).first()
-
-            order_date = row_data.get("Дата заказа")
-            if isinstance(order_date, str):
-                try:
-                    order_date = datetime.strptime(order_date, "%d.%m.%Y").date()
-                except ValueError:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'  ⚠ Заказ №{number}: невалидная дата заказа "{order_date}" — '
-                            f"заменена на сегодняшнюю. Это ошибка в исходных данных."
-                        )
-                    )
-                    order_date = None
-            elif hasattr(order_date, "date"):
-                order_date = order_date.date()
-
-            delivery_date = row_data.get("Дата доставки")
-            if isinstance(delivery_date, str):
+        stats = Counter()
+        for chunk in chunked(rows, self.batch_size):
+            orders, digests = {}, {}
+            for row_data in chunk:
                 try:
-                    delivery_date = datetime.strptime(delivery_date, "%d.%m.%Y").date()
-                except ValueError:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'  ⚠ Заказ №{number}: невалидная дата доставки "{delivery_date}" — пропущена.'
-                        )
-                    )
-                    delivery_date = None
-            elif hasattr(delivery_date, "date"):
-                delivery_date = delivery_date.date()
-
-            status_raw = str(row_data.get("Статус заказа", "Новый")).strip()
-            status = status_map.get(status_raw, Order.STATUS_NEW)
-
-            Order.objects.get_or_create(
-                number=number,
-                defaults={
-                    "article": str(row_data.get("Артикул заказа", "") or "").strip(),
-                    "order_date": order_date or datetime.now().date(),
-                    "delivery_date": delivery_date,
-                    "delivery_point": delivery_point,
-                    "client_name": str(
-                        row_data.get("ФИО авторизированного клиента", "") or ""
-                    ).strip(),
-                    "pickup_code": str(
-                        row_data.get("Код для получения", "") or ""
-                    ).strip(),
-                    "status": status,
-                },
+                    number = int(row_data.get("Номер заказа", 0))
+                except (ValueError, TypeError):
+                    stats["skipped"] += 1
+                    continue
+
+                match = None
+                dp_value = row_data.get("Адрес пункта выдачи")
+                if dp_value not in (None, ""):
+                    match = points.match(dp_value)
+                    matches[match.method if match else None] += 1
+                    if match and match.method == FUZZY:
+                        fuzzy_confidence.append(match.confidence)
+
+                order_date = self._parse_date(
+                    row_data.get("Дата заказа"),
+                    number,
+                    "дата заказа",
+                    "заменена на сегодняшнюю. Это ошибка в исходных данных.",
+                )
+                delivery_date = self._parse_date(
+                    row_data.get("Дата доставки"),
+                    number,
+                    "дата доставки",
+                    "пропущена.",
+                )
+
+                status_raw = str(row_data.get("Статус заказа", "Новый")).strip()
+                status = status_map.get(status_raw, Order.STATUS_NEW)
+
+                orders.setdefault(
+                    number,
+                    Order(
+                        number=number,
+                        article=str(row_data.get("Артикул заказа", "") or "").strip(),
+                        order_date=order_date or datetime.now().date(),
+                        delivery_date=delivery_date,
+                        delivery_point_id=match.point_id if match else None,
+                        client_name=str(
+                            row_data.get("ФИО авторизированного клиента", "") or ""
+                        ).strip(),
+                        pickup_code=str(
+                            row_data.get("Код для получения", "") or ""
+                        ).strip(),
+                        status=status,
+                    ),
+                )
+                digests.setdefault(number, fingerprint(row_data))
+                count += 1
+
+            existing = set(
+                Order.objects.filter(number__in=list(orders)).values_list(
+                    "number", flat=True
+                )
+            )
+            digests = self._split_unchanged(
+                ImportFingerprint.ORDER, digests, existing, stats
+            )
+            # Как и раньше, уже загруженные заказы не перезаписываются.
+            stats["skipped"] += len(existing.intersection(digests))
+            new_numbers = [number for number in digests if number not in existing]
+            # Резерв под новые заказы импорт не ставит: stock из файла товаров —
+            # складской остаток. Такой заказ (stock_reserved=False) спишет
+            # товар при завершении с проверкой свободного остатка (stock.commit).
+            with transaction.atomic():
+                Order.objects.bulk_create(
+                    [orders[number] for number in new_numbers],
+                    batch_size=self.batch_size,
+                )
+                created = Order.objects.filter(number__in=new_numbers)
+                OrderItem.objects.bulk_create(
+                    order_items.build_items(created.only("pk", "article")),
+                    batch_size=self.batch_size,
+                )
+                self._store_fingerprints(
+                    ImportFingerprint.ORDER,
+                    {number: digests[number] for number in new_numbers},
+                )
+                search.index_orders(created)
+            stats["inserted"] += len(new_numbers)
+
+        caching.invalidate(caching.ORDERS)
+        self._report("Заказы", count, started, stats)
+        self._report_point_matches(matches, fuzzy_confidence)
+
+    def _report_point_matches(self, matches, fuzzy_confidence):
+        from body.addresses import EXACT, POSITION
+
+        if not matches:
+            return
+        line = (
+            f"  Пункты выдачи в заказах: по адресу {matches[EXACT]}, "
+            f"по номеру {matches[POSITION]}, приблизительно {len(fuzzy_confidence)}"
+        )
+        if fuzzy_confidence:
+            line += f" (мин. уверенность {min(fuzzy_confidence):.2f})"
+        line += f", не найдено {matches[None]}"
+        self.stdout.write(line)
+        if matches[None]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"  ⚠ Для {matches[None]} заказов пункт выдачи не найден"
+                )
             )
-            count += 1
-
-        self.stdout.write(f"  Заказы: {count} записей")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from body import search
+
+
+class Command(BaseCommand):
+    help = "Перестроение полнотекстового индекса товаров и заказов"
+
+    def handle(self, *args, **options):
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS("Поисковый индекс перестроен."))
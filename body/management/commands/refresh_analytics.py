@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Обновление сводных таблиц аналитики. По умолчанию обрабатываются "
+        "только заказы, изменённые или удалённые с прошлого запуска."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true", help="Пересчитать все таблицы заново"
+        )
+
+    def handle(self, *args, **options):
+        from body.analytics import refresh
+
+        started = time.perf_counter()
+        result = refresh(full=options["full"])
+        mode = "полное" if result["full"] else "инкрементальное"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Аналитика обновлена ({mode}) за {time.perf_counter() - started:.2f} с: "
+                f"заказов {result['orders']}, дней {result['days']}, "
+                f"артикулов {result['articles']}"
+            )
+        )
@@ -0,0 +1,188 @@
+"""
+Метрики запросов: число и время SQL, время рендеринга шаблонов, размер
+ответа. Отдаются заголовком Server-Timing и пишутся в лог ``body.metrics``.
+
+Представление может объявить бюджет запросов декоратором
+:func:`query_budget`. Превышение пишется в лог, а при
+``settings.QUERY_BUDGET_STRICT`` (включается тестовым раннером) вызывает
+:class:`QueryBudgetExceeded`.
+"""
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+# Метрики текущего запроса. ContextVar, а не атрибут потока: async ORM
+# выполняет SQL в другом потоке, а asgiref переносит туда контекст.
+_current = ContextVar("request_metrics", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_time = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self._template_depth = 0
+        self.size = None
+
+    def as_dict(self):
+        return {
+            "queries": self.queries,
+            "sql_ms": round(self.sql_time * 1000, 2),
+            "template_ms": round(self.template_time * 1000, 2),
+            "total_ms": round(self.total_time * 1000, 2),
+            "bytes": self.size,
+        }
+
+    def server_timing(self):
+        return ", ".join(
+            [
+                f'sql;dur={self.sql_time * 1000:.2f};desc="{self.queries} queries"',
+                f"tpl;dur={self.template_time * 1000:.2f}",
+                f"total;dur={self.total_time * 1000:.2f}",
+            ]
+        )
+
+
+def query_budget(limit):
+    """Максимум SQL-запросов на один запрос к представлению (с сессией и авторизацией)."""
+
+    def decorator(view_func):
+        view_func.query_budget = limit
+        return view_func
+
+    return decorator
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.sql_time += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def _install_query_recorder(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@contextmanager
+def _template_timer():
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    # Вложенный рендеринг (render_to_string внутри шаблона) не считаем дважды.
+    metrics._template_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics._template_depth -= 1
+        if not metrics._template_depth:
+            metrics.template_time += time.perf_counter() - started
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with _template_timer():
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, замеряющий время рендеринга для метрик запроса."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class RequestMetricsMiddleware:
+    """
+    Должен стоять первым в MIDDLEWARE, чтобы учитывались и запросы
+    сессии/авторизации.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics)
+
+    def _finish(self, request, response, metrics):
+        metrics.total_time = time.perf_counter() - metrics.started
+        if not response.streaming:
+            metrics.size = len(response.content)
+        response.metrics = metrics
+        response["Server-Timing"] = metrics.server_timing()
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else None
+        logger.info(
+            json.dumps(
+                {
+                    "method": request.method,
+                    "path": request.path,
+                    "view": view,
+                    "status": response.status_code,
+                    **metrics.as_dict(),
+                },
+                ensure_ascii=False,
+            )
+        )
+
+        budget = getattr(match.func, "query_budget", None) if match else None
+        if budget is not None and metrics.queries > budget:
+            message = (
+                f"{view}: {metrics.queries} SQL-запросов при бюджете {budget}"
+            )
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,95 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS body_product_fts USING fts5("
+    "name, article, description, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS body_order_fts USING fts5("
+    "client_name, number, article, tokenize='unicode61 remove_diacritics 2')",
+]
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS body_product_fts",
+    "DROP TABLE IF EXISTS body_order_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS body_product_search_idx ON body_product USING gin "
+    "(to_tsvector('russian', translate(lower("
+    "coalesce(\"body_product\".\"name\", '') || ' ' || "
+    "coalesce(\"body_product\".\"article\", '') || ' ' || "
+    "coalesce(\"body_product\".\"description\", '')), 'ё', 'е')))",
+    "CREATE INDEX IF NOT EXISTS body_order_search_idx ON body_order USING gin "
+    "(to_tsvector('russian', translate(lower("
+    "coalesce(\"body_order\".\"client_name\", '') || ' ' || "
+    "\"body_order\".\"number\"::text || ' ' || "
+    "coalesce(\"body_order\".\"article\", '')), 'ё', 'е')))",
+    "CREATE INDEX IF NOT EXISTS body_product_article_trgm_idx ON body_product "
+    "USING gin (upper(article) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS body_order_article_trgm_idx ON body_order "
+    "USING gin (upper(article) gin_trgm_ops)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS body_product_search_idx",
+    "DROP INDEX IF EXISTS body_order_search_idx",
+    "DROP INDEX IF EXISTS body_product_article_trgm_idx",
+    "DROP INDEX IF EXISTS body_order_article_trgm_idx",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for sql in SQLITE_FORWARD:
+            schema_editor.execute(sql)
+        _fill_sqlite_index(apps, schema_editor)
+    elif vendor == "postgresql":
+        for sql in POSTGRES_FORWARD:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {"sqlite": SQLITE_BACKWARD, "postgresql": POSTGRES_BACKWARD}
+    for sql in statements.get(vendor, []):
+        schema_editor.execute(sql)
+
+
+def _fill_sqlite_index(apps, schema_editor):
+    Product = apps.get_model("body", "Product")
+    Order = apps.get_model("body", "Order")
+
+    def normalize(value):
+        return str(value or "").lower().replace("ё", "е")
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO body_product_fts (rowid, name, article, description) "
+            "VALUES (%s, %s, %s, %s)",
+            [
+                [pk, *map(normalize, values)]
+                for pk, *values in Product.objects.values_list(
+                    "pk", "name", "article", "description"
+                ).iterator()
+            ],
+        )
+        cursor.executemany(
+            "INSERT INTO body_order_fts (rowid, client_name, number, article) "
+            "VALUES (%s, %s, %s, %s)",
+            [
+                [pk, *map(normalize, values)]
+                for pk, *values in Order.objects.values_list(
+                    "pk", "client_name", "number", "article"
+                ).iterator()
+            ],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("body", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
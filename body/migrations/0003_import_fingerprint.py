@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('body', '0002_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('product', 'Товар'), ('order', 'Заказ'), ('user', 'Пользователь')], max_length=20)),
+                ('key', models.CharField(max_length=255, verbose_name='Ключ строки')),
+                ('digest', models.CharField(max_length=32, verbose_name='Хеш содержимого')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source', 'key'), name='unique_import_fingerprint')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+import django.db.models.expressions
+import django.db.models.functions.math
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('body', '0003_import_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='final_price',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('price'), '*', django.db.models.expressions.CombinedExpression(models.Value(Decimal('100')), '-', models.F('discount'))), '*', models.Value(Decimal('0.01'))), 2), output_field=models.DecimalField(decimal_places=2, max_digits=10), verbose_name='Цена со скидкой'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='is_promo',
+            field=models.GeneratedField(db_persist=True, expression=models.ExpressionWrapper(models.Q(('discount__gt', 15)), output_field=models.BooleanField()), output_field=models.BooleanField(), verbose_name='Акция'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['final_price'], name='product_final_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock'], name='product_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['discount'], name='product_discount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_promo'], name='product_is_promo_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def parse_articles(text):
+    tokens = [token.strip() for token in str(text or "").split(",")]
+    tokens = [token for token in tokens if token]
+    items = []
+    i = 0
+    while i < len(tokens):
+        article = tokens[i]
+        quantity = 1
+        if i + 1 < len(tokens) and tokens[i + 1].isdigit():
+            quantity = int(tokens[i + 1])
+            i += 1
+        items.append((article, quantity))
+        i += 1
+    return items
+
+
+def backfill_items(apps, schema_editor):
+    Order = apps.get_model("body", "Order")
+    OrderItem = apps.get_model("body", "OrderItem")
+    Product = apps.get_model("body", "Product")
+
+    products = {
+        article: (pk, final_price)
+        for pk, article, final_price in Product.objects.values_list(
+            "pk", "article", "final_price"
+        )
+    }
+    items = []
+    for order_id, article_text in Order.objects.values_list("pk", "article").iterator():
+        for article, quantity in parse_articles(article_text):
+            product_id, price = products.get(article, (None, None))
+            items.append(
+                OrderItem(
+                    order_id=order_id,
+                    product_id=product_id,
+                    article=article,
+                    quantity=quantity,
+                    price=price,
+                )
+            )
+        if len(items) >= 2000:
+            OrderItem.objects.bulk_create(items)
+            items = []
+    OrderItem.objects.bulk_create(items)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('body', '0005_list_view_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('article', models.CharField(max_length=50, verbose_name='Артикул')),
+                ('quantity', models.PositiveIntegerField(default=1, verbose_name='Количество')),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Цена на момент заказа')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='body.order')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='order_items', to='body.product')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(backfill_items, migrations.RunPython.noop),
+    ]
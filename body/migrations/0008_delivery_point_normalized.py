@@ -0,0 +1,35 @@
+import re
+
+from django.db import migrations, models
+
+STOP_WORDS = {"г", "гор", "город", "ул", "улица", "д", "дом"}
+
+
+def normalize(address):
+    tokens = re.findall(r"\w+", str(address or "").lower().replace("ё", "е"))
+    return " ".join(token for token in tokens if token not in STOP_WORDS)
+
+
+def fill_normalized(apps, schema_editor):
+    DeliveryPoint = apps.get_model("body", "DeliveryPoint")
+    points = list(DeliveryPoint.objects.only("address"))
+    for point in points:
+        point.normalized = normalize(point.address)
+    DeliveryPoint.objects.bulk_update(points, ["normalized"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('body', '0007_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverypoint',
+            name='normalized',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=500, verbose_name='Ключ адреса'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+import body.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('body', '0010_analytics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSearchIndex',
+            fields=[
+                ('order', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='body.order')),
+                ('document', body.models.SearchDocumentField(db_column='body_order_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'body_order_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='body.product')),
+                ('document', body.models.SearchDocumentField(db_column='body_product_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'body_product_fts',
+                'managed': False,
+            },
+        ),
+    ]
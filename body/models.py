@@ -1,8 +1,15 @@
 from decimal import Decimal
 
 from django.contrib.auth.models import AbstractUser
+from django.core.files.storage import default_storage
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Round
+from django.utils.functional import cached_property
+
+from . import addresses
+from .images import thumbnail_name
 
 
 class Role(models.Model):
@@ -23,27 +30,57 @@ class Role(models.Model):
         return self.get_name_display()
 
 
+# Возможности ролей. Проверки прав в шаблонах и представлениях сводятся к
+# поиску в этом наборе, без обращений к БД.
+FILTER = "filter"
+VIEW_ORDERS = "view_orders"
+EDIT_PRODUCTS = "edit_products"
+EDIT_ORDERS = "edit_orders"
+VIEW_ANALYTICS = "view_analytics"
+
+ROLE_CAPABILITIES = {
+    Role.CLIENT: frozenset(),
+    Role.MANAGER: frozenset({FILTER, VIEW_ORDERS, VIEW_ANALYTICS}),
+    Role.ADMIN: frozenset(
+        {FILTER, VIEW_ORDERS, EDIT_PRODUCTS, EDIT_ORDERS, VIEW_ANALYTICS}
+    ),
+}
+
+
 class User(AbstractUser):
     full_name = models.CharField(max_length=255, verbose_name="ФИО", blank=True)
     role = models.ForeignKey(Role, on_delete=models.PROTECT, null=True, blank=True)
 
+    @cached_property
+    def capabilities(self):
+        """
+        Набор возможностей роли. Роль загружается вместе с пользователем
+        (``body.backends.RoleBackend``), поэтому запросов здесь нет.
+        """
+        if not self.role_id:
+            return frozenset()
+        return ROLE_CAPABILITIES.get(self.role.name, frozenset())
+
     def is_admin(self):
-        return self.role and self.role.name == Role.ADMIN
+        return self.role_id is not None and self.role.name == Role.ADMIN
 
     def is_manager(self):
-        return self.role and self.role.name == Role.MANAGER
+        return self.role_id is not None and self.role.name == Role.MANAGER
 
     def can_filter(self):
-        return self.role and self.role.name in [Role.MANAGER, Role.ADMIN]
+        return FILTER in self.capabilities
 
     def can_edit_products(self):
-        return self.role and self.role.name == Role.ADMIN
+        return EDIT_PRODUCTS in self.capabilities
 
     def can_view_orders(self):
-        return self.role and self.role.name in [Role.MANAGER, Role.ADMIN]
+        return VIEW_ORDERS in self.capabilities
 
     def can_edit_orders(self):
-        return self.role and self.role.name == Role.ADMIN
+        return EDIT_ORDERS in self.capabilities
+
+    def can_view_analytics(self):
+        return VIEW_ANALYTICS in self.capabilities
 
     def __str__(self):
         return self.full_name or self.username
@@ -79,6 +116,9 @@ class Supplier(models.Model):
         return self.name
 
 
+PROMO_DISCOUNT = 15
+
+
 class Product(models.Model):
     article = models.CharField(max_length=50, unique=True, verbose_name="Артикул")
     name = models.CharField(max_length=255, verbose_name="Наименование")
@@ -99,10 +139,34 @@ class Product(models.Model):
     stock = models.IntegerField(
         default=0, validators=[MinValueValidator(0)], verbose_name="Кол-во на складе"
     )
+    reserved = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="В резерве"
+    )
     description = models.TextField(blank=True, verbose_name="Описание")
     image = models.ImageField(
         upload_to="products/", blank=True, null=True, verbose_name="Фото"
     )
+    # Вычисляются базой данных при любой записи, включая bulk-импорт, поэтому
+    # по ним можно сортировать и фильтровать в SQL.
+    final_price = models.GeneratedField(
+        expression=Round(
+            F("price")
+            * (Value(Decimal("100")) - F("discount"))
+            * Value(Decimal("0.01")),
+            2,
+        ),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+        verbose_name="Цена со скидкой",
+    )
+    is_promo = models.GeneratedField(
+        expression=ExpressionWrapper(
+            Q(discount__gt=PROMO_DISCOUNT), output_field=models.BooleanField()
+        ),
+        output_field=models.BooleanField(),
+        db_persist=True,
+        verbose_name="Акция",
+    )
 
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
     manufacturer = models.ForeignKey(Manufacturer, on_delete=models.PROTECT)
@@ -110,14 +174,35 @@ class Product(models.Model):
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            models.Index(fields=["name"], name="product_name_idx"),
+            models.Index(fields=["final_price"], name="product_final_price_idx"),
+            models.Index(fields=["stock"], name="product_stock_idx"),
+            models.Index(fields=["discount"], name="product_discount_idx"),
+            models.Index(fields=["is_promo"], name="product_is_promo_idx"),
+            models.Index(fields=["supplier", "name"], name="product_supplier_name_idx"),
+            models.Index(
+                fields=["supplier", "stock"], name="product_supplier_stock_idx"
+            ),
+            models.Index(
+                fields=["supplier", "final_price"], name="product_supplier_price_idx"
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(reserved__lte=F("stock")),
+                name="product_reserved_lte_stock",
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.atricle} — {self.name}"
+        return f"{self.article} — {self.name}"
 
-    def get_final_price(self):
-        if self.discount > 0:
-            return self.price * (1 - self.discount / 100)
-        return self.price
+    def get_thumbnail_url(self):
+        return default_storage.url(thumbnail_name(self.image.name))
+
+    def get_available(self):
+        return self.stock - self.reserved
 
     def has_discount(self):
         return self.discount > 0
@@ -125,17 +210,27 @@ class Product(models.Model):
     def get_row_class(self):
         if self.stock == 0:
             return "table-info"
-        if self.discount > 15:
+        if self.discount > PROMO_DISCOUNT:
             return "row-promo"
         return ""
 
 
 class DeliveryPoint(models.Model):
     address = models.CharField(max_length=500, verbose_name="Адрес пункта выдачи")
+    normalized = models.CharField(
+        max_length=500,
+        db_index=True,
+        editable=False,
+        verbose_name="Ключ адреса",
+    )
 
     def __str__(self):
         return self.address
 
+    def save(self, *args, **kwargs):
+        self.normalized = addresses.normalize(self.address)
+        super().save(*args, **kwargs)
+
 
 class Order(models.Model):
     STATUS_NEW = "new"
@@ -164,9 +259,176 @@ class Order(models.Model):
         DeliveryPoint, on_delete=models.PROTECT, null=True, blank=True
     )
     client = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    stock_reserved = models.BooleanField(
+        default=False, editable=False, verbose_name="Товар зарезервирован"
+    )
+    # По этому полю refresh_analytics находит изменённые заказы.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ["-order_date"]
+        indexes = [
+            models.Index(fields=["order_date"], name="order_date_idx"),
+            models.Index(fields=["status", "order_date"], name="order_status_date_idx"),
+            models.Index(fields=["article"], name="order_article_idx"),
+            models.Index(
+                fields=["delivery_point", "order_date"], name="order_point_date_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Заказ №{self.number} — {self.client_name}"
+
+
+class OrderItem(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="order_items",
+    )
+    article = models.CharField(max_length=50, db_index=True, verbose_name="Артикул")
+    quantity = models.PositiveIntegerField(default=1, verbose_name="Количество")
+    price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="Цена на момент заказа",
+    )
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.article} × {self.quantity}"
+
+
+# Полнотекстовые индексы SQLite (FTS5-таблицы из миграции 0002_search_index).
+# Таблицы создаёт миграция, модели только читают их: поиск соединяется с
+# товарами и заказами одним JOIN по rowid и берёт релевантность из ``rank``.
+
+
+class SearchDocumentField(models.TextField):
+    """Скрытый столбец FTS5 с именем таблицы — к нему применяется MATCH."""
+
+
+class ProductSearchIndex(models.Model):
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        related_name="search_index",
+    )
+    document = SearchDocumentField(db_column="body_product_fts")
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "body_product_fts"
+
+
+class OrderSearchIndex(models.Model):
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        related_name="search_index",
+    )
+    document = SearchDocumentField(db_column="body_order_fts")
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "body_order_fts"
+
+
+class ImportFingerprint(models.Model):
+    PRODUCT = "product"
+    ORDER = "order"
+    USER = "user"
+
+    SOURCE_CHOICES = [
+        (PRODUCT, "Товар"),
+        (ORDER, "Заказ"),
+        (USER, "Пользователь"),
+    ]
+
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    key = models.CharField(max_length=255, verbose_name="Ключ строки")
+    digest = models.CharField(max_length=32, verbose_name="Хеш содержимого")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source", "key"], name="unique_import_fingerprint"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.source}:{self.key}"
+
+
+# Сводные таблицы аналитики. Заполняются командой refresh_analytics
+# (body/analytics.py) и только читаются дашбордом.
+
+
+class DailyOrderStats(models.Model):
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.PositiveIntegerField(default=0)
+    items = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "status"], name="unique_daily_stats")
+        ]
+
+
+class ArticleSales(models.Model):
+    article = models.CharField(max_length=50, unique=True)
+    product = models.ForeignKey(
+        Product, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    orders = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["-quantity"], name="article_sales_qty_idx")]
+
+
+class SupplierStock(models.Model):
+    supplier = models.OneToOneField(
+        Supplier, on_delete=models.CASCADE, related_name="+"
+    )
+    products = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    stock_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    promo_products = models.PositiveIntegerField(default=0)
+
+
+class AnalyticsOrder(models.Model):
+    """
+    Дата и состав заказа на момент последнего обновления аналитики: по ним
+    при изменении или удалении заказа пересчитываются и прежние день и
+    артикулы. ``order_id`` без внешнего ключа — запись переживает заказ.
+    """
+
+    order_id = models.IntegerField(unique=True)
+    order_date = models.DateField()
+    article = models.CharField(max_length=50)
+
+
+class AnalyticsState(models.Model):
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+    # Начало последнего обновления: заказы, изменённые позже, обрабатываются
+    # следующим запуском.
+    watermark = models.DateTimeField(null=True, blank=True)
@@ -0,0 +1,52 @@
+from .models import OrderItem, Product
+
+
+def parse_articles(text):
+    """
+    Разбирает строку состава заказа вида ``"А112Т4, 2, F635R4, 2"`` в список
+    ``(артикул, количество)``. Если после артикула нет числа, количество — 1.
+    """
+    tokens = [token.strip() for token in str(text or "").split(",")]
+    tokens = [token for token in tokens if token]
+    items = []
+    i = 0
+    while i < len(tokens):
+        article = tokens[i]
+        quantity = 1
+        if i + 1 < len(tokens) and tokens[i + 1].isdigit():
+            quantity = int(tokens[i + 1])
+            i += 1
+        items.append((article, quantity))
+        i += 1
+    return items
+
+
+def build_items(orders):
+    """
+    Позиции для заказов по их полю ``article``. Товары ищутся одним запросом,
+    цена фиксируется по текущей цене со скидкой.
+    """
+    parsed = {order: parse_articles(order.article) for order in orders}
+    articles = {article for items in parsed.values() for article, _ in items}
+    products = Product.objects.in_bulk(list(articles), field_name="article")
+
+    result = []
+    for order, items in parsed.items():
+        for article, quantity in items:
+            product = products.get(article)
+            result.append(
+                OrderItem(
+                    order=order,
+                    product=product,
+                    article=article,
+                    quantity=quantity,
+                    price=product.final_price if product else None,
+                )
+            )
+    return result
+
+
+def sync_items(order):
+    """Пересоздаёт позиции заказа после изменения строки артикулов."""
+    order.items.all().delete()
+    OrderItem.objects.bulk_create(build_items([order]))
@@ -0,0 +1,157 @@
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = "body.pagination.cursor"
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, prev_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод по ключу (keyset/cursor pagination).
+
+    Вместо OFFSET страница выбирается условием «строго после/до последней
+    показанной строки» по полям сортировки, поэтому стоимость запроса не
+    зависит от номера страницы. Последнее поле ``ordering`` должно быть
+    уникальным (обычно ``id``), иначе порядок строк нестабилен.
+
+    Работает и с ``.values()``: тогда поля сортировки должны входить в выборку.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+
+    def page(self, cursor=None):
+        position = self.decode_cursor(cursor)
+        return self._make_page(list(self._rows_query(position)), position)
+
+    async def apage(self, cursor=None):
+        """Асинхронный вариант :meth:`page` для async-представлений."""
+        position = self.decode_cursor(cursor)
+        rows = [row async for row in self._rows_query(position)]
+        return self._make_page(rows, position)
+
+    def _rows_query(self, position):
+        # На одну строку больше страницы — чтобы узнать, есть ли продолжение.
+        if position is None:
+            return self.queryset.order_by(*self.ordering)[: self.per_page + 1]
+        direction, values = position
+        if direction == "next":
+            return self.queryset.filter(self._seek(values, reverse=False)).order_by(
+                *self.ordering
+            )[: self.per_page + 1]
+        return self.queryset.filter(self._seek(values, reverse=True)).order_by(
+            *self._reversed_ordering()
+        )[: self.per_page + 1]
+
+    def _make_page(self, rows, position):
+        has_more = len(rows) > self.per_page
+        if position is None:
+            rows = rows[: self.per_page]
+            next_cursor = self._cursor("next", rows[-1]) if has_more else None
+            return KeysetPage(rows, next_cursor=next_cursor)
+
+        direction = position[0]
+        if direction == "next":
+            rows = rows[: self.per_page]
+            if not rows:
+                return KeysetPage(rows)
+            return KeysetPage(
+                rows,
+                next_cursor=self._cursor("next", rows[-1]) if has_more else None,
+                prev_cursor=self._cursor("prev", rows[0]),
+            )
+
+        rows = rows[: self.per_page][::-1]
+        if not rows:
+            return KeysetPage(rows)
+        return KeysetPage(
+            rows,
+            next_cursor=self._cursor("next", rows[-1]),
+            prev_cursor=self._cursor("prev", rows[0]) if has_more else None,
+        )
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            direction, values = signing.loads(cursor, salt=CURSOR_SALT)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if direction not in ("next", "prev") or len(values) != len(self.ordering):
+            return None
+        return direction, values
+
+    def _cursor(self, direction, obj):
+        if isinstance(obj, dict):
+            values = [self._cursor_value(obj[name]) for name in self._fields()]
+        else:
+            values = [self._cursor_value(getattr(obj, name)) for name in self._fields()]
+        return signing.dumps([direction, values], salt=CURSOR_SALT, compress=True)
+
+    @staticmethod
+    def _cursor_value(value):
+        if value is None or isinstance(value, (int, float, str)):
+            return value
+        return str(value)
+
+    def _fields(self):
+        return [field.lstrip("-") for field in self.ordering]
+
+    def _reversed_ordering(self):
+        return [
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in self.ordering
+        ]
+
+    def _seek(self, values, reverse):
+        # (a, b, c) > (x, y, z)  <=>  a > x OR (a = x AND b > y) OR ...
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            descending = field.startswith("-") != reverse
+            lookup = "lt" if descending else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+
+def capped_count(queryset, limit):
+    """
+    Возвращает ``(count, exact)``. Считает не более ``limit`` строк, чтобы
+    COUNT не сканировал всю таблицу: при ``exact=False`` строк больше ``limit``.
+    """
+    count = queryset.order_by().values("pk")[: limit + 1].count()
+    if count > limit:
+        return limit, False
+    return count, True
+
+
+async def acapped_count(queryset, limit):
+    count = await queryset.order_by().values("pk")[: limit + 1].acount()
+    if count > limit:
+        return limit, False
+    return count, True
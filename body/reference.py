@@ -0,0 +1,85 @@
+"""
+Справочники в памяти процесса: категории, производители, поставщики и пункты
+выдачи для фильтров и ``<select>`` в формах.
+
+Справочники меняются редко, а нужны почти каждой странице. Процесс хранит
+строки справочника вместе с версией пространства :data:`caching.REFERENCE`;
+сигналы и импорт меняют версию, и при следующем обращении каждый процесс
+перечитывает справочник из БД. Кроме того, строки живут не дольше
+``REFERENCE_CACHE_TIMEOUT`` секунд — на случай правок в обход сигналов
+(``QuerySet.update()``, SQL вручную). Проверка версии — один ``stat`` файла
+версии (или чтение из общего кеша) без запросов к БД и распаковки списков.
+"""
+
+import time
+
+from django.conf import settings
+
+from . import caching
+from .models import Category, DeliveryPoint, Manufacturer, Supplier
+
+CATEGORIES = "categories"
+MANUFACTURERS = "manufacturers"
+SUPPLIERS = "suppliers"
+DELIVERY_POINTS = "delivery_points"
+
+# Справочник -> (модель, поле с подписью).
+SOURCES = {
+    CATEGORIES: (Category, "name"),
+    MANUFACTURERS: (Manufacturer, "name"),
+    SUPPLIERS: (Supplier, "name"),
+    DELIVERY_POINTS: (DeliveryPoint, "address"),
+}
+
+BY_MODEL = {model: name for name, (model, _) in SOURCES.items()}
+
+# Справочник -> (версия, время загрузки, строки). Гонки безопасны: два потока
+# в худшем случае прочитают справочник дважды, а версия берётся до чтения из
+# БД, поэтому устаревшие строки не переживут следующую проверку.
+_loaded = {}
+
+
+def label_field(name):
+    return SOURCES[name][1]
+
+
+def _queryset(name):
+    model, label = SOURCES[name]
+    return model.objects.order_by(label, "pk").values("id", label)
+
+
+def _lookup(name, version):
+    loaded = _loaded.get(name)
+    if loaded is None or loaded[0] != version:
+        return None
+    if time.monotonic() - loaded[1] >= settings.REFERENCE_CACHE_TIMEOUT:
+        return None
+    return loaded[2]
+
+
+def get(name):
+    """Строки справочника ``name``: кортеж словарей с ``id`` и подписью."""
+    version = caching.get_version(caching.REFERENCE)
+    rows = _lookup(name, version)
+    if rows is not None:
+        caching.record(caching.REFERENCE, "hits")
+        return rows
+
+    caching.record(caching.REFERENCE, "misses")
+    rows = tuple(_queryset(name))
+    _loaded[name] = (version, time.monotonic(), rows)
+    return rows
+
+
+async def aget(name):
+    """Асинхронный :func:`get`."""
+    version = await caching.aget_version(caching.REFERENCE)
+    rows = _lookup(name, version)
+    if rows is not None:
+        await caching.arecord(caching.REFERENCE, "hits")
+        return rows
+
+    await caching.arecord(caching.REFERENCE, "misses")
+    rows = tuple([row async for row in _queryset(name)])
+    _loaded[name] = (version, time.monotonic(), rows)
+    return rows
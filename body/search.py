@@ -0,0 +1,177 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, F, FloatField, Lookup, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Order, Product, SearchDocumentField
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Поля, по которым ищут товары и заказы (порядок совпадает с колонками FTS).
+PRODUCT_FIELDS = ("name", "article", "description")
+ORDER_FIELDS = ("client_name", "number", "article")
+
+FTS_TABLES = {
+    "product": "body_product_fts",
+    "order": "body_order_fts",
+}
+
+# Выражения должны совпадать с индексами из миграции 0002_search_index,
+# иначе PostgreSQL не сможет использовать GIN-индекс.
+PG_PRODUCT_VECTOR = (
+    "to_tsvector('russian', translate(lower("
+    "coalesce(\"body_product\".\"name\", '') || ' ' || "
+    "coalesce(\"body_product\".\"article\", '') || ' ' || "
+    "coalesce(\"body_product\".\"description\", '')), 'ё', 'е'))"
+)
+PG_ORDER_VECTOR = (
+    "to_tsvector('russian', translate(lower("
+    "coalesce(\"body_order\".\"client_name\", '') || ' ' || "
+    "\"body_order\".\"number\"::text || ' ' || "
+    "coalesce(\"body_order\".\"article\", '')), 'ё', 'е'))"
+)
+
+
+# Подстрока артикула; выражение совпадает с триграммными индексами
+# *_article_trgm_idx из миграции 0002_search_index.
+PG_ARTICLE_LIKE = 'upper("{table}"."article") LIKE upper(%s)'
+
+LIKE_SPECIAL_RE = re.compile(r"([\\%_])")
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    """``<таблица FTS5> MATCH %s``."""
+
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+def _escape_like(text):
+    return LIKE_SPECIAL_RE.sub(r"\\\1", text)
+
+
+def normalize(text):
+    """Нижний регистр и «ё» → «е»: так индексируется и разбирается запрос."""
+    return str(text or "").lower().replace("ё", "е")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def search_products(queryset, query):
+    return _search(queryset, query, "product", PRODUCT_FIELDS, PG_PRODUCT_VECTOR)
+
+
+def search_orders(queryset, query):
+    return _search(queryset, query, "order", ORDER_FIELDS, PG_ORDER_VECTOR)
+
+
+def _search(queryset, query, kind, fields, pg_vector):
+    """
+    Фильтрует ``queryset`` по запросу и добавляет аннотацию ``search_rank``
+    (меньше — релевантнее). Каждое слово ищется по префиксу, слова
+    объединяются по «И».
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    if connection.vendor == "sqlite":
+        # Одно соединение с FTS-таблицей: MATCH выполняется один раз на
+        # запрос, а rank читается из той же строки индекса.
+        expression = " ".join(f'"{token}"*' for token in tokens)
+        return queryset.filter(search_index__document__match=expression).annotate(
+            search_rank=F("search_index__rank")
+        )
+
+    if connection.vendor == "postgresql":
+        tsquery = " & ".join(f"{token}:*" for token in tokens)
+        matches = RawSQL(
+            f"{pg_vector} @@ to_tsquery('russian', %s)",
+            [tsquery],
+            output_field=BooleanField(),
+        )
+        # Артикулы ищем и по подстроке — для этого есть триграммный индекс.
+        article_matches = RawSQL(
+            PG_ARTICLE_LIKE.format(table=queryset.model._meta.db_table),
+            [f"%{_escape_like(query)}%"],
+            output_field=BooleanField(),
+        )
+        return queryset.filter(Q(matches) | article_matches).annotate(
+            search_rank=RawSQL(
+                f"-ts_rank({pg_vector}, to_tsquery('russian', %s))",
+                [tsquery],
+                output_field=FloatField(),
+            )
+        )
+
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f"{field}__icontains": query})
+    return queryset.filter(condition).annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    )
+
+
+def _index_rows(kind, rows):
+    if connection.vendor != "sqlite":
+        return
+    table = FTS_TABLES[kind]
+    fields = PRODUCT_FIELDS if kind == "product" else ORDER_FIELDS
+    columns = ", ".join(fields)
+    placeholders = ", ".join(["%s"] * (len(fields) + 1))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {table} (rowid, {columns}) VALUES ({placeholders})",
+            [[row[0], *(normalize(value) for value in row[1:])] for row in rows],
+        )
+
+
+def _unindex(kind, pks):
+    if connection.vendor != "sqlite":
+        return
+    table = FTS_TABLES[kind]
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {table} WHERE rowid = %s", [[pk] for pk in pks])
+
+
+def index_product(product):
+    _index_rows("product", [[product.pk, *(getattr(product, f) for f in PRODUCT_FIELDS)]])
+
+
+def index_order(order):
+    _index_rows("order", [[order.pk, *(getattr(order, f) for f in ORDER_FIELDS)]])
+
+
+def index_products(queryset):
+    _index_rows("product", queryset.values_list("pk", *PRODUCT_FIELDS).iterator())
+
+
+def index_orders(queryset):
+    _index_rows("order", queryset.values_list("pk", *ORDER_FIELDS).iterator())
+
+
+def unindex_product(pk):
+    _unindex("product", [pk])
+
+
+def unindex_order(pk):
+    _unindex("order", [pk])
+
+
+def rebuild_index():
+    """Полностью перестраивает FTS-таблицы (SQLite), например после bulk-импорта."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for table in FTS_TABLES.values():
+            cursor.execute(f"DELETE FROM {table}")
+    index_products(Product.objects.all())
+    index_orders(Order.objects.all())
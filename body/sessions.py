@@ -0,0 +1,89 @@
+"""
+Сессии гостей в подписанной cookie.
+
+Гостевой вход общий для всех посетителей витрины, поэтому хранить его сессии
+в БД незачем: гостевая сессия лежит в отдельной подписанной cookie
+(``settings.GUEST_SESSION_COOKIE_NAME``), а сотрудники и клиенты продолжают
+работать с обычными сессиями в БД.
+"""
+
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.contrib.sessions.middleware import SessionMiddleware as BaseSessionMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+
+class GuestSessionStore(SessionStore):
+    pass
+
+
+def use_guest_session(request):
+    """Переключает запрос на гостевую сессию, удаляя обычную."""
+    if not isinstance(request.session, GuestSessionStore):
+        request.session.flush()
+        request.session = GuestSessionStore()
+
+
+def use_default_session(request):
+    """
+    Переносит данные гостевой сессии в обычную. Вызывается при любом входе
+    не гостя (включая админку), чтобы сессии сотрудников и клиентов
+    хранились в БД и их можно было отозвать.
+    """
+    if isinstance(request.session, GuestSessionStore):
+        data = dict(request.session.items())
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        request.session.update(data)
+
+
+class SessionMiddleware(BaseSessionMiddleware):
+    def process_request(self, request):
+        guest_key = request.COOKIES.get(settings.GUEST_SESSION_COOKIE_NAME)
+        if guest_key and settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            request.session = GuestSessionStore(guest_key)
+        else:
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        session = getattr(request, "session", None)
+        if not isinstance(session, GuestSessionStore):
+            self._delete_cookie(request, response, settings.GUEST_SESSION_COOKIE_NAME)
+            return super().process_response(request, response)
+
+        self._delete_cookie(request, response, settings.SESSION_COOKIE_NAME)
+        if session.accessed:
+            patch_vary_headers(response, ("Cookie",))
+        if session.is_empty():
+            self._delete_cookie(
+                request, response, settings.GUEST_SESSION_COOKIE_NAME
+            )
+        elif session.modified and response.status_code < 500:
+            max_age = session.get_expiry_age()
+            session.save()
+            response.set_cookie(
+                settings.GUEST_SESSION_COOKIE_NAME,
+                session.session_key,
+                max_age=max_age,
+                expires=http_date(time.time() + max_age),
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                path=settings.SESSION_COOKIE_PATH,
+                secure=settings.SESSION_COOKIE_SECURE or None,
+                httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        return response
+
+    @staticmethod
+    def _delete_cookie(request, response, name):
+        if name in request.COOKIES and name not in response.cookies:
+            response.delete_cookie(
+                name,
+                path=settings.SESSION_COOKIE_PATH,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+            patch_vary_headers(response, ("Cookie",))
@@ -0,0 +1,97 @@
+from django.contrib.auth.models import update_last_login
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import caching, search, sessions, stock
+from .backends import GUEST_USERNAME, clear_guest_user
+from .models import (
+    Category,
+    DeliveryPoint,
+    Manufacturer,
+    Order,
+    OrderItem,
+    Product,
+    Supplier,
+    User,
+)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    search.unindex_product(instance.pk)
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    search.index_order(instance)
+
+
+@receiver(pre_delete, sender=Order)
+def order_deleting(sender, instance, **kwargs):
+    # Позиции ещё не удалены: резерв возвращается в той же транзакции, что и
+    # удаление (из представления, админки или каскадом).
+    stock.release(instance)
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    search.unindex_order(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Manufacturer)
+@receiver(post_delete, sender=Manufacturer)
+@receiver(post_save, sender=Supplier)
+@receiver(post_delete, sender=Supplier)
+def catalog_changed(sender, **kwargs):
+    # После фиксации: иначе параллельный запрос успеет закешировать под новой
+    # версией данные без этого изменения.
+    transaction.on_commit(lambda: caching.invalidate(caching.CATALOG))
+    if sender is not Product:
+        transaction.on_commit(lambda: caching.invalidate(caching.REFERENCE))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_save, sender=DeliveryPoint)
+@receiver(post_delete, sender=DeliveryPoint)
+def orders_changed(sender, **kwargs):
+    transaction.on_commit(lambda: caching.invalidate(caching.ORDERS))
+    if sender is DeliveryPoint:
+        transaction.on_commit(lambda: caching.invalidate(caching.REFERENCE))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    if instance.username == GUEST_USERNAME:
+        clear_guest_user()
+
+
+# Вход гостя не пишет last_login: одна общая запись на всех посетителей
+# витрины, и каждый вход был бы лишним UPDATE.
+user_logged_in.disconnect(dispatch_uid="update_last_login")
+
+
+@receiver(user_logged_in, dispatch_uid="update_last_login")
+def update_last_login_except_guest(sender, user, **kwargs):
+    if user.username != GUEST_USERNAME:
+        update_last_login(sender, user, **kwargs)
+
+
+@receiver(user_logged_in)
+def keep_default_session(sender, request, user, **kwargs):
+    if request is not None and user.username != GUEST_USERNAME:
+        sessions.use_default_session(request)
@@ -0,0 +1,116 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from . import caching
+from .models import Order, Product
+
+
+class InsufficientStock(Exception):
+    def __init__(self, article, requested):
+        self.article = article
+        self.requested = requested
+        super().__init__(
+            f"Недостаточно товара {article} на складе (нужно {requested} шт.)"
+        )
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def _quantities(order):
+    """Количество по товарам заказа; позиции без товара в каталоге пропускаются."""
+    quantities = defaultdict(int)
+    for product_id, quantity in order.items.filter(
+        product__isnull=False
+    ).values_list("product_id", "quantity"):
+        quantities[product_id] += quantity
+    # Единый порядок блокировок строк, чтобы параллельные заказы не
+    # взаимоблокировались.
+    return sorted(quantities.items())
+
+
+def _stock_changed():
+    # UPDATE по queryset не отправляет сигналы, а остатки видны в каталоге.
+    transaction.on_commit(lambda: caching.invalidate(caching.CATALOG))
+
+
+def reserve_product(product_id, quantity):
+    """
+    Резервирует ``quantity`` единиц одним условным UPDATE: строка меняется,
+    только если свободного остатка (stock - reserved) хватает.
+    """
+    _stock_changed()
+    updated = Product.objects.filter(
+        pk=product_id, stock__gte=F("reserved") + quantity
+    ).update(reserved=F("reserved") + quantity)
+    if not updated:
+        article = (
+            Product.objects.filter(pk=product_id)
+            .values_list("article", flat=True)
+            .first()
+        )
+        raise InsufficientStock(article, quantity)
+
+
+def reserve(order):
+    with transaction.atomic():
+        for product_id, quantity in _quantities(order):
+            reserve_product(product_id, quantity)
+        Order.objects.filter(pk=order.pk).update(stock_reserved=True)
+    order.stock_reserved = True
+
+
+def release(order):
+    if not order.stock_reserved:
+        return
+    with transaction.atomic():
+        for product_id, quantity in _quantities(order):
+            Product.objects.filter(pk=product_id).update(
+                reserved=F("reserved") - quantity
+            )
+        _stock_changed()
+        Order.objects.filter(pk=order.pk).update(stock_reserved=False)
+    order.stock_reserved = False
+
+
+def commit(order):
+    """Списывает товар со склада: резерв превращается в продажу."""
+    with transaction.atomic():
+        _stock_changed()
+        for product_id, quantity in _quantities(order):
+            if order.stock_reserved:
+                Product.objects.filter(pk=product_id).update(
+                    stock=F("stock") - quantity, reserved=F("reserved") - quantity
+                )
+            else:
+                updated = Product.objects.filter(
+                    pk=product_id, stock__gte=F("reserved") + quantity
+                ).update(stock=F("stock") - quantity)
+                if not updated:
+                    article = Product.objects.get(pk=product_id).article
+                    raise InsufficientStock(article, quantity)
+        Order.objects.filter(pk=order.pk).update(stock_reserved=False)
+    order.stock_reserved = False
+
+
+TRANSITIONS = {
+    (Order.STATUS_NEW, Order.STATUS_COMPLETED): commit,
+    (Order.STATUS_NEW, Order.STATUS_CANCELLED): release,
+    (Order.STATUS_CANCELLED, Order.STATUS_NEW): reserve,
+}
+
+
+def apply_transition(order, old_status):
+    """Выполняет складскую операцию, соответствующую смене статуса заказа."""
+    if old_status == order.status:
+        return
+    action = TRANSITIONS.get((old_status, order.status))
+    if action is None:
+        raise InvalidTransition(
+            f"Нельзя сменить статус «{Order(status=old_status).get_status_display()}» "
+            f"на «{order.get_status_display()}»"
+        )
+    action(order)
@@ -0,0 +1,182 @@
+"""
+Синтетические данные магазина в формате файлов импорта.
+
+Данные воспроизводимы: при одном ``seed`` получаются одни и те же строки.
+У каждого вида данных свой генератор случайных чисел, поэтому товары не
+зависят от числа заказов и наоборот.
+"""
+
+import csv
+import os
+import random
+from datetime import date, timedelta
+
+CATEGORIES = ["Женская обувь", "Мужская обувь", "Детская обувь", "Спортивная обувь"]
+KINDS = ["Ботинки", "Туфли", "Кроссовки", "Кеды", "Сапоги", "Сандалии", "Полуботинки"]
+MANUFACTURERS = [
+    "Kari",
+    "Marco Tozzi",
+    "Rieker",
+    "Alessio Nesca",
+    "CROSBY",
+    "Рос",
+    "Ecco",
+    "Geox",
+]
+SUPPLIERS = ["Kari", "Обувь для вас", "ОбувьОпт", "Торговый дом Шаг", "Башмачок"]
+COLORS = ["черный", "коричневый", "бежевый", "белый", "синий", "серый", "бордовый"]
+SEASONS = ["демисезонные", "зимние", "летние", "всесезонные"]
+CITIES = ["Лесной", "Нижний Тагил", "Качканар", "Кушва", "Верхняя Салда"]
+STREETS = [
+    "Вишневая",
+    "Подгорная",
+    "Шоссейная",
+    "Зеленая",
+    "Садовая",
+    "Лесная",
+    "Ленина",
+    "Мира",
+    "Победы",
+    "Школьная",
+    "Речная",
+    "Новая",
+]
+SURNAMES = ["Степанов", "Никифоров", "Сазонов", "Одинцов", "Ершов", "Голубев", "Киселев"]
+FIRST_NAMES = ["Михаил", "Руслан", "Серафим", "Иван", "Андрей", "Павел", "Никита"]
+PATRONYMICS = ["Артёмович", "Германович", "Николаевич", "Иванович", "Олегович"]
+ROLES = ["Администратор", "Менеджер", "Авторизованный клиент"]
+STATUSES = ["Новый", "Завершен", "Отменен"]
+STATUS_WEIGHTS = [2, 7, 1]
+
+ARTICLE_LETTERS = "ABCDEFGHKMPST"
+FIRST_ORDER_DATE = date(2023, 1, 1)
+ORDER_DAYS = 3 * 365
+
+
+def article(index):
+    """Уникальный артикул в стиле каталога (``B00042K7``) для номера товара."""
+    letters = ARTICLE_LETTERS
+    return (
+        f"{letters[index % len(letters)]}{index // len(letters):05d}"
+        f"{letters[index * 7 % len(letters)]}{index % 10}"
+    )
+
+
+def full_name(rng):
+    return f"{rng.choice(SURNAMES)} {rng.choice(FIRST_NAMES)} {rng.choice(PATRONYMICS)}"
+
+
+class SyntheticData:
+    def __init__(
+        self, products, orders, delivery_points=50, users_per_role=3, seed=0
+    ):
+        self.products_count = products
+        self.orders_count = orders
+        self.delivery_points_count = delivery_points
+        self.users_per_role = users_per_role
+        self.seed = seed
+
+    def _rng(self, kind):
+        return random.Random(f"{self.seed}:{kind}")
+
+    def delivery_points(self):
+        rng = self._rng("delivery_points")
+        addresses = []
+        seen = set()
+        while len(addresses) < self.delivery_points_count:
+            address = (
+                f"{rng.randint(100000, 699999)}, г. {rng.choice(CITIES)}, "
+                f"ул. {rng.choice(STREETS)}, {rng.randint(1, 120)}"
+            )
+            if address not in seen:
+                seen.add(address)
+                addresses.append(address)
+        return addresses
+
+    def products(self):
+        rng = self._rng("products")
+        for index in range(self.products_count):
+            kind = rng.choice(KINDS)
+            manufacturer = rng.choice(MANUFACTURERS)
+            # Большинство товаров без скидки или с небольшой, часть — по акции.
+            discount = rng.choice([0, 0, 0, 2, 3, 5, 10, 18, 25])
+            stock = 0 if rng.random() < 0.1 else rng.randint(1, 40)
+            yield {
+                "Артикул": article(index),
+                "Наименование товара": kind,
+                "Единица измерения": "шт.",
+                "Цена": rng.randint(8, 300) * 50 - 1,
+                "Поставщик": rng.choice(SUPPLIERS),
+                "Производитель": manufacturer,
+                "Категория товара": rng.choice(CATEGORIES),
+                "Действующая скидка": discount,
+                "Кол-во на складе": stock,
+                "Описание товара": (
+                    f"{kind} {manufacturer} {rng.choice(SEASONS)}, "
+                    f"размер {rng.randint(35, 46)}, цвет {rng.choice(COLORS)}"
+                ),
+                "Фото": "",
+            }
+
+    def users(self):
+        rng = self._rng("users")
+        for role in ROLES:
+            for index in range(self.users_per_role):
+                yield {
+                    "Роль сотрудника": role,
+                    "ФИО": full_name(rng),
+                    "Логин": f"{ROLES.index(role)}.{index}@example.com",
+                    "Пароль": f"pass{rng.randint(1000, 9999)}",
+                }
+
+    def orders(self):
+        rng = self._rng("orders")
+        points = self.delivery_points()
+        for index in range(self.orders_count):
+            items = rng.sample(
+                range(self.products_count), min(rng.randint(1, 3), self.products_count)
+            )
+            order_date = FIRST_ORDER_DATE + timedelta(days=rng.randrange(ORDER_DAYS))
+            delivery_date = order_date + timedelta(days=rng.randint(2, 14))
+            yield {
+                "Номер заказа": index + 1,
+                "Артикул заказа": ", ".join(
+                    f"{article(item)}, {rng.randint(1, 3)}" for item in items
+                ),
+                "Дата заказа": order_date.strftime("%d.%m.%Y"),
+                "Дата доставки": delivery_date.strftime("%d.%m.%Y"),
+                "Адрес пункта выдачи": rng.choice(points) if points else "",
+                "ФИО авторизированного клиента": full_name(rng),
+                "Код для получения": rng.randint(100, 999),
+                "Статус заказа": rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+            }
+
+    def write_feed(self, path, extension=".csv"):
+        """
+        Записывает файлы импорта (имена и колонки как у import_data) в папку
+        ``path``; формат — csv или tsv по расширению.
+        """
+        from body.management.commands.import_data import SOURCES
+
+        delimiter = "\t" if extension == ".tsv" else ","
+        os.makedirs(path, exist_ok=True)
+        sources = {
+            "delivery_points": ([address] for address in self.delivery_points()),
+            "products": self.products(),
+            "users": self.users(),
+            "orders": self.orders(),
+        }
+        for step, rows in sources.items():
+            basename, with_headers, _ = SOURCES[step]
+            filepath = os.path.join(path, f"{basename}{extension}")
+            with open(filepath, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f, delimiter=delimiter)
+                header = None
+                for row in rows:
+                    if with_headers:
+                        if header is None:
+                            header = list(row)
+                            writer.writerow(header)
+                        writer.writerow([row[column] for column in header])
+                    else:
+                        writer.writerow(row)
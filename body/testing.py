@@ -0,0 +1,41 @@
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Раннер тестов: превышение бюджета запросов представления — ошибка теста,
+    версии кеша — во временном каталоге.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._budget_strict = settings.QUERY_BUDGET_STRICT
+        settings.QUERY_BUDGET_STRICT = True
+        self._version_dir = settings.CACHE_VERSION_DIR
+        self._temp_version_dir = tempfile.TemporaryDirectory()
+        settings.CACHE_VERSION_DIR = self._temp_version_dir.name
+
+    def teardown_test_environment(self, **kwargs):
+        settings.QUERY_BUDGET_STRICT = self._budget_strict
+        settings.CACHE_VERSION_DIR = self._version_dir
+        self._temp_version_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
+
+
+class MetricsTestMixin:
+    """Проверки метрик ответа, собранных RequestMetricsMiddleware."""
+
+    def assertWithinBudget(self, response):
+        budget = getattr(response.resolver_match.func, "query_budget", None)
+        self.assertIsNotNone(budget, f"{response.resolver_match.view_name}: бюджет не задан")
+        self.assertLessEqual(response.metrics.queries, budget)
+
+    def assertMaxQueries(self, response, limit):
+        self.assertLessEqual(
+            response.metrics.queries,
+            limit,
+            f"{response.resolver_match.view_name}: {response.metrics.queries} SQL-запросов",
+        )
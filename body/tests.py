@@ -1 +1,1755 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from datetime import date
+from decimal import Decimal
+from types import ModuleType
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.sessions.models import Session
+from django.core import signing
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.storage import default_storage
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import CommandError, call_command
+from django.core.signals import request_finished, request_started
+from django.db import OperationalError, close_old_connections, connection
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils.http import urlencode
+from PIL import Image
+
+from . import addresses, analytics, async_views, caching, export, search, stock, urls
+from . import images as images_module
+from .backends import clear_guest_user, get_guest_user
+from .forms import OrderForm, ProductForm
+from .management.commands import import_data
+from .metrics import QueryBudgetExceeded
+from .models import (
+    ArticleSales,
+    Category,
+    DailyOrderStats,
+    DeliveryPoint,
+    ImportFingerprint,
+    Manufacturer,
+    Order,
+    OrderItem,
+    Product,
+    Role,
+    Supplier,
+    SupplierStock,
+    User,
+)
+from .orders import sync_items
+from .pagination import (
+    CURSOR_SALT,
+    KeysetPaginator,
+    acapped_count,
+    capped_count,
+)
+from .sessions import GuestSessionStore
+from .synthetic import SyntheticData
+from .testing import MetricsTestMixin
+
+
+def create_catalog(products=30, orders=30):
+    category = Category.objects.create(name="Кроссовки")
+    manufacturer = Manufacturer.objects.create(name="Kari")
+    suppliers = [
+        Supplier.objects.create(name="Обувь для вас"),
+        Supplier.objects.create(name="Kari"),
+    ]
+    for i in range(products):
+        Product.objects.create(
+            article=f"A{i:04d}",
+            name=f"Товар {i % 7}",
+            price=Decimal("1000.00") + i,
+            discount=Decimal(i % 25),
+            stock=i % 4,
+            category=category,
+            manufacturer=manufacturer,
+            supplier=suppliers[i % 2],
+        )
+    point = DeliveryPoint.objects.create(address="г. Лесной, ул. Вишневая, 32")
+    for i in range(orders):
+        Order.objects.create(
+            number=i + 1,
+            article=f"A{i:04d}, 2",
+            order_date=date(2025, 1, 1 + i % 28),
+            client_name="Иванов Иван",
+            pickup_code=str(900 + i),
+            status=[Order.STATUS_NEW, Order.STATUS_COMPLETED][i % 2],
+            delivery_point=point,
+        )
+    return suppliers
+
+
+def clear_cache():
+    """Холодный кеш: пустое хранилище и новые версии всех пространств."""
+    cache.clear()
+    for namespace in caching.NAMESPACES:
+        caching.invalidate(namespace)
+
+
+def create_user(username, role_name):
+    role, _ = Role.objects.get_or_create(name=role_name)
+    return User.objects.create_user(username, password="password", role=role)
+
+
+# Маршруты с async-версиями списков, API и выгрузок — как под ASGI.
+ASYNC_URLCONF = ModuleType("async_urls")
+ASYNC_URLCONF.urlpatterns = urls.build(async_views, async_views)
+
+
+def with_async_views(test_class):
+    """Тот же набор тестов для async-версий представлений (body/async_views.py)."""
+    name = f"Async{test_class.__name__}"
+    variant = type(name, (test_class,), {"__module__": __name__})
+    return override_settings(ROOT_URLCONF=ASYNC_URLCONF)(variant)
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(products=10, orders=0)
+
+    def setUp(self):
+        # Остатки повторяются (i % 4): страницы разделяет и второе поле ключа.
+        self.queryset = Product.objects.all()
+        self.paginator = KeysetPaginator(self.queryset, ["-stock", "id"], 4)
+        self.expected = list(self.queryset.order_by("-stock", "id"))
+
+    def test_next_and_prev_pages(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [4, 4, 2])
+        self.assertEqual([obj for page in pages for obj in page], self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        # Назад с последней страницы — те же страницы в обратном порядке.
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = self.paginator.page(page.prev_cursor)
+            self.assertEqual(list(page), list(expected))
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_invalid_cursor_opens_first_page(self):
+        first = list(self.paginator.page())
+        cursor = self.paginator.page().next_cursor
+        foreign = signing.dumps(
+            ["next", [self.expected[3].stock, self.expected[3].pk]], salt="other"
+        )
+        short = signing.dumps(["next", [1]], salt=CURSOR_SALT)
+        for bad in (cursor[:-2] + "xx", foreign, short, "not-a-cursor"):
+            with self.subTest(cursor=bad):
+                self.assertIsNone(self.paginator.decode_cursor(bad))
+                self.assertEqual(list(self.paginator.page(bad)), first)
+
+    def test_empty_and_past_last_page(self):
+        page = KeysetPaginator(Product.objects.none(), ["id"], 4).page()
+        self.assertEqual(list(page), [])
+        self.assertFalse(page.has_other_pages())
+
+        last = self.paginator._cursor("next", self.expected[-1])
+        page = self.paginator.page(last)
+        self.assertEqual(list(page), [])
+        self.assertFalse(page.has_other_pages())
+
+        first = self.paginator._cursor("prev", self.expected[0])
+        self.assertFalse(self.paginator.page(first).has_other_pages())
+
+    def test_async_page_matches_sync(self):
+        cursor = self.paginator.page().next_cursor
+        page = async_to_sync(self.paginator.apage)(cursor)
+        self.assertEqual(list(page), list(self.paginator.page(cursor)))
+
+    def test_capped_count(self):
+        for limit, expected in ((20, (10, True)), (10, (10, True)), (9, (9, False))):
+            with self.subTest(limit=limit):
+                self.assertEqual(capped_count(self.queryset, limit), expected)
+                self.assertEqual(
+                    async_to_sync(acapped_count)(self.queryset, limit), expected
+                )
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN есть только в SQLite")
+@override_settings(PRODUCT_LIST_PAGE_SIZE=10)
+class QueryPlanTests(TestCase):
+    """
+    Запросы списков должны идти по индексам. Регрессией считается полный
+    просмотр таблицы товаров или заказов, а также сортировка во временном
+    B-дереве при просмотре таблицы (сортировать небольшую выборку, найденную
+    по индексу, допустимо).
+    """
+
+    TABLES = ("body_product", "body_order")
+    FULL_SCAN_RE = re.compile(r"^SCAN (body_product|body_order)$")
+    INDEX_SCAN_RE = re.compile(r"^SCAN (body_product|body_order)\b")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.suppliers = create_catalog()
+        cls.admin = create_user("admin@example.com", Role.ADMIN)
+
+    def setUp(self):
+        clear_cache()
+        self.client.force_login(self.admin)
+
+    def query_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndexes(self, queries):
+        checked = 0
+        for query in queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT") or not any(
+                f'"{table}"' in sql for table in self.TABLES
+            ):
+                continue
+            checked += 1
+            plan = self.query_plan(sql)
+            for step in plan:
+                self.assertIsNone(
+                    self.FULL_SCAN_RE.match(step),
+                    f"Полный просмотр таблицы:\n{sql}\n{plan}",
+                )
+            if any(self.INDEX_SCAN_RE.match(step) for step in plan):
+                self.assertNotIn(
+                    "USE TEMP B-TREE FOR ORDER BY",
+                    plan,
+                    f"Сортировка без индекса:\n{sql}\n{plan}",
+                )
+        self.assertGreater(checked, 0)
+
+    def assertViewUsesIndexes(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertUsesIndexes(ctx.captured_queries)
+
+    def test_product_list_default_sort(self):
+        self.assertViewUsesIndexes(reverse("product_list"))
+
+    def test_product_list_sorts(self):
+        for sort in ("stock_asc", "stock_desc", "price_asc", "price_desc"):
+            with self.subTest(sort=sort):
+                clear_cache()
+                self.assertViewUsesIndexes(f"{reverse('product_list')}?sort={sort}")
+
+    def test_product_list_supplier_filter(self):
+        supplier = self.suppliers[0]
+        for sort in ("", "stock_asc", "stock_desc", "price_asc", "price_desc"):
+            with self.subTest(sort=sort):
+                clear_cache()
+                self.assertViewUsesIndexes(
+                    f"{reverse('product_list')}?supplier={supplier.pk}&sort={sort}"
+                )
+
+    def test_product_list_next_page(self):
+        response = self.client.get(f"{reverse('product_list')}?sort=stock_desc")
+        cursor = response.context["page"].next_cursor
+        self.assertIsNotNone(cursor)
+        clear_cache()
+        self.assertViewUsesIndexes(
+            f"{reverse('product_list')}?sort=stock_desc&cursor={cursor}"
+        )
+
+    def test_order_list(self):
+        self.assertViewUsesIndexes(reverse("order_list"))
+
+    def test_orders_by_status(self):
+        with CaptureQueriesContext(connection) as ctx:
+            list(Order.objects.filter(status=Order.STATUS_NEW)[:20])
+        self.assertUsesIndexes(ctx.captured_queries)
+
+    def test_orders_by_article(self):
+        with CaptureQueriesContext(connection) as ctx:
+            Order.objects.filter(article="A0001, 2").count()
+        self.assertUsesIndexes(ctx.captured_queries)
+
+    def test_order_list_by_product_article(self):
+        self.assertViewUsesIndexes(f"{reverse('order_list')}?q=A0001")
+
+    def test_order_list_filters(self):
+        point = DeliveryPoint.objects.get()
+        for params in (
+            {"status": Order.STATUS_NEW},
+            {"point": point.pk},
+            {"date_from": "2025-01-10", "date_to": "2025-01-20"},
+            {"status": Order.STATUS_COMPLETED, "date_from": "2025-01-10"},
+            {"q": "12"},
+        ):
+            with self.subTest(params=params):
+                clear_cache()
+                self.assertViewUsesIndexes(
+                    f"{reverse('order_list')}?{urlencode(params)}"
+                )
+
+
+@override_settings(ORDER_LIST_PAGE_SIZE=4)
+class OrderListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(products=10, orders=10)
+        cls.manager = create_user("manager@example.com", Role.MANAGER)
+
+    def setUp(self):
+        clear_cache()
+        self.client.force_login(self.manager)
+
+    def numbers(self, params):
+        numbers, cursor = [], None
+        while True:
+            if cursor:
+                params = {**params, "cursor": cursor}
+            response = self.client.get(reverse("order_list"), params)
+            page = response.context["page"]
+            numbers += [order.number for order in page]
+            if not page.has_next():
+                return response, numbers
+            cursor = page.next_cursor
+
+    def test_pages_and_status_counts(self):
+        response, numbers = self.numbers({})
+        self.assertEqual(sorted(numbers), list(range(1, 11)))
+        self.assertEqual(
+            response.context["statuses"],
+            [
+                ("", "Все", 10),
+                (Order.STATUS_NEW, "Новый", 5),
+                (Order.STATUS_COMPLETED, "Завершён", 5),
+                (Order.STATUS_CANCELLED, "Отменён", 0),
+            ],
+        )
+
+        response, numbers = self.numbers({"status": Order.STATUS_NEW})
+        self.assertEqual(sorted(numbers), [1, 3, 5, 7, 9])
+        # Счётчики вкладок не зависят от выбранного статуса.
+        self.assertEqual(response.context["statuses"][0][2], 10)
+        self.assertEqual(response.context["total_count"], 5)
+
+    def test_date_range_and_numeric_query(self):
+        _, numbers = self.numbers({"date_from": "2025-01-03", "date_to": "2025-01-05"})
+        self.assertEqual(sorted(numbers), [3, 4, 5])
+
+        with CaptureQueriesContext(connection) as ctx:
+            _, numbers = self.numbers({"q": "7"})
+        self.assertEqual(numbers, [7])
+        self.assertFalse(any("fts" in q["sql"] for q in ctx.captured_queries))
+
+
+    def test_invalid_point_is_ignored(self):
+        for point in (str(2**70), "0", "-1", "abc"):
+            with self.subTest(point=point):
+                response, numbers = self.numbers({"point": point})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context["filters"]["point"], "")
+                self.assertEqual(len(numbers), 10)
+        response = self.client.get(
+            reverse("api_orders"), {"point": str(2**70), "limit": 20}
+        )
+        self.assertEqual(len(response.json()["results"]), 10)
+
+AsyncOrderListTests = with_async_views(OrderListTests)
+
+
+class AnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(products=10, orders=10)
+        for order in Order.objects.all():
+            sync_items(order)
+        cls.manager = create_user("manager@example.com", Role.MANAGER)
+        cls.customer = create_user("client@example.com", Role.CLIENT)
+
+    def daily(self):
+        return {
+            (row.day.day, row.status): (row.orders, row.items)
+            for row in DailyOrderStats.objects.all()
+        }
+
+    def test_refresh_matches_orders(self):
+        result = analytics.refresh()
+        self.assertEqual(
+            result, {"full": True, "orders": 10, "days": 10, "articles": 10}
+        )
+        self.assertEqual(self.daily()[(1, Order.STATUS_NEW)], (1, 2))
+        sales = ArticleSales.objects.get(article="A0003")
+        self.assertEqual((sales.orders, sales.quantity), (1, 2))
+        product = Product.objects.get(article="A0003")
+        self.assertEqual(sales.revenue, 2 * product.final_price)
+        stock = {row.supplier.name: row for row in SupplierStock.objects.all()}
+        self.assertEqual(stock["Kari"].products, 5)
+        kari = Product.objects.filter(supplier__name="Kari")
+        self.assertEqual(stock["Kari"].units, sum(p.stock for p in kari))
+
+    def test_incremental_refresh(self):
+        analytics.refresh()
+        self.assertEqual(analytics.refresh()["orders"], 0)
+
+        order = Order.objects.get(number=1)
+        order.status = Order.STATUS_CANCELLED
+        order.order_date = date(2025, 1, 2)
+        order.save()
+        Order.objects.get(number=4).delete()
+        result = analytics.refresh()
+
+        self.assertFalse(result["full"])
+        self.assertEqual(result["orders"], 2)
+        daily = self.daily()
+        self.assertNotIn((1, Order.STATUS_NEW), daily)
+        self.assertEqual(daily[(2, Order.STATUS_CANCELLED)], (1, 2))
+        self.assertNotIn((4, Order.STATUS_COMPLETED), daily)
+        self.assertFalse(ArticleSales.objects.filter(article="A0003").exists())
+
+        analytics.refresh(full=True)
+        self.assertEqual(self.daily(), daily)
+
+    def test_cancelled_orders_are_not_revenue(self):
+        order = Order.objects.get(number=10)
+        order.status = Order.STATUS_CANCELLED
+        order.save()
+        analytics.refresh()
+
+        self.assertFalse(ArticleSales.objects.filter(article="A0009").exists())
+        data = analytics.dashboard(days=2)
+        self.assertEqual(data["orders_total"], 2)
+        self.assertEqual(dict(data["status_totals"])["Отменён"], 1)
+        self.assertEqual(data["days"][0]["revenue"], 0)
+        expected = 2 * Product.objects.get(article="A0008").final_price
+        self.assertEqual(data["revenue_total"], expected)
+
+    def test_dashboard_access(self):
+        analytics.refresh()
+        self.client.force_login(self.customer)
+        self.assertRedirects(
+            self.client.get(reverse("analytics")), reverse("product_list")
+        )
+
+        self.client.force_login(self.manager)
+        response = self.client.get(reverse("analytics"), {"days": 3})
+        days = [row["day"].day for row in response.context["days"]]
+        self.assertEqual(days, [10, 9, 8])
+        self.assertEqual(response.context["orders_total"], 3)
+        self.assertEqual(len(response.context["top_articles"]), analytics.TOP_ARTICLES)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(products=12, orders=6)
+        cls.manager = create_user("manager@example.com", Role.MANAGER)
+
+    def setUp(self):
+        clear_cache()
+        self.client.force_login(self.manager)
+
+    def test_products_fields_and_pagination(self):
+        url = reverse("api_products")
+        data = self.client.get(
+            url, {"fields": "article,final_price", "sort": "price_asc", "limit": 5}
+        ).json()
+        self.assertEqual(len(data["results"]), 5)
+        self.assertEqual(set(data["results"][0]), {"article", "final_price"})
+
+        articles = [row["article"] for row in data["results"]]
+        while data["next"]:
+            data = self.client.get(
+                url, {"fields": "article", "sort": "price_asc", "cursor": data["next"]}
+            ).json()
+            articles += [row["article"] for row in data["results"]]
+        self.assertEqual(len(set(articles)), 12)
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse("api_products"), {"fields": "password"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_modified_until_data_changes(self):
+        url = reverse("api_products")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(2):  # сессия и пользователь
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        product = Product.objects.first()
+        product.stock += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(PRODUCT_LIST_PAGE_SIZE=5, ORDER_LIST_PAGE_SIZE=2)
+    def test_default_limit_per_endpoint(self):
+        products = self.client.get(reverse("api_products")).json()
+        self.assertEqual(len(products["results"]), 5)
+        orders = self.client.get(reverse("api_orders")).json()
+        self.assertEqual(len(orders["results"]), 2)
+
+    def test_etag_depends_on_query(self):
+        url = reverse("api_products")
+        etag = self.client.get(url, {"sort": "price_asc"})["ETag"]
+        self.assertEqual(self.client.get(url, {"sort": "price_asc"})["ETag"], etag)
+        response = self.client.get(url, {"sort": "price_desc"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_invalid_supplier(self):
+        for supplier in ("abc", "0", str(2**70)):
+            with self.subTest(supplier=supplier):
+                response = self.client.get(reverse("api_products"), {"supplier": supplier})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("supplier", response.json()["error"])
+        response = self.client.get(reverse("product_list"), {"supplier": "abc"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["products"]), 12)
+
+    def test_orders_require_permission(self):
+        response = self.client.get(reverse("api_orders"), {"fields": "number,status"})
+        self.assertEqual(len(response.json()["results"]), 6)
+
+        self.client.force_login(create_user("client@example.com", Role.CLIENT))
+        self.assertEqual(self.client.get(reverse("api_orders")).status_code, 403)
+
+
+AsyncApiTests = with_async_views(ApiTests)
+
+
+@skipUnless(connection.vendor == "sqlite", "FTS5-индекс есть только в SQLite")
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Обувь")
+        manufacturer = Manufacturer.objects.create(name="Kari")
+        supplier = Supplier.objects.create(name="Kari")
+        cls.boots = Product.objects.create(
+            article="B0001",
+            name="Ботинки зимние",
+            description="Кроссовки? Нет, ботинки: тёплые ботинки на меху",
+            price=Decimal("5000.00"),
+            category=category,
+            manufacturer=manufacturer,
+            supplier=supplier,
+        )
+        cls.sneakers = Product.objects.create(
+            article="K0001",
+            name="Кроссовки беговые",
+            description="Лёгкие",
+            price=Decimal("3000.00"),
+            category=category,
+            manufacturer=manufacturer,
+            supplier=supplier,
+        )
+
+    def found(self, query):
+        return list(
+            search.search_products(Product.objects.all(), query)
+            .order_by("search_rank", "pk")
+            .values_list("article", flat=True)
+        )
+
+    def test_index_follows_save_and_delete(self):
+        self.sneakers.name = "Кеды беговые"
+        self.sneakers.save()
+        self.assertEqual(self.found("кеды"), ["K0001"])
+        self.assertEqual(self.found("беговые кроссовки"), [])
+
+        self.sneakers.delete()
+        self.assertEqual(self.found("кеды"), [])
+
+    def test_prefix_match(self):
+        self.assertEqual(self.found("кросс"), ["K0001", "B0001"])
+        self.assertEqual(self.found("тепл бот"), ["B0001"])
+
+    def test_rank_orders_by_relevance(self):
+        # «ботинки» трижды встречаются в первом товаре и ни разу во втором;
+        # «кроссовки» — в названии второго и один раз в описании первого.
+        self.assertEqual(self.found("ботинки"), ["B0001"])
+        self.assertEqual(self.found("кроссовки")[0], "K0001")
+
+    def test_rank_is_read_from_a_single_join(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.found("кросс")
+        sql = queries[0]["sql"]
+        self.assertEqual(sql.count("body_product_fts\" MATCH"), 1)
+        self.assertIn('INNER JOIN "body_product_fts"', sql)
+
+
+class CatalogFilterTests(TestCase):
+    # Артикул -> (цена, скидка, остаток). Цена со скидкой: B — 900, C — 800,
+    # A — 1000, D — 950, поэтому сортировка не совпадает с сортировкой по price.
+    PRODUCTS = {
+        "A": ("1000.00", 0, 3),
+        "B": ("1200.00", 25, 0),
+        "C": ("1600.00", 50, 2),
+        "D": ("1000.00", 5, 0),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        for article, (price, discount, stock_value) in cls.PRODUCTS.items():
+            product = create_product(article, stock_value)
+            product.price, product.discount = Decimal(price), discount
+            product.save()
+        cls.manager = create_user("manager@example.com", Role.MANAGER)
+
+    def setUp(self):
+        clear_cache()
+        self.client.force_login(self.manager)
+
+    def articles(self, params):
+        response = self.client.get(reverse("product_list"), params)
+        return [product.article for product in response.context["products"]]
+
+    def test_promo_and_out_of_stock(self):
+        self.assertEqual(
+            self.articles({"show": "promo", "sort": "price_asc"}), ["C", "B"]
+        )
+        self.assertEqual(
+            self.articles({"show": "out_of_stock", "sort": "price_asc"}), ["B", "D"]
+        )
+
+    def test_sort_by_final_price(self):
+        self.assertEqual(self.articles({"sort": "price_asc"}), ["C", "B", "D", "A"])
+        self.assertEqual(self.articles({"sort": "price_desc"}), ["A", "D", "B", "C"])
+        rows = self.client.get(
+            reverse("api_products"), {"sort": "price_asc", "fields": "final_price"}
+        ).json()["results"]
+        self.assertEqual(
+            [row["final_price"] for row in rows],
+            ["800.00", "900.00", "950.00", "1000.00"],
+        )
+
+
+class LiveSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(products=12, orders=0)
+        cls.manager = create_user("manager@example.com", Role.MANAGER)
+
+    def setUp(self):
+        clear_cache()
+        self.client.force_login(self.manager)
+
+    def test_fragment_has_rows_and_count_only(self):
+        response = self.client.get(reverse("product_rows"), {"q": "A0003"})
+        content = response.content.decode()
+        self.assertIn("<tbody>", content)
+        self.assertIn("A0003", content)
+        self.assertIn("Найдено товаров: 1", content)
+        self.assertNotIn("navbar", content)
+        self.assertNotIn("supplierFilter", content)
+
+    def test_fragment_is_compressed(self):
+        response = self.client.get(
+            reverse("product_rows"), HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+
+AsyncLiveSearchTests = with_async_views(LiveSearchTests)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(products=12, orders=4)
+        cls.manager = create_user("manager@example.com", Role.MANAGER)
+
+    def setUp(self):
+        self.client.force_login(self.manager)
+
+    def _download(self, url, params):
+        response = self.client.get(url, params)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    def test_products_csv_uses_list_filters(self):
+        response, content = self._download(
+            reverse("product_export"), {"q": "A0003", "format": "csv"}
+        )
+        self.assertIn("attachment", response["Content-Disposition"])
+        lines = content.decode("utf-8-sig").splitlines()
+        self.assertEqual(lines[0].split(",")[0], "Артикул")
+        self.assertEqual([line.split(",")[0] for line in lines[1:]], ["A0003"])
+
+    def test_orders_xlsx(self):
+        import openpyxl
+
+        _, content = self._download(reverse("order_export"), {"format": "xlsx"})
+        sheet = openpyxl.load_workbook(io.BytesIO(content)).active
+        rows = list(sheet.values)
+        self.assertEqual(rows[0][0], "Номер заказа")
+        self.assertEqual(len(rows), 5)
+
+    def test_formulas_escaped(self):
+        import openpyxl
+
+        formula = '=HYPERLINK("http://example.com","x")'
+        Order.objects.filter(number=1).update(client_name=formula, pickup_code="-1")
+
+        _, content = self._download(reverse("order_export"), {"format": "csv"})
+        rows = csv.reader(io.StringIO(content.decode("utf-8-sig")))
+        row = next(row for row in rows if row[0] == "1")
+        self.assertEqual((row[5], row[6]), ("'" + formula, "'-1"))
+        # import_data снимает экранирование при обратной загрузке.
+        with tempfile.TemporaryDirectory() as path:
+            filepath = os.path.join(path, "orders.csv")
+            with open(filepath, "wb") as f:
+                f.write(content)
+            rows = import_data.read_rows(filepath)
+            row = next(row for row in rows if row["Номер заказа"] == "1")
+        self.assertEqual(row["ФИО авторизированного клиента"], formula)
+
+        _, content = self._download(reverse("order_export"), {"format": "xlsx"})
+        sheet = openpyxl.load_workbook(io.BytesIO(content)).active
+        row = next(row for row in sheet.values if row[0] == 1)
+        self.assertEqual((row[5], row[6]), ("'" + formula, "'-1"))
+
+    @mock.patch.object(export, "CSV_ROWS_PER_CHUNK", 5)
+    def test_csv_streams_through_wsgi_handler(self):
+        environ = RequestFactory().get(reverse("product_export")).environ
+        environ["HTTP_COOKIE"] = self.client.cookies.output(header="", sep=";")
+        # Как и тестовый клиент, не даём обработчику закрыть соединение
+        # тестовой транзакции.
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("error")
+                response = WSGIHandler()(environ, lambda status, headers: None)
+                self.assertTrue(response.streaming)
+                self.assertFalse(response.is_async)
+                chunks = list(response)
+            response.close()
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        # Заголовок и по куску на каждые 5 строк из 12.
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(b"".join(chunks).decode("utf-8-sig").count("\n"), 13)
+
+    def test_command_and_permission(self):
+        out = io.StringIO()
+        call_command("export_data", "products", "--show", "out_of_stock", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1 + 3)
+        for args in (["products", "--supplier", "abc"], ["orders", "--point", "x"]):
+            with self.subTest(args=args), self.assertRaises(CommandError):
+                call_command("export_data", *args, stdout=io.StringIO())
+
+        self.client.force_login(create_user("client@example.com", Role.CLIENT))
+        response = self.client.get(reverse("order_export"))
+        self.assertRedirects(
+            response, reverse("product_list"), fetch_redirect_response=False
+        )
+
+
+@override_settings(ROOT_URLCONF=ASYNC_URLCONF)
+class AsyncExportTests(ExportTests):
+    # Под ASGI выгрузка — async-генератор, к WSGI-обработчику он не относится.
+    test_csv_streams_through_wsgi_handler = None
+
+    def _download(self, url, params):
+        response = self.client.get(url, params)
+        self.assertTrue(response.is_async)
+
+        async def read():
+            return b"".join([chunk async for chunk in response])
+
+        return response, async_to_sync(read)()
+
+
+class RoleQueryCountTests(TestCase):
+    """
+    Роль загружается вместе с пользователем, поэтому число запросов на
+    страницу не зависит от роли и от числа проверок прав в шаблонах.
+    """
+
+    # Сессия и пользователь с ролью.
+    AUTH_QUERIES = 2
+    # Страница -> запросов к данным при пустом кеше.
+    PAGES = {
+        "product_list": 3,  # поставщики, страница товаров, счётчик
+        "product_rows": 2,  # страница товаров, счётчик
+        "order_list": 3,  # страница заказов, счётчики статусов, пункты выдачи
+    }
+    # Запросов к данным при повторном открытии (остальное берётся из кеша).
+    CACHED_PAGES = {"product_list": 0, "product_rows": 0, "order_list": 1}
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(products=12, orders=12)
+        cls.users = {
+            role: create_user(f"{role}@example.com", role)
+            for role in (Role.CLIENT, Role.MANAGER, Role.ADMIN)
+        }
+        cls.users[Role.GUEST] = User.objects.create_user("guest")
+
+    def test_query_count_per_role(self):
+        for role, user in self.users.items():
+            self.client.force_login(user)
+            for page, page_queries in self.PAGES.items():
+                if page == "order_list" and not user.can_view_orders():
+                    page_queries = 0
+                with self.subTest(role=role, page=page):
+                    clear_cache()
+                    with self.assertNumQueries(self.AUTH_QUERIES + page_queries):
+                        self.client.get(reverse(page))
+                    if page_queries:
+                        page_queries = self.CACHED_PAGES[page]
+                    with self.assertNumQueries(self.AUTH_QUERIES + page_queries):
+                        self.client.get(reverse(page))
+
+    def test_capabilities(self):
+        admin = self.users[Role.ADMIN]
+        manager = self.users[Role.MANAGER]
+        client = self.users[Role.CLIENT]
+        guest = self.users[Role.GUEST]
+        self.assertTrue(admin.can_edit_products() and admin.can_edit_orders())
+        self.assertTrue(manager.can_view_orders() and manager.can_filter())
+        self.assertFalse(manager.can_edit_products() or manager.can_edit_orders())
+        self.assertEqual(client.capabilities, frozenset())
+        self.assertEqual(guest.capabilities, frozenset())
+
+
+AsyncRoleQueryCountTests = with_async_views(RoleQueryCountTests)
+
+
+class CacheVersionTests(TestCase):
+    def test_invalidation_reaches_other_processes(self):
+        version = caching.get_version(caching.CATALOG)
+        # У другого процесса (import_data, второй воркер) свой LocMemCache.
+        other_process = LocMemCache("other-process", {})
+        with mock.patch.object(caching, "cache", other_process):
+            caching.invalidate(caching.CATALOG)
+        self.assertNotEqual(caching.get_version(caching.CATALOG), version)
+        self.assertEqual(
+            async_to_sync(caching.aget_version)(caching.CATALOG),
+            caching.get_version(caching.CATALOG),
+        )
+
+    @override_settings(CACHE_VERSION_DIR=None)
+    def test_versions_in_shared_cache(self):
+        version = caching.get_version(caching.ORDERS)
+        self.assertEqual(cache.get("orders:version"), version)
+        caching.invalidate(caching.ORDERS)
+        self.assertNotEqual(caching.get_version(caching.ORDERS), version)
+
+    def test_stats_shared_between_processes(self):
+        before = caching.stats()[caching.CATALOG]
+        for _ in range(3):
+            caching.get_or_set(caching.CATALOG, ["stats"], lambda: 1)
+        other_process = LocMemCache("other-process", {})
+        with mock.patch.object(caching, "cache", other_process):
+            after = caching.stats()[caching.CATALOG]
+        self.assertEqual(
+            (after["hits"] - before["hits"], after["misses"] - before["misses"]),
+            (2, 1),
+        )
+        out = io.StringIO()
+        call_command("cache_stats", stdout=out)
+        self.assertIn(f"catalog: попаданий {after['hits']}", out.getvalue())
+
+    def test_invalidated_after_commit(self):
+        version = caching.get_version(caching.CATALOG)
+        with self.captureOnCommitCallbacks(execute=True):
+            Supplier.objects.create(name="Новый поставщик")
+            # До фиксации другие запросы видят старые данные — и старую версию.
+            self.assertEqual(caching.get_version(caching.CATALOG), version)
+        self.assertNotEqual(caching.get_version(caching.CATALOG), version)
+
+    @override_settings(CACHE_VERSION_DIR=None)
+    def test_stats_command_refuses_per_process_cache(self):
+        with self.assertRaises(CommandError):
+            call_command("cache_stats", stdout=io.StringIO())
+
+
+class ReferenceDataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(products=3, orders=1)
+        cls.admin = create_user("admin@example.com", Role.ADMIN)
+        cls.buyer = create_user("buyer@example.com", Role.CLIENT)
+        cls.buyer.full_name = "Сидоров Семён"
+        cls.buyer.save()
+        Order.objects.update(client=cls.buyer)
+
+    def setUp(self):
+        clear_cache()
+        self.client.force_login(self.admin)
+
+    def test_form_choices_from_memory(self):
+        str(ProductForm())
+        with self.assertNumQueries(0):
+            html = str(ProductForm())
+        self.assertIn("Обувь для вас", html)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Supplier.objects.create(name="Новый поставщик")
+        self.assertIn("Новый поставщик", str(ProductForm()["supplier"]))
+
+    def test_reference_expires(self):
+        str(ProductForm())
+        Supplier.objects.filter(name="Kari").update(name="Kari Group")
+        self.assertNotIn("Kari Group", str(ProductForm()["supplier"]))
+
+        expired = time.monotonic() + settings.REFERENCE_CACHE_TIMEOUT
+        with mock.patch("body.reference.time.monotonic", return_value=expired):
+            self.assertIn("Kari Group", str(ProductForm()["supplier"]))
+
+    def test_order_form_does_not_load_users(self):
+        for i in range(5):
+            create_user(f"client{i}@example.com", Role.CLIENT)
+        order = Order.objects.get()
+        # Сессия, пользователь, заказ с клиентом, пункты выдачи.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("order_edit", args=[order.pk]))
+        self.assertContains(response, "Сидоров Семён (buyer@example.com)")
+        self.assertNotContains(response, "client0@example.com")
+
+        data = {
+            "number": order.number,
+            "article": order.article,
+            "order_date": "2025-03-01",
+            "client_name": order.client_name,
+            "pickup_code": order.pickup_code,
+            "status": order.status,
+            "client": self.buyer.pk,
+        }
+        label = "Сидоров Семён (buyer@example.com)"
+        form = OrderForm({**data, "client_search": label}, instance=order)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data["client"], self.buyer)
+        form = OrderForm(data, instance=order)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIsNone(form.cleaned_data["client"])
+
+    def test_edited_client_text_needs_a_suggestion(self):
+        order = Order.objects.get()
+        data = {
+            "number": order.number,
+            "article": order.article,
+            "order_date": "2025-03-01",
+            "client_name": order.client_name,
+            "pickup_code": order.pickup_code,
+            "status": order.status,
+            "client_search": "Петров Пётр",
+        }
+        for client in (self.buyer.pk, ""):
+            with self.subTest(client=client):
+                form = OrderForm({**data, "client": client}, instance=order)
+                self.assertFalse(form.is_valid())
+                self.assertIn("client_search", form.errors)
+
+    def test_client_search(self):
+        url = reverse("api_clients")
+        self.assertEqual(
+            self.client.get(url, {"q": "Сидоров"}).json()["results"],
+            [{"id": self.buyer.pk, "label": "Сидоров Семён (buyer@example.com)"}],
+        )
+        results = self.client.get(url, {"q": "buyer Сем"}).json()["results"]
+        self.assertEqual([row["id"] for row in results], [self.buyer.pk])
+        self.assertEqual(self.client.get(url, {"q": "С"}).json(), {"results": []})
+
+        self.client.force_login(create_user("manager@example.com", Role.MANAGER))
+        self.assertEqual(self.client.get(url, {"q": "Сидоров"}).status_code, 403)
+
+
+class GuestSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(products=12, orders=0)
+        cls.manager = create_user("manager@example.com", Role.MANAGER)
+
+    def setUp(self):
+        clear_cache()
+        clear_guest_user()
+        get_guest_user()
+
+    def test_guest_visit_does_not_touch_database(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("guest_login"))
+        self.assertIn(settings.GUEST_SESSION_COOKIE_NAME, response.cookies)
+        self.client.get(reverse("product_list"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("product_list"))
+        self.assertEqual(response.context["user"].username, "guest")
+        self.assertFalse(Session.objects.exists())
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse("logout"))
+        self.assertEqual(self.client.get(reverse("product_list")).status_code, 302)
+
+    def test_guest_user_copied_per_request_and_expires(self):
+        first, second = get_guest_user(), get_guest_user()
+        self.assertIsNot(first, second)
+        first.full_name = "Изменено в запросе"
+        self.assertEqual(get_guest_user().full_name, "Гость")
+
+        # Изменение из другого процесса: сигнал этого процесса не сработал.
+        User.objects.filter(username="guest").update(full_name="Посетитель")
+        with self.assertNumQueries(0):
+            self.assertEqual(get_guest_user().full_name, "Гость")
+        expired = time.monotonic() + settings.GUEST_USER_CACHE_TIMEOUT
+        with mock.patch("body.backends.time.monotonic", return_value=expired):
+            with self.assertNumQueries(1):
+                self.assertEqual(get_guest_user().full_name, "Посетитель")
+
+    def test_staff_login_after_guest_uses_database_session(self):
+        # Данные в гостевой сессии без входа (например, гость из другого процесса).
+        self.client.cookies[settings.GUEST_SESSION_COOKIE_NAME] = self._guest_cookie()
+        response = self.client.post(
+            reverse("login"),
+            {"username": "manager@example.com", "password": "password"},
+        )
+        self.assertEqual(response.cookies[settings.GUEST_SESSION_COOKIE_NAME].value, "")
+        self.assertEqual(Session.objects.count(), 1)
+        response = self.client.get(reverse("product_list"))
+        self.assertEqual(response.context["user"], self.manager)
+
+    def test_admin_login_after_guest_uses_database_session(self):
+        User.objects.create_superuser("root", password="password")
+        self.client.cookies[settings.GUEST_SESSION_COOKIE_NAME] = self._guest_cookie()
+        response = self.client.post(
+            reverse("admin:login"),
+            {"username": "root", "password": "password", "next": "/admin/"},
+        )
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertEqual(response.cookies[settings.GUEST_SESSION_COOKIE_NAME].value, "")
+        self.assertEqual(Session.objects.count(), 1)
+        self.assertEqual(self.client.get("/admin/").status_code, 200)
+
+    @staticmethod
+    def _guest_cookie():
+        session = GuestSessionStore()
+        session["seen"] = True
+        session.save()
+        return session.session_key
+
+
+class RequestMetricsTests(MetricsTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_catalog(products=12, orders=12)
+        cls.admin = create_user("admin@example.com", Role.ADMIN)
+
+    def setUp(self):
+        clear_cache()
+        self.client.force_login(self.admin)
+
+    def test_metrics_and_server_timing(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("product_list"))
+        self.assertEqual(response.metrics.queries, len(ctx.captured_queries))
+        self.assertGreater(response.metrics.template_time, 0)
+        self.assertEqual(response.metrics.size, len(response.content))
+        self.assertIn(
+            f'desc="{response.metrics.queries} queries"', response["Server-Timing"]
+        )
+
+    def test_list_views_within_budget(self):
+        for name in (
+            "product_list",
+            "product_rows",
+            "order_list",
+            "api_products",
+            "api_orders",
+        ):
+            with self.subTest(view=name):
+                self.assertWithinBudget(self.client.get(reverse(name), {"q": "A0001"}))
+
+    def test_budget_exceeded_fails(self):
+        view = resolve(reverse("product_list")).func
+        with mock.patch.object(view, "query_budget", 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse("product_list"))
+
+
+class SyntheticDataTests(TestCase):
+    def test_same_seed_same_rows(self):
+        first = SyntheticData(products=300, orders=300, seed=7)
+        second = SyntheticData(products=300, orders=300, seed=7)
+        self.assertEqual(list(first.products()), list(second.products()))
+        self.assertEqual(list(first.orders()), list(second.orders()))
+        self.assertNotEqual(
+            list(first.orders()),
+            list(SyntheticData(products=300, orders=300, seed=8).orders()),
+        )
+
+    def test_articles_unique_and_fit_orders(self):
+        data = SyntheticData(products=5000, orders=500)
+        articles = [row["Артикул"] for row in data.products()]
+        self.assertEqual(len(set(articles)), len(articles))
+        max_length = Order._meta.get_field("article").max_length
+        for row in data.orders():
+            self.assertLessEqual(len(row["Артикул заказа"]), max_length)
+
+
+def create_product(article, stock_value):
+    return Product.objects.create(
+        article=article,
+        name=f"Товар {article}",
+        price=Decimal("100.00"),
+        stock=stock_value,
+        category=Category.objects.get_or_create(name="Кроссовки")[0],
+        manufacturer=Manufacturer.objects.get_or_create(name="Kari")[0],
+        supplier=Supplier.objects.get_or_create(name="Kari")[0],
+    )
+
+
+def create_order(number, items, status=Order.STATUS_NEW):
+    order = Order.objects.create(
+        number=number,
+        article=", ".join(f"{p.article}, {q}" for p, q in items),
+        order_date=date(2025, 3, 1),
+        client_name="Иванов Иван",
+        pickup_code="901",
+        status=status,
+    )
+    OrderItem.objects.bulk_create(
+        OrderItem(order=order, product=p, article=p.article, quantity=q)
+        for p, q in items
+    )
+    return order
+
+
+def write_xlsx(filepath, rows):
+    workbook = import_data.openpyxl.Workbook()
+    for row in rows:
+        workbook.active.append(list(row))
+    workbook.save(filepath)
+
+
+def run_import(path, **options):
+    out = io.StringIO()
+    call_command("import_data", path=path, stdout=out, **options)
+    return out.getvalue()
+
+
+PRODUCT_HEADER = [
+    "Артикул",
+    "Наименование товара",
+    "Единица измерения",
+    "Цена",
+    "Поставщик",
+    "Производитель",
+    "Категория товара",
+    "Действующая скидка",
+    "Кол-во на складе",
+    "Описание товара",
+    "Фото",
+]
+
+
+def product_row(article, price=1000, stock=5, discount=0):
+    return [
+        article, "Кеды", "пара", price, "Kari", "Kari", "Кеды", discount, stock, "", ""
+    ]
+
+
+def import_snapshot():
+    """Содержимое таблиц после импорта — для сравнения двух запусков."""
+    return {
+        "points": sorted(DeliveryPoint.objects.values_list("address", flat=True)),
+        "products": sorted(
+            Product.objects.values_list(
+                "article", "price", "discount", "stock", "supplier__name"
+            )
+        ),
+        "users": sorted(
+            User.objects.values_list("username", "full_name", "role__name")
+        ),
+        "orders": sorted(
+            Order.objects.values_list(
+                "number", "article", "order_date", "status", "delivery_point__address"
+            )
+        ),
+        "items": sorted(
+            OrderItem.objects.values_list("order__number", "article", "quantity")
+        ),
+    }
+
+
+@skipUnless(import_data.openpyxl, "нужен openpyxl")
+class ImportDataTests(TestCase):
+    def test_xlsx_created_and_updated(self):
+        with tempfile.TemporaryDirectory() as path:
+            filepath = os.path.join(path, "Tovar.xlsx")
+            rows = [PRODUCT_HEADER, *(product_row(f"X{i}") for i in range(3))]
+            write_xlsx(filepath, rows)
+            out = run_import(path)
+            self.assertIn("новых: 3, обновлено: 0", out)
+
+            rows[1] = product_row("X0", price=1500, stock=9, discount=10)
+            rows.append(product_row("X3"))
+            write_xlsx(filepath, rows)
+            out = run_import(path)
+
+        self.assertIn("новых: 1, обновлено: 3", out)
+        product = Product.objects.get(article="X0")
+        self.assertEqual((product.price, product.stock), (Decimal("1500"), 9))
+        self.assertEqual(product.final_price, Decimal("1350.00"))
+        self.assertEqual(Product.objects.count(), 4)
+
+    def test_reimport_is_idempotent(self):
+        with tempfile.TemporaryDirectory() as path:
+            SyntheticData(
+                products=20, orders=30, delivery_points=5, users_per_role=1
+            ).write_feed(path)
+            out = run_import(path, format="csv")
+            first = import_snapshot()
+            self.assertIn("Заказы: 30 записей", out)
+            self.assertIn("новых: 30, обновлено: 0", out)
+
+            out = run_import(path, format="csv")
+        self.assertEqual(import_snapshot(), first)
+        self.assertEqual(len(first["orders"]), 30)
+        self.assertEqual(len(first["users"]), 3)
+        # Товары обновляются, заказы и пользователи не перезаписываются.
+        self.assertIn("новых: 0, обновлено: 20", out)
+        self.assertIn("новых: 0, обновлено: 0, без изменений: 0, пропущено: 30", out)
+        self.assertIn("новых: 0, обновлено: 0, без изменений: 0, пропущено: 3", out)
+
+    def test_rows_written_in_batches(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_xlsx(
+                os.path.join(path, "Tovar.xlsx"),
+                [PRODUCT_HEADER, *(product_row(f"X{i}") for i in range(5))],
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                run_import(path, batch_size=2)
+
+        inserts = [
+            query
+            for query in ctx.captured_queries
+            if query["sql"].startswith('INSERT INTO "body_product" ')
+        ]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(Product.objects.count(), 5)
+
+    def test_read_sheets(self):
+        rows = [["Артикул", "Цена"], ["X1", 100], [None, 5], ["X2", None]]
+        with tempfile.TemporaryDirectory() as path:
+            xlsx = os.path.join(path, "sheet.xlsx")
+            write_xlsx(xlsx, rows)
+            tsv = os.path.join(path, "sheet.tsv")
+            with open(tsv, "w", encoding="utf-8") as f:
+                f.write("Артикул\tЦена\nX1\t100\n\t5\nX2\t\n")
+
+            self.assertEqual(
+                list(import_data.iter_sheet(xlsx)), [tuple(row) for row in rows]
+            )
+            self.assertEqual(
+                list(import_data.iter_sheet(tsv)),
+                [("Артикул", "Цена"), ("X1", "100"), (None, "5"), ("X2", None)],
+            )
+            self.assertEqual(
+                list(import_data.read_rows(xlsx)),
+                [{"Артикул": "X1", "Цена": 100}, {"Артикул": "X2", "Цена": None}],
+            )
+            self.assertEqual(
+                import_data.parse_file(tsv, with_headers=True),
+                [{"Артикул": "X1", "Цена": "100"}, {"Артикул": "X2", "Цена": None}],
+            )
+            self.assertEqual(
+                import_data.parse_file(tsv, with_headers=False),
+                list(import_data.iter_sheet(tsv)),
+            )
+
+
+class ParallelImportTests(TestCase):
+    def test_parallel_import_matches_serial(self):
+        with tempfile.TemporaryDirectory() as path:
+            SyntheticData(
+                products=20, orders=30, delivery_points=5, users_per_role=1
+            ).write_feed(path)
+            run_import(path, format="csv")
+            serial = import_snapshot()
+
+            Order.objects.all().delete()
+            Product.objects.all().delete()
+            DeliveryPoint.objects.all().delete()
+            User.objects.all().delete()
+            out = run_import(path, format="csv", workers=2)
+
+        self.assertIn("в 2 процессах", out)
+        self.assertEqual(import_snapshot(), serial)
+
+
+class IncrementalImportTests(TestCase):
+    ORDERS = (
+        "Номер заказа,Артикул заказа,Дата заказа,Статус заказа\n"
+        '1,"A0000, 1",01.03.2025,Новый\n'
+        '2,"A0001, 1",01.03.2025,Новый\n'
+    )
+    USERS = (
+        "Роль сотрудника,ФИО,Логин,Пароль\n"
+        "Менеджер,Иванов Иван,manager@example.com,{hash}\n"
+        "Менеджер,Петров Пётр,new@example.com,{hash}\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        # Заказ №1 и manager@example.com уже есть в БД: импорт их пропускает.
+        create_catalog(products=2, orders=1)
+        create_user("manager@example.com", Role.MANAGER)
+        cls.password = make_password("secret")
+
+    def stats(self, out, label):
+        """``(новых, обновлено, без изменений, пропущено)`` из отчёта импорта."""
+        found = re.search(
+            rf"{label}: .*новых: (\d+), обновлено: (\d+), "
+            rf"без изменений: (\d+), пропущено: (\d+)",
+            out,
+        )
+        return tuple(int(value) for value in found.groups())
+
+    def run_import(self, path, products):
+        with open(os.path.join(path, "Tovar.csv"), "w") as f:
+            for row in [PRODUCT_HEADER, *products]:
+                f.write(",".join(str(value) for value in row) + "\n")
+        with open(os.path.join(path, "Заказ_import.csv"), "w") as f:
+            f.write(self.ORDERS)
+        with open(os.path.join(path, "user_import.csv"), "w") as f:
+            f.write(self.USERS.format(hash=self.password))
+        return run_import(path, format="csv", incremental=True)
+
+    def keys(self, source):
+        return set(
+            ImportFingerprint.objects.filter(source=source).values_list(
+                "key", flat=True
+            )
+        )
+
+    def test_counts_and_fingerprints(self):
+        products = [product_row("A0000"), product_row("X1")]
+        with tempfile.TemporaryDirectory() as path:
+            out = self.run_import(path, products)
+            self.assertEqual(self.stats(out, "Заказы"), (1, 0, 0, 1))
+            self.assertEqual(self.stats(out, "Пользователи"), (1, 0, 0, 1))
+            self.assertEqual(self.stats(out, "Товары"), (1, 1, 0, 0))
+            # Хеши только у записанных строк.
+            self.assertEqual(self.keys(ImportFingerprint.ORDER), {"2"})
+            self.assertEqual(self.keys(ImportFingerprint.USER), {"new@example.com"})
+            self.assertEqual(self.keys(ImportFingerprint.PRODUCT), {"A0000", "X1"})
+
+            products[1] = product_row("X1", price=2000)
+            out = self.run_import(path, products)
+
+        self.assertEqual(self.stats(out, "Заказы"), (0, 0, 1, 1))
+        self.assertEqual(self.stats(out, "Пользователи"), (0, 0, 1, 1))
+        self.assertEqual(self.stats(out, "Товары"), (0, 1, 1, 0))
+        self.assertEqual(Product.objects.get(article="X1").price, Decimal("2000"))
+
+
+def write_image(filepath, color, size=(200, 120), mode="RGB"):
+    Image.new(mode, size, color).save(filepath)
+
+
+class ImageImportTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.media = media.name
+
+    def stored(self, directory):
+        """Файлы (без подкаталогов) в ``directory`` хранилища."""
+        return sorted(default_storage.listdir(directory)[1])
+
+    def test_duplicates_stored_once_with_thumbnails(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_image(os.path.join(path, "red.png"), "red")
+            write_image(os.path.join(path, "red-copy.png"), "red")
+            write_image(os.path.join(path, "blue.png"), "blue")
+            rows = [product_row(f"X{i}") for i in range(3)]
+            for row, photo in zip(rows, ["red.png", "red-copy.png", "blue.png"]):
+                row[-1] = photo
+            with open(os.path.join(path, "Tovar.csv"), "w") as f:
+                for row in [PRODUCT_HEADER, *rows]:
+                    f.write(",".join(str(value) for value in row) + "\n")
+            out = run_import(path, format="csv", images_path=path)
+
+        self.assertIn("Фото товаров: 2 файлов", out)
+        images = dict(Product.objects.values_list("article", "image"))
+        self.assertEqual(images["X0"], images["X1"])
+        self.assertNotEqual(images["X0"], images["X2"])
+        self.assertEqual(
+            self.stored(images_module.IMAGE_DIR),
+            sorted(os.path.basename(name) for name in {images["X0"], images["X2"]}),
+        )
+        thumbs = self.stored(images_module.THUMBNAIL_DIR)
+        self.assertEqual(
+            thumbs,
+            sorted(
+                os.path.basename(images_module.thumbnail_name(name))
+                for name in {images["X0"], images["X2"]}
+            ),
+        )
+        with Image.open(
+            os.path.join(self.media, images_module.THUMBNAIL_DIR, thumbs[0])
+        ) as thumb:
+            self.assertEqual((thumb.format, thumb.size), ("WEBP", (80, 80)))
+
+    def test_store_and_transparent_thumbnail(self):
+        with tempfile.TemporaryDirectory() as path:
+            source = os.path.join(path, "logo.PNG")
+            write_image(source, (0, 0, 255, 128), size=(50, 300), mode="RGBA")
+            with open(source, "rb") as f:
+                name = images_module.store(f, source)
+            with open(source, "rb") as f:
+                self.assertEqual(images_module.store(f, "other.png"), name)
+
+        self.assertTrue(name.endswith(".png"))
+        self.assertEqual(len(self.stored(images_module.IMAGE_DIR)), 1)
+        thumb = images_module.make_thumbnail(name)
+        self.assertEqual(thumb, images_module.thumbnail_name(name))
+        with default_storage.open(thumb) as f, Image.open(f) as image:
+            self.assertEqual((image.mode, image.size), ("RGBA", (80, 80)))
+
+
+class DeliveryPointMatchingTests(TestCase):
+    ADDRESSES = [
+        "420151, г. Лесной, ул. Вишневая, 32",
+        "125061, г. Лесной, ул. Подгорная, 8",
+        "630370, г. Лесной, ул. Шоссейная, 24",
+    ]
+
+    def test_index_exact_position_and_fuzzy(self):
+        index = addresses.DeliveryPointIndex(
+            [(pk, address) for pk, address in enumerate(self.ADDRESSES, start=10)]
+        )
+        self.assertEqual(
+            index.match("420151 Лесной, улица Вишнёвая, д. 32"),
+            (10, 1.0, addresses.EXACT),
+        )
+        self.assertEqual(index.match(2), (11, 1.0, addresses.POSITION))
+        self.assertEqual(index.match("3"), (12, 1.0, addresses.POSITION))
+        self.assertIsNone(index.match(4))
+
+        match = index.match("630370, г. Лесной, ул. Шосейная, 24")
+        self.assertEqual((match.point_id, match.method), (12, addresses.FUZZY))
+        self.assertLess(match.confidence, 1)
+        self.assertIsNone(index.match("г. Москва, ул. Тверская, 1"))
+
+    def test_import_resolves_numeric_positions(self):
+        create_catalog(products=2, orders=0)
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, "Пункты выдачи_import.csv"), "w") as f:
+                f.write("\n".join(f'"{address}"' for address in self.ADDRESSES))
+            with open(os.path.join(path, "Заказ_import.csv"), "w") as f:
+                f.write(
+                    "Номер заказа,Артикул заказа,Дата заказа,Адрес пункта выдачи\n"
+                    "1,\"A0000, 1\",01.03.2025,2\n"
+                    "2,\"A0001, 1\",01.03.2025,\"630370, Лесной, Шоссейная, 24\"\n"
+                    "3,\"A0001, 1\",01.03.2025,\"420151, Лесной, Вишнёвая ул, 23\"\n"
+                )
+            out = io.StringIO()
+            call_command("import_data", path=path, format="csv", stdout=out)
+
+        points = dict(Order.objects.values_list("number", "delivery_point__address"))
+        self.assertEqual(
+            points,
+            {1: self.ADDRESSES[1], 2: self.ADDRESSES[2], 3: self.ADDRESSES[0]},
+        )
+        self.assertIn("по адресу 1, по номеру 1, приблизительно 1", out.getvalue())
+        self.assertEqual(DeliveryPoint.objects.count(), 1 + len(self.ADDRESSES))
+
+    def test_order_form_accepts_address(self):
+        create_catalog(products=1, orders=1)
+        order = Order.objects.get()
+        data = {
+            "number": order.number,
+            "article": order.article,
+            "order_date": "2025-03-01",
+            "client_name": order.client_name,
+            "pickup_code": order.pickup_code,
+            "status": order.status,
+        }
+        form = OrderForm(
+            {**data, "delivery_address": "Лесной, Вишневая 32"}, instance=order
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data["delivery_point"].pk, order.delivery_point_id)
+
+        form = OrderForm({**data, "delivery_address": "Лесной, Вишнёва 32"}, instance=order)
+        self.assertTrue(form.is_valid(), form.errors)
+
+        form = OrderForm({**data, "delivery_address": "Москва"}, instance=order)
+        self.assertFalse(form.is_valid())
+
+
+class UserImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.prehashed = make_password("secret")
+
+    def import_users(self, **options):
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, "user_import.csv"), "w") as f:
+                f.write(
+                    "Роль сотрудника,ФИО,Логин,Пароль\n"
+                    f"Менеджер,Иванов Иван,a@example.com,{self.prehashed}\n"
+                    "Менеджер,Петров Пётр,b@example.com,plain1\n"
+                    "Менеджер,Сидоров Сидор,c@example.com,plain2\n"
+                )
+            with mock.patch.object(
+                import_data.ProcessPoolExecutor,
+                "map",
+                autospec=True,
+                side_effect=import_data.ProcessPoolExecutor.map,
+            ) as pool_map:
+                out = run_import(path, format="csv", **options)
+        return out, pool_map, {user.username: user for user in User.objects.all()}
+
+    def test_is_password_hash(self):
+        self.assertTrue(import_data.is_password_hash(self.prehashed))
+        for value in ("secret", "", "pbkdf2_sha256$", "pbkdf2_sha256$1$salt"):
+            with self.subTest(value=value):
+                self.assertFalse(import_data.is_password_hash(value))
+
+    def test_prehashed_and_parallel_hashing(self):
+        out, pool_map, users = self.import_users(workers=2)
+
+        self.assertEqual(users["a@example.com"].password, self.prehashed)
+        self.assertTrue(users["a@example.com"].check_password("secret"))
+        self.assertTrue(users["b@example.com"].check_password("plain1"))
+        self.assertTrue(users["c@example.com"].check_password("plain2"))
+        # В пул уходят только открытые пароли.
+        pool_map.assert_called_once()
+        self.assertEqual(list(pool_map.call_args.args[2]), ["plain1", "plain2"])
+        self.assertIn("хешировано 2 в 2 процессах, готовых хешей 1", out)
+
+    def test_serial_hashing(self):
+        out, pool_map, users = self.import_users()
+
+        pool_map.assert_not_called()
+        self.assertEqual(users["a@example.com"].password, self.prehashed)
+        self.assertTrue(users["c@example.com"].check_password("plain2"))
+        self.assertIn("хешировано 2, готовых хешей 1", out)
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.shoes = create_product("A001", 5)
+        self.boots = create_product("B001", 3)
+
+    def test_reserve_and_release(self):
+        order = create_order(1, [(self.shoes, 2), (self.boots, 3)])
+        stock.reserve(order)
+        self.shoes.refresh_from_db()
+        self.boots.refresh_from_db()
+        self.assertEqual((self.shoes.stock, self.shoes.reserved), (5, 2))
+        self.assertEqual((self.boots.stock, self.boots.reserved), (3, 3))
+
+        stock.release(order)
+        self.shoes.refresh_from_db()
+        self.assertEqual((self.shoes.stock, self.shoes.reserved), (5, 0))
+        order.refresh_from_db()
+        self.assertFalse(order.stock_reserved)
+
+    def test_delete_releases_reservation(self):
+        order = create_order(1, [(self.shoes, 2)])
+        stock.reserve(order)
+        admin = create_user("admin@example.com", Role.ADMIN)
+        self.client.force_login(admin)
+        self.client.post(reverse("order_delete", args=[order.pk]))
+        self.assertFalse(Order.objects.filter(pk=order.pk).exists())
+        self.shoes.refresh_from_db()
+        self.assertEqual((self.shoes.stock, self.shoes.reserved), (5, 0))
+
+    def test_commit_moves_reservation_to_sale(self):
+        order = create_order(1, [(self.shoes, 2)])
+        stock.reserve(order)
+        stock.commit(order)
+        self.shoes.refresh_from_db()
+        self.assertEqual((self.shoes.stock, self.shoes.reserved), (3, 0))
+
+    def test_reserve_is_all_or_nothing(self):
+        order = create_order(1, [(self.shoes, 2), (self.boots, 4)])
+        with self.assertRaises(stock.InsufficientStock):
+            stock.reserve(order)
+        self.shoes.refresh_from_db()
+        self.assertEqual(self.shoes.reserved, 0)
+
+    def test_status_transitions_through_form(self):
+        order = create_order(1, [(self.shoes, 2)])
+        stock.reserve(order)
+
+        data = {
+            "number": order.number,
+            "article": order.article,
+            "order_date": "2025-03-01",
+            "client_name": order.client_name,
+            "pickup_code": order.pickup_code,
+            "status": Order.STATUS_CANCELLED,
+        }
+        form = OrderForm(data, instance=order)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.shoes.refresh_from_db()
+        self.assertEqual((self.shoes.stock, self.shoes.reserved), (5, 0))
+
+        form = OrderForm({**data, "status": Order.STATUS_COMPLETED}, instance=order)
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.assertRaises(stock.InvalidTransition):
+            form.save()
+
+    def test_changing_items_moves_reservation(self):
+        order = create_order(1, [(self.shoes, 2)])
+        stock.reserve(order)
+        data = {
+            "number": order.number,
+            "article": f"{self.boots.article}, 1",
+            "order_date": "2025-03-01",
+            "client_name": order.client_name,
+            "pickup_code": order.pickup_code,
+            "status": Order.STATUS_NEW,
+        }
+        form = OrderForm(data, instance=order)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.shoes.refresh_from_db()
+        self.boots.refresh_from_db()
+        self.assertEqual(self.shoes.reserved, 0)
+        self.assertEqual(self.boots.reserved, 1)
+
+    def test_admin_cannot_change_items_or_status(self):
+        order = create_order(1, [(self.shoes, 2)])
+        stock.reserve(order)
+        User.objects.create_superuser("root", password="password")
+        self.client.login(username="root", password="password")
+        url = reverse("admin:body_order_change", args=[order.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        response = self.client.post(
+            url,
+            {
+                "number": order.number,
+                "article": f"{self.boots.article}, 3",
+                "order_date": "2025-03-01",
+                "client_name": order.client_name,
+                "pickup_code": order.pickup_code,
+                "status": Order.STATUS_CANCELLED,
+                "items-TOTAL_FORMS": 1,
+                "items-INITIAL_FORMS": 1,
+                "items-0-id": order.items.get().pk,
+                "items-0-order": order.pk,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        order.refresh_from_db()
+        self.assertEqual(order.article, f"{self.shoes.article}, 2")
+        self.assertEqual(order.status, Order.STATUS_NEW)
+        self.assertTrue(order.stock_reserved)
+        self.shoes.refresh_from_db()
+        self.assertEqual(self.shoes.reserved, 2)
+
+    def test_import_leaves_new_orders_unreserved(self):
+        with tempfile.TemporaryDirectory() as path:
+            write_xlsx(
+                os.path.join(path, "Tovar.xlsx"),
+                [PRODUCT_HEADER, product_row("IMP1", stock=5)],
+            )
+            write_xlsx(
+                os.path.join(path, "Заказ_import.xlsx"),
+                [
+                    [
+                        "Номер заказа",
+                        "Артикул заказа",
+                        "Дата заказа",
+                        "Дата доставки",
+                        "Адрес пункта выдачи",
+                        "ФИО авторизированного клиента",
+                        "Код для получения",
+                        "Статус заказа",
+                    ],
+                    [1, "IMP1, 2", "01.03.2025", "", "", "Иванов Иван", "901", "Новый"],
+                ],
+            )
+            run_import(path)
+
+        product = Product.objects.get(article="IMP1")
+        order = Order.objects.get(number=1)
+        self.assertEqual(product.reserved, 0)
+        self.assertFalse(order.stock_reserved)
+        # Завершение такого заказа списывает товар с проверкой свободного остатка.
+        order.status = Order.STATUS_COMPLETED
+        stock.apply_transition(order, Order.STATUS_NEW)
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.reserved), (3, 0))
+
+
+class StockConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    ATTEMPTS = 40
+    STOCK = 100
+
+    @staticmethod
+    def reserve_one(product_id):
+        # Тестовая SQLite в памяти работает в режиме общего кеша, где
+        # конкурирующая запись сразу получает «table is locked» вместо
+        # ожидания, поэтому в тесте попытка повторяется.
+        while True:
+            try:
+                return stock.reserve_product(product_id, 1)
+            except OperationalError as exc:
+                if "locked" not in str(exc):
+                    raise
+                time.sleep(0.001)
+
+    def test_parallel_reservations_never_oversell(self):
+        product = create_product("HOT1", self.STOCK)
+        results = {"reserved": 0, "rejected": 0}
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                for _ in range(self.ATTEMPTS):
+                    try:
+                        self.reserve_one(product.pk)
+                    except stock.InsufficientStock:
+                        outcome = "rejected"
+                    else:
+                        outcome = "reserved"
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        product.refresh_from_db()
+        attempts = self.THREADS * self.ATTEMPTS
+        self.assertEqual(results["reserved"], self.STOCK)
+        self.assertEqual(results["rejected"], attempts - self.STOCK)
+        self.assertEqual(product.reserved, self.STOCK)
+        self.assertEqual(product.get_available(), 0)
+        sys.stderr.write(
+            f"\n  резервирование: {attempts} попыток в {self.THREADS} потоков, "
+            f"{attempts / elapsed:.0f} операций/с\n"
+        )
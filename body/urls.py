@@ -1,18 +1,43 @@
+from django.conf import settings
 from django.urls import path
 from django.views.generic import RedirectView
 
-from . import views
+from . import async_views, views
 
-urlpatterns = [
-    path("", RedirectView.as_view(pattern_name="login", permanent=False), name="root"),
-    path("login/", views.login_view, name="login"),
-    path("logout/", views.logout_view, name="logout"),
-    path("guest/", views.guest_login_view, name="guest_login"),
-    path("products/", views.product_list, name="product_list"),
-    path("products/add/", views.product_add, name="product_add"),
-    path("products/<int:pk>/edit/", views.product_edit, name="product_edit"),
-    path("products/<int:pk>/delete/", views.product_delete, name="product_delete"),
-    path("orders/", views.order_list, name="order_list"),
-    path("orders/<int:pk>/edit/", views.order_edit, name="order_edit"),
-    path("orders/<int:pk>/delete/", views.order_delete, name="order_delete"),
-]
+
+def build(list_views, export_views):
+    """
+    Маршруты приложения. ``list_views`` обслуживает списки и API,
+    ``export_views`` — выгрузки: модуль ``views`` или ``async_views``.
+    """
+    return [
+        path(
+            "", RedirectView.as_view(pattern_name="login", permanent=False), name="root"
+        ),
+        path("login/", views.login_view, name="login"),
+        path("logout/", views.logout_view, name="logout"),
+        path("guest/", views.guest_login_view, name="guest_login"),
+        path("products/", list_views.product_list, name="product_list"),
+        path("products/rows/", list_views.product_rows, name="product_rows"),
+        path("products/export/", export_views.product_export, name="product_export"),
+        path("products/add/", views.product_add, name="product_add"),
+        path("products/<int:pk>/edit/", views.product_edit, name="product_edit"),
+        path("products/<int:pk>/delete/", views.product_delete, name="product_delete"),
+        path("orders/", list_views.order_list, name="order_list"),
+        path("orders/export/", export_views.order_export, name="order_export"),
+        path("orders/<int:pk>/edit/", views.order_edit, name="order_edit"),
+        path("orders/<int:pk>/delete/", views.order_delete, name="order_delete"),
+        path("analytics/", views.analytics_view, name="analytics"),
+        path("api/products/", list_views.api_products, name="api_products"),
+        path("api/orders/", list_views.api_orders, name="api_orders"),
+        path("api/clients/", views.api_clients, name="api_clients"),
+    ]
+
+
+urlpatterns = build(
+    # Списки и API под ASGI обслуживаются async-версиями представлений.
+    async_views if settings.ASYNC_VIEWS else views,
+    # Выгрузки — потоковые ответы. Async-генератор под WSGI Django сначала
+    # читает в память целиком, поэтому async-версии — только под ASGI.
+    async_views if settings.ASGI else views,
+)
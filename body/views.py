@@ -1,12 +1,71 @@
+from django.conf import settings
 from django.contrib import messages
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
-from django.http import JsonResponse
+from django.core.files.storage import default_storage
+from django.db.models import Count, Q
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
-from .forms import LoginForm, OrderForm, ProductForm
-from .models import Order, Product, Supplier, User
+from django.template.loader import render_to_string
+from django.utils.dateparse import parse_date
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+
+from . import analytics, caching, export, reference, sessions, stock
+from .backends import GUEST_USERNAME, get_guest_user
+from .filters import (
+    ORDER_STATUSES,
+    filter_orders,
+    filter_products,
+    is_exact_article,
+    parse_id,
+)
+from .forms import LoginForm, OrderForm, ProductForm, client_label
+from .metrics import query_budget
+from .models import Order, Product, User
+from .pagination import KeysetPaginator, capped_count
+
+# Поля JSON API: имя в ответе -> поле для .values().
+PRODUCT_API_FIELDS = {
+    "id": "id",
+    "article": "article",
+    "name": "name",
+    "unit": "unit",
+    "category": "category__name",
+    "manufacturer": "manufacturer__name",
+    "supplier": "supplier__name",
+    "price": "price",
+    "discount": "discount",
+    "final_price": "final_price",
+    "is_promo": "is_promo",
+    "stock": "stock",
+    "description": "description",
+    "image": "image",
+}
+PRODUCT_API_DEFAULT_FIELDS = (
+    "id",
+    "article",
+    "name",
+    "category",
+    "manufacturer",
+    "supplier",
+    "price",
+    "discount",
+    "final_price",
+    "stock",
+)
+ORDER_API_FIELDS = {
+    "id": "id",
+    "number": "number",
+    "article": "article",
+    "order_date": "order_date",
+    "delivery_date": "delivery_date",
+    "delivery_point": "delivery_point__address",
+    "client_name": "client_name",
+    "pickup_code": "pickup_code",
+    "status": "status",
+}
+ORDER_API_DEFAULT_FIELDS = tuple(ORDER_API_FIELDS)
 
 
 def login_view(request):
@@ -15,26 +74,17 @@ def login_view(request):
 
     form = LoginForm(request, data=request.POST or None)
     if request.method == "POST" and form.is_valid():
-        user = form.get_user()
-        login(request, user)
+        login(request, form.get_user())
         return redirect("product_list")
 
     return render(request, "store/login.html", {"form": form})
 
 
 def guest_login_view(request):
-    guest_user, created = User.objects.get_or_create(
-        username="guest",
-        defaults={
-            "full_name": "Гость",
-            "is_active": True,
-        },
-    )
-    if created:
-        guest_user.set_unusable_password()
-        guest_user.save()
-
-    login(request, guest_user, backend="django.contrib.auth.backends.ModelBackend")
+    # Гость общий: пользователь берётся из кеша процесса, сессия — в
+    # подписанной cookie, поэтому вход гостя не пишет в БД.
+    sessions.use_guest_session(request)
+    login(request, get_guest_user(), backend="body.backends.GuestBackend")
     return redirect("product_list")
 
 
@@ -44,43 +94,137 @@ def logout_view(request):
     return redirect("login")
 
 
-@login_required
-def product_list(request):
-    products = Product.objects.select_related(
-        "category", "manufacturer", "supplier"
-    ).all()
-    suppliers = Supplier.objects.all()
+def _parse_date(value):
+    try:
+        return parse_date(value or "")
+    except ValueError:
+        return None
 
-    query = request.GET.get("q", "").strip()
-    if query:
-        products = products.filter(
-            Q(name__icontains=query)
-            | Q(article__icontains=query)
-            | Q(description__icontains=query)
+
+def _order_params(request):
+    """Параметры списка заказов из запроса: ``(q, filters, cursor)``."""
+    status = request.GET.get("status", "")
+    point = parse_id(request.GET.get("point"))
+    filters = {
+        "status": status if status in ORDER_STATUSES else "",
+        "date_from": _parse_date(request.GET.get("date_from")),
+        "date_to": _parse_date(request.GET.get("date_to")),
+        # Некорректный пункт (в том числе вне диапазона bigint) — без фильтра.
+        "point": str(point) if point else "",
+    }
+    return request.GET.get("q", "").strip(), filters, request.GET.get("cursor")
+
+
+def _status_aggregates():
+    """Всего заказов и число по каждому статусу — для одного aggregate()."""
+    return {
+        "total": Count("pk"),
+        **{status: Count("pk", filter=Q(status=status)) for status in ORDER_STATUSES},
+    }
+
+
+def _status_counts_key(query, filters):
+    # Счётчики считаются без фильтра по статусу: по ним строятся вкладки.
+    return ["status_counts", query, {**filters, "status": ""}]
+
+
+def _order_context(query, filters, page, counts, points):
+    statuses = [("", "Все", counts["total"])] + [
+        (status, label, counts[status]) for status, label in Order.STATUS_CHOICES
+    ]
+    return {
+        "orders": page.object_list,
+        "page": page,
+        "query": query,
+        "filters": filters,
+        "statuses": statuses,
+        "total_count": (
+            counts[filters["status"]] if filters["status"] else counts["total"]
+        ),
+        "delivery_points": points,
+    }
+
+
+def _product_listing(request, query, supplier_id, show, sort, cursor):
+    """
+    Страница каталога: товары, курсоры, счётчик и готовый HTML строк таблицы.
+    Результат кешируется по параметрам фильтра и роли пользователя.
+    """
+
+    def build():
+        products, ordering = filter_products(
+            Product.objects.select_related("category", "manufacturer", "supplier"),
+            query,
+            supplier_id,
+            show,
+            sort,
+        )
+        paginator = KeysetPaginator(
+            products, ordering, settings.PRODUCT_LIST_PAGE_SIZE
+        )
+        page = paginator.page(cursor)
+        total_count, total_exact = capped_count(
+            products, settings.PRODUCT_LIST_COUNT_LIMIT
         )
+        rows = render_to_string(
+            "store/product_rows.html", {"products": page.object_list}, request
+        )
+        return {
+            "page": page,
+            "rows": rows,
+            "total_count": total_count,
+            "total_exact": total_exact,
+        }
+
+    role = request.user.role.name if request.user.role_id else ""
+    return caching.get_or_set(
+        caching.CATALOG, [role, query, supplier_id, show, sort, cursor], build
+    )
+
+
+def _listing_params(request):
+    """
+    Параметры каталога из запроса: ``(q, supplier, show, sort, cursor)``.
+    Некорректный поставщик отбрасывается — страница показывает всех.
+    """
+    supplier = request.GET.get("supplier", "")
+    return (
+        request.GET.get("q", "").strip(),
+        supplier if parse_id(supplier) else "",
+        request.GET.get("show", ""),
+        request.GET.get("sort", ""),
+        request.GET.get("cursor"),
+    )
 
-    supplier_id = request.GET.get("supplier", "")
-    if supplier_id:
-        products = products.filter(supplier_id=supplier_id)
 
-    sort = request.GET.get("sort", "")
-    if sort == "stock_asc":
-        products = products.order_by("stock")
-    elif sort == "stock_desc":
-        products = products.order_by("-stock")
-    else:
-        products = products.order_by("name")
+@query_budget(5)
+@login_required
+def product_list(request):
+    suppliers = reference.get(reference.SUPPLIERS)
+
+    query, supplier_id, show, sort, cursor = _listing_params(request)
+    listing = _product_listing(request, query, supplier_id, show, sort, cursor)
 
     context = {
-        "products": products,
+        **listing,
         "suppliers": suppliers,
         "query": query,
         "selected_supplier": supplier_id,
+        "show": show,
         "sort": sort,
     }
     return render(request, "store/product_list.html", context)
 
 
+@query_budget(4)
+@login_required
+@gzip_page
+def product_rows(request):
+    """Строки таблицы и счётчик каталога для живого поиска, без макета страницы."""
+    listing = _product_listing(request, *_listing_params(request))
+    return render(request, "store/product_fragment.html", listing)
+
+
 @login_required
 def product_add(request):
     if not request.user.can_edit_products():
@@ -144,11 +288,12 @@ def product_delete(request, pk):
 
     product = get_object_or_404(Product, pk=pk)
 
-    orders_count = Order.objects.filter(article=product.article).count()
+    orders_count = product.order_items.values("order_id").distinct().count()
     if orders_count > 0:
         messages.error(
             request,
-            f"Нельзя удалить товар «{product.name}»: он используется в {orders_count} заказ(ах).",
+            f"Нельзя удалить товар «{product.name}»: он используется в "
+            f"{orders_count} заказ(ах).",
         )
         return redirect("product_list")
 
@@ -161,29 +306,37 @@ def product_delete(request, pk):
     return render(request, "store/product_confirm_delete.html", {"product": product})
 
 
+@query_budget(6)
 @login_required
 def order_list(request):
     if not request.user.can_view_orders():
         messages.error(request, "Доступ запрещён.")
         return redirect("product_list")
 
-    orders = Order.objects.select_related("delivery_point", "client").all()
+    query, filters, cursor = _order_params(request)
+    exact_article = is_exact_article(query)
+    orders, ordering = filter_orders(
+        Order.objects.select_related("delivery_point", "client"),
+        query,
+        exact_article,
+        **filters,
+    )
+    page = KeysetPaginator(orders, ordering, settings.ORDER_LIST_PAGE_SIZE).page(cursor)
 
-    query = request.GET.get("q", "").strip()
-    if query:
-        orders = orders.filter(
-            Q(client_name__icontains=query)
-            | Q(number__icontains=query)
-            | Q(article__icontains=query)
-        )
+    counted, _ = filter_orders(
+        Order.objects.all(), query, exact_article, **{**filters, "status": ""}
+    )
+    counts = caching.get_or_set(
+        caching.ORDERS,
+        _status_counts_key(query, filters),
+        lambda: counted.aggregate(**_status_aggregates()),
+    )
+    points = reference.get(reference.DELIVERY_POINTS)
 
     return render(
         request,
         "store/order_list.html",
-        {
-            "orders": orders,
-            "query": query,
-        },
+        _order_context(query, filters, page, counts, points),
     )
 
 
@@ -195,13 +348,17 @@ def order_edit(request, pk):
         )
         return redirect("order_list")
 
-    order = get_object_or_404(Order, pk=pk)
+    order = get_object_or_404(Order.objects.select_related("client"), pk=pk)
     form = OrderForm(request.POST or None, instance=order)
 
     if request.method == "POST" and form.is_valid():
-        form.save()
-        messages.success(request, f"Заказ №{order.number} обновлён.")
-        return redirect("order_list")
+        try:
+            form.save()
+        except (stock.InsufficientStock, stock.InvalidTransition) as e:
+            form.add_error(None, str(e))
+        else:
+            messages.success(request, f"Заказ №{order.number} обновлён.")
+            return redirect("order_list")
 
     form.fields["number"].widget.attrs["readonly"] = True
 
@@ -231,3 +388,218 @@ def order_delete(request, pk):
         return redirect("order_list")
 
     return render(request, "store/order_confirm_delete.html", {"order": order})
+
+
+ANALYTICS_DAYS = 30
+
+
+@query_budget(7)
+@login_required
+def analytics_view(request):
+    if not request.user.can_view_analytics():
+        messages.error(request, "Доступ запрещён.")
+        return redirect("product_list")
+
+    try:
+        days = min(max(int(request.GET.get("days", ANALYTICS_DAYS)), 1), 366)
+    except ValueError:
+        days = ANALYTICS_DAYS
+    context = analytics.dashboard(days)
+    context["period"] = days
+    return render(request, "store/analytics.html", context)
+
+
+def _export_response(request, exporter, basename):
+    """Ответ с выгрузкой в формате из параметра ``format`` (csv по умолчанию)."""
+    file_format = request.GET.get("format", "csv")
+    if file_format not in export.FORMATS:
+        return JsonResponse({"error": "Формат: csv или xlsx"}, status=400)
+    content_type, extension = export.FORMATS[file_format]
+    filename = f"{basename}{extension}"
+    if file_format == "csv":
+        response = StreamingHttpResponse(
+            export.csv_chunks(exporter), content_type=content_type
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+    if export.openpyxl is None:
+        return JsonResponse(
+            {"error": "XLSX недоступен: не установлен openpyxl"}, status=400
+        )
+    return FileResponse(
+        export.xlsx_file(exporter, basename),
+        as_attachment=True,
+        filename=filename,
+        content_type=content_type,
+    )
+
+
+@login_required
+def product_export(request):
+    if not request.user.can_filter():
+        messages.error(request, "Доступ запрещён.")
+        return redirect("product_list")
+
+    query, supplier_id, show, sort, _ = _listing_params(request)
+    products, ordering = filter_products(
+        Product.objects.all(), query, supplier_id, show, sort
+    )
+    return _export_response(
+        request, export.products(products.order_by(*ordering)), "products"
+    )
+
+
+@login_required
+def order_export(request):
+    if not request.user.can_view_orders():
+        messages.error(request, "Доступ запрещён.")
+        return redirect("product_list")
+
+    query, filters, _ = _order_params(request)
+    orders, ordering = filter_orders(
+        Order.objects.all(), query, is_exact_article(query), **filters
+    )
+    return _export_response(
+        request, export.orders(orders.order_by(*ordering)), "orders"
+    )
+
+
+def _conditional(namespace):
+    """
+    Условный GET по отметке изменения таблиц: если данные пространства
+    ``namespace`` не менялись, ответ 304 отдаётся без выполнения запроса.
+    ETag учитывает и параметры запроса — у каждой выборки свой.
+    """
+
+    def etag(request, *args, **kwargs):
+        params = caching.digest(sorted(request.GET.lists()))
+        return f'"{namespace}-{caching.get_version(namespace)}-{params}"'
+
+    def last_modified(request, *args, **kwargs):
+        return caching.changed_at(namespace)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def _api_paginator(request, queryset, ordering, fields, default_fields, page_size):
+    """
+    Разбирает параметры ``fields`` и ``limit`` JSON API (по умолчанию
+    ``page_size`` — размер страницы соответствующего списка). Строки выбираются
+    через ``.values()`` без создания моделей. Возвращает ``(paginator, names)``,
+    при ошибке в параметрах — ``ValueError``.
+    """
+    names = request.GET.get("fields", "")
+    names = [name.strip() for name in names.split(",") if name.strip()]
+    names = names or list(default_fields)
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+
+    try:
+        limit = int(request.GET.get("limit", page_size))
+    except ValueError:
+        raise ValueError("Некорректный limit") from None
+    limit = max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+    columns = {fields[name] for name in names}
+    columns.update(field.lstrip("-") for field in ordering)
+    return KeysetPaginator(queryset.values(*columns), ordering, limit), names
+
+
+def _api_response(page, names, fields):
+    results = [{name: row[fields[name]] for name in names} for row in page]
+    if "image" in names:
+        for row in results:
+            row["image"] = default_storage.url(row["image"]) if row["image"] else None
+    return JsonResponse(
+        {
+            "results": results,
+            "next": page.next_cursor,
+            "previous": page.prev_cursor,
+        }
+    )
+
+
+def _api_page(request, queryset, ordering, fields, default_fields, page_size):
+    try:
+        paginator, names = _api_paginator(
+            request, queryset, ordering, fields, default_fields, page_size
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return _api_response(paginator.page(request.GET.get("cursor")), names, fields)
+
+
+@query_budget(3)
+@login_required
+@_conditional(caching.CATALOG)
+def api_products(request):
+    try:
+        products, ordering = filter_products(
+            Product.objects.all(),
+            request.GET.get("q", "").strip(),
+            request.GET.get("supplier", ""),
+            request.GET.get("show", ""),
+            request.GET.get("sort", ""),
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return _api_page(
+        request,
+        products,
+        ordering,
+        PRODUCT_API_FIELDS,
+        PRODUCT_API_DEFAULT_FIELDS,
+        settings.PRODUCT_LIST_PAGE_SIZE,
+    )
+
+
+CLIENT_SEARCH_LIMIT = 20
+
+
+@query_budget(3)
+@login_required
+def api_clients(request):
+    """Поиск клиента для формы заказа: по словам из ФИО и логина."""
+    if not request.user.can_edit_orders():
+        return JsonResponse({"error": "Доступ запрещён."}, status=403)
+
+    query = request.GET.get("q", "").strip()
+    if len(query) < 2:
+        return JsonResponse({"results": []})
+    users = User.objects.exclude(username=GUEST_USERNAME)
+    for word in query.split():
+        users = users.filter(Q(full_name__icontains=word) | Q(username__icontains=word))
+    users = users.only("username", "full_name").order_by("full_name", "username")
+    return JsonResponse(
+        {
+            "results": [
+                {"id": user.pk, "label": client_label(user)}
+                for user in users[:CLIENT_SEARCH_LIMIT]
+            ]
+        }
+    )
+
+
+@query_budget(4)
+@login_required
+def api_orders(request):
+    if not request.user.can_view_orders():
+        return JsonResponse({"error": "Доступ запрещён."}, status=403)
+    return _api_orders(request)
+
+
+@_conditional(caching.ORDERS)
+def _api_orders(request):
+    query, filters, _ = _order_params(request)
+    orders, ordering = filter_orders(
+        Order.objects.all(), query, is_exact_article(query), **filters
+    )
+    return _api_page(
+        request,
+        orders,
+        ordering,
+        ORDER_API_FIELDS,
+        ORDER_API_DEFAULT_FIELDS,
+        settings.ORDER_LIST_PAGE_SIZE,
+    )
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'store.settings')
+# Признак запуска под ASGI для настроек (settings.ASGI).
+os.environ.setdefault('STORE_ASGI', '1')
 
 application = get_asgi_application()
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -21,8 +22,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'body.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'body.sessions.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -34,7 +36,7 @@ ROOT_URLCONF = 'store.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'body.metrics.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -58,6 +60,16 @@ DATABASES = {
 
 AUTH_USER_MODEL = 'body.User'
 
+AUTHENTICATION_BACKENDS = ['body.backends.RoleBackend', 'body.backends.GuestBackend']
+
+# Сессии гостей хранятся в подписанной cookie (body/sessions.py), сессии
+# остальных пользователей — в БД.
+GUEST_SESSION_COOKIE_NAME = 'guest_session'
+
+# Сколько секунд процесс держит учётную запись гостя в памяти
+# (body.backends.get_guest_user).
+GUEST_USER_CACHE_TIMEOUT = 60
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -90,3 +102,62 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 LOGIN_URL = '/login/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+
+PRODUCT_LIST_PAGE_SIZE = 50
+PRODUCT_LIST_COUNT_LIMIT = 1000
+ORDER_LIST_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+
+# Приложение запущено через store/asgi.py (uvicorn, daphne и т. п.).
+ASGI = os.environ.get('STORE_ASGI') == '1'
+
+# Async-версии списков и API (body/async_views.py). Рассчитаны на запуск под
+# ASGI; под WSGI синхронные версии обходятся без перехода в event loop.
+ASYNC_VIEWS = ASGI
+
+# Кеш каталога. Для нескольких процессов можно указать общий бэкенд, например
+# 'django.core.cache.backends.filebased.FileBasedCache' или
+# 'django.core.cache.backends.redis.RedisCache' с LOCATION.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'store',
+    }
+}
+
+CATALOG_CACHE_TIMEOUT = 300
+
+# Сколько секунд процесс держит справочники в памяти (body.reference).
+REFERENCE_CACHE_TIMEOUT = 60
+
+# Версии пространств кеша (body.caching) — отметки времени файлов в этом
+# каталоге, счётчики попаданий — размеры файлов рядом. LocMemCache у каждого
+# процесса свой, а файл видят все процессы сервера и manage.py import_data,
+# поэтому инвалидация доходит до всех, а cache_stats видит общие счётчики.
+# С общим кешем (Redis, Memcached) на нескольких серверах — None: версии и
+# счётчики тогда хранятся в самом кеше.
+CACHE_VERSION_DIR = BASE_DIR / 'var' / 'cache_versions'
+
+# Бюджеты SQL-запросов представлений (body.metrics.query_budget): при True
+# превышение — исключение, иначе предупреждение в логе. В тестах включается
+# раннером body.testing.TestRunner.
+QUERY_BUDGET_STRICT = False
+TEST_RUNNER = 'body.testing.TestRunner'
+
+# Метрики запросов (body.metrics) выводятся в консоль в режиме отладки.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'require_debug_true': {'()': 'django.utils.log.RequireDebugTrue'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['require_debug_true'],
+        },
+    },
+    'loggers': {
+        'body.metrics': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}